@@ -20,8 +20,11 @@
 
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import Lesson, User, Course, QuizResult, Student, Quiz, StudentMessageRequest, Level, CourseFeedback, CourseResult, Homework, HomeworkSubmission, HomeworkPhoto, WheelSpin
-from django.utils.html import format_html
+from .models import Lesson, User, Course, QuizResult, Student, Quiz, StudentMessageRequest, Level, CourseFeedback, CourseResult, Enrollment, Homework, HomeworkSubmission, HomeworkPhoto, WheelSpin, Job, MediaBlob
+from django.db.models import Count
+from .services import bulk_delete_students
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
 from django.urls import reverse
 from django.http import HttpResponseRedirect
 from django.contrib import messages
@@ -41,6 +44,16 @@ class UserAdmin(BaseUserAdmin):
 admin.site.register(User, UserAdmin)
 admin.site.register(Lesson)
 
+
+class EnrollmentInline(admin.TabularInline):
+    # Записи на курс редактируются через промежуточную модель (M2M с through=Enrollment)
+    model = Enrollment
+    extra = 0
+    fields = ('student', 'course', 'status', 'enrolled_at')
+    readonly_fields = ('enrolled_at',)
+    raw_id_fields = ('student',)
+
+
 # Регистрируем модель Course с кастомной админкой
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
@@ -57,11 +70,12 @@ class CourseAdmin(admin.ModelAdmin):
             'description': 'Количество звёзд, которые получит студент за полное завершение курса'
         }),
         ('Связи', {
-            'fields': ('modules', 'students'),
+            'fields': ('modules',),
             'classes': ('collapse',)
         }),
     )
-    filter_horizontal = ('modules', 'students')
+    filter_horizontal = ('modules',)
+    inlines = [EnrollmentInline]
     
     def get_fieldsets(self, request, obj=None):
         fieldsets = super().get_fieldsets(request, obj)
@@ -74,43 +88,59 @@ class CourseAdmin(admin.ModelAdmin):
             )
         return fieldsets
 
+    # Сколько последних отзывов показывать на странице курса (все — в разделе «Отзывы о курсах»)
+    feedback_summary_limit = 20
+
+    def get_queryset(self, request):
+        # distinct: два JOIN (студенты и модули) иначе перемножают строки
+        return super().get_queryset(request).annotate(
+            students_total=Count('students', distinct=True),
+            modules_total=Count('modules', distinct=True),
+        )
+
     def get_feedback_summary(self, obj):
-        feedbacks = obj.feedbacks.all()
-        if not feedbacks:
+        if not obj.rating_count:
             return 'Отзывов пока нет'
-        
-        summary = f'Всего отзывов: {feedbacks.count()}<br>'
-        summary += f'Средняя оценка: {self.average_rating(obj)}⭐<br><br>'
-        
+
+        feedbacks = obj.feedbacks.select_related('student__user')[:self.feedback_summary_limit]
+        summary = format_html(
+            'Всего отзывов: {}<br>Средняя оценка: {}⭐<br><br>', obj.rating_count, self.average_rating(obj)
+        )
         for feedback in feedbacks:
-            summary += f'<strong>{feedback.student.user.get_full_name() or feedback.student.user.username}</strong><br>'
-            summary += f'Оценка: {feedback.stars_display}<br>'
-            if feedback.comment:
-                summary += f'Комментарий: {feedback.comment}<br>'
-            if feedback.what_liked:
-                summary += f'Понравилось: {feedback.what_liked}<br>'
-            if feedback.what_to_improve:
-                summary += f'Можно улучшить: {feedback.what_to_improve}<br>'
-            summary += f'Рекомендует курс: {"Да" if feedback.would_recommend else "Нет"}<br><br>'
-        
-        return format_html(summary)
+            summary += format_html(
+                '<strong>{}</strong><br>Оценка: {}<br>',
+                feedback.student.user.get_full_name() or feedback.student.user.username,
+                feedback.stars_display,
+            )
+            summary += format_html_join('', '{}: {}<br>', (
+                (label, text) for label, text in (
+                    ('Комментарий', feedback.comment),
+                    ('Понравилось', feedback.what_liked),
+                    ('Можно улучшить', feedback.what_to_improve),
+                ) if text
+            ))
+            summary += format_html('Рекомендует курс: {}<br><br>', 'Да' if feedback.would_recommend else 'Нет')
+        if obj.rating_count > self.feedback_summary_limit:
+            url = reverse('admin:courses_coursefeedback_changelist') + f'?course__id__exact={obj.pk}'
+            summary += format_html('<a href="{}">Все отзывы ({})</a>', url, obj.rating_count)
+        return mark_safe(summary)
 
     def average_rating(self, obj):
-        feedbacks = obj.feedbacks.all()
-        if not feedbacks:
-            return '0.0'
-        avg = sum(f.rating for f in feedbacks) / feedbacks.count()
-        return f'{avg:.1f}'
+        return f'{obj.rating_avg:.1f}'
+    average_rating.short_description = 'Средняя оценка'
+    average_rating.admin_order_field = 'rating_avg'
     
     def students_count(self, obj):
         """Количество студентов на курсе"""
-        return obj.students.count()
+        return obj.students_total
     students_count.short_description = 'Студентов'
+    students_count.admin_order_field = 'students_total'
     
     def modules_count(self, obj):
         """Количество модулей в курсе"""
-        return obj.modules.count()
+        return obj.modules_total
     modules_count.short_description = 'Модулей'
+    modules_count.admin_order_field = 'modules_total'
 
 # Регистрируем модель Quiz
 admin.site.register(Quiz)
@@ -121,6 +151,15 @@ class StudentAdmin(admin.ModelAdmin):
     list_display = ('user', 'is_school_student', 'grade', 'age', 'phone_number', 'email', 'stars', 'level_name')
     search_fields = ('user__username', 'phone_number', 'email', 'first_name', 'last_name')
     list_filter = ('user__is_student', 'is_school_student', 'grade')
+    inlines = [EnrollmentInline]
+    actions = ['delete_students_with_data']
+    
+    def delete_students_with_data(self, request, queryset):
+        # В отличие от стандартного delete_selected — без каскада Django по объектам:
+        # set-based DELETE по таблицам в одной транзакции, файлы удаляются фоновой задачей
+        deletion = bulk_delete_students(queryset.values_list('user_id', flat=True))
+        self.message_user(request, f'Удалено студентов: {deletion.users}, пропущено: {len(deletion.skipped)}')
+    delete_students_with_data.short_description = 'Удалить выбранных студентов со всеми данными'
     
     def get_fieldsets(self, request, obj=None):
         fieldsets = (
@@ -130,8 +169,8 @@ class StudentAdmin(admin.ModelAdmin):
             ('Статус обучения', {
                 'fields': ('is_school_student', 'grade')
             }),
-            ('Курсы и прогресс', {
-                'fields': ('courses', 'stars'),
+            ('Прогресс', {
+                'fields': ('stars',),
                 'classes': ('collapse',)
             }),
         )
@@ -217,6 +256,7 @@ class CourseFeedbackAdmin(admin.ModelAdmin):
     search_fields = ('student__user__username', 'student__user__first_name', 'student__user__last_name', 'course__title', 'comment')
     readonly_fields = ('created_at', 'updated_at', 'stars_display')
     ordering = ('-created_at',)
+    list_select_related = ('student__user', 'course')
     
     fieldsets = (
         ('Основная информация', {
@@ -409,4 +449,22 @@ class WheelSpinAdmin(admin.ModelAdmin):
     )
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('student__user')
\ No newline at end of file
+        return super().get_queryset(request).select_related('student__user')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Админка для фоновых задач"""
+    list_display = ('id', 'kind', 'status', 'progress_done', 'progress_total', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('progress_done', 'progress_total', 'result', 'created_at', 'started_at', 'finished_at')
+    ordering = ('-created_at',)
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    """Админка для файлов с дедупликацией"""
+    list_display = ('name', 'size', 'ref_count', 'created_at')
+    search_fields = ('sha256', 'name')
+    readonly_fields = ('sha256', 'name', 'size', 'ref_count', 'created_at')
+    ordering = ('-created_at',)
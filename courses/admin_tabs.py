@@ -0,0 +1,280 @@
+"""
+Вкладки панели администратора, загружаемые по требованию.
+
+Страница admin_page отдаёт только каркас с формами; каждая таблица
+подгружается отдельным запросом (admin_page_tab), когда вкладка становится
+видимой. Вкладка описывается AdminTab: набор строк, поля поиска,
+допустимые сортировки и шаблон фрагмента. Тот же endpoint с ?format=json
+отдаёт страницу в виде {id, label} — для выпадающих списков с поиском.
+"""
+from typing import Callable, NamedTuple, Optional
+from urllib.parse import urlencode
+
+from django.core.paginator import Paginator
+from django.db.models import Count, Prefetch, Q
+
+from .models import (
+    Achievement, Course, CourseAddRequest, CourseFeedback, Group, Lesson, Level, Module,
+    Notification, ProfileEditRequest, Quiz, Student, StudentAchievement, StudentMessageRequest,
+    Teacher,
+)
+from .services import achievements_close_to_unlock
+
+MAX_PER_PAGE = 100
+
+
+class AdminTab(NamedTuple):
+    """Описание вкладки.
+
+    orderings — {ключ: (подпись, поля order_by)}, первый ключ — по умолчанию;
+    prepare(rows) дополняет строки текущей страницы и возвращает контекст
+    шаблона; label(obj) — подпись строки в JSON-ответе.
+    """
+    template: str
+    queryset: Callable
+    search_fields: tuple
+    orderings: dict
+    per_page: int = 25
+    prepare: Optional[Callable] = None
+    label: Callable = str
+
+
+def _student_label(student):
+    full_name = student.user.get_full_name()
+    return f'{student.user.username} ({full_name})' if full_name else student.user.username
+
+
+def _prepare_students(rows):
+    # Уровни — маленькая таблица: читаем один раз вместо get_level() на строку
+    levels = list(Level.objects.order_by('number'))
+    for student in rows:
+        student.current_level = next(
+            (level for level in levels if level.min_stars <= student.stars < level.max_stars), None
+        )
+    return {}
+
+
+def _prepare_achievement_progress(rows):
+    achievements = list(Achievement.objects.filter(is_active=True))
+    return {'progress_items': achievements_close_to_unlock(rows, achievements)}
+
+
+def _prepare_notifications(rows):
+    return {'notification_type_choices': Notification._meta.get_field('type').choices}
+
+
+def _pending(model):
+    return lambda: model.objects.filter(status='pending').select_related('student__user').order_by('-created_at')
+
+
+ADMIN_TABS = {
+    'students': AdminTab(
+        template='courses/admin_tabs/students.html',
+        queryset=lambda: Student.objects.select_related('user').prefetch_related('courses'),
+        search_fields=('user__username', 'user__email', 'user__first_name', 'user__last_name'),
+        orderings={
+            'new': ('Сначала новые', ('-user__date_joined', '-id')),
+            'username': ('По имени пользователя', ('user__username',)),
+            'stars': ('По звёздам', ('-stars', 'id')),
+        },
+        prepare=_prepare_students,
+        label=_student_label,
+    ),
+    'groups': AdminTab(
+        template='courses/admin_tabs/groups.html',
+        queryset=lambda: Group.objects.annotate(students_count=Count('students')).prefetch_related(
+            Prefetch('students', queryset=Student.objects.select_related('user').order_by('-stars'))
+        ),
+        search_fields=('name',),
+        orderings={
+            'name': ('По названию', ('name',)),
+            'size': ('По числу студентов', ('-students_count', 'name')),
+        },
+        per_page=10,
+    ),
+    'student_achievements': AdminTab(
+        template='courses/admin_tabs/student_achievements.html',
+        queryset=lambda: StudentAchievement.objects.select_related('student__user', 'achievement'),
+        search_fields=('student__user__username', 'achievement__title'),
+        orderings={
+            'new': ('Сначала новые', ('-unlocked_at', '-id')),
+            'student': ('По студенту', ('student__user__username', '-unlocked_at')),
+        },
+    ),
+    'achievement_progress': AdminTab(
+        # Страница — это страница студентов: прогресс считается только по ним
+        template='courses/admin_tabs/achievement_progress.html',
+        queryset=lambda: Student.objects.select_related('user'),
+        search_fields=('user__username', 'user__first_name', 'user__last_name'),
+        orderings={
+            'stars': ('По звёздам', ('-stars', 'id')),
+            'username': ('По имени пользователя', ('user__username',)),
+        },
+        prepare=_prepare_achievement_progress,
+    ),
+    'notifications': AdminTab(
+        template='courses/admin_tabs/notifications.html',
+        queryset=lambda: Notification.objects.select_related('student__user'),
+        search_fields=('message', 'student__user__username'),
+        orderings={
+            'new': ('Сначала новые', ('-created_at', '-id')),
+            'priority': ('По приоритету', ('-priority', '-created_at')),
+            'unread': ('Сначала непрочитанные', ('is_read', '-created_at')),
+        },
+        prepare=_prepare_notifications,
+    ),
+    'levels': AdminTab(
+        template='courses/admin_tabs/levels.html',
+        queryset=lambda: Level.objects.all(),
+        search_fields=('name',),
+        orderings={'number': ('По номеру', ('number',))},
+        per_page=30,
+    ),
+    'teachers': AdminTab(
+        template='courses/admin_tabs/teachers.html',
+        queryset=lambda: Teacher.objects.annotate(num_courses=Count('courses')),
+        search_fields=('first_name', 'last_name', 'email', 'specialization'),
+        orderings={
+            'name': ('По фамилии', ('last_name', 'first_name')),
+            'new': ('Сначала новые', ('-created_at',)),
+            'courses': ('По числу курсов', ('-num_courses', 'last_name')),
+        },
+        label=lambda teacher: teacher.full_name,
+    ),
+    'achievements': AdminTab(
+        template='courses/admin_tabs/achievements.html',
+        queryset=lambda: Achievement.objects.all(),
+        search_fields=('code', 'title', 'reward'),
+        orderings={
+            'condition': ('По условию', ('condition_type', 'condition_value')),
+            'title': ('По названию', ('title',)),
+        },
+        label=lambda achievement: achievement.title,
+    ),
+    'courses': AdminTab(
+        template='courses/admin_tabs/courses.html',
+        queryset=lambda: Course.objects.prefetch_related(
+            'modules__lessons', 'modules__quizzes',
+            Prefetch('feedbacks', queryset=CourseFeedback.objects.select_related('student__user')),
+        ),
+        search_fields=('title', 'course_code'),
+        orderings={
+            'title': ('По названию', ('title',)),
+            'new': ('Сначала новые', ('-id',)),
+            'rating': ('По оценке', ('-rating_avg', 'title')),
+        },
+        per_page=10,
+    ),
+    'lessons': AdminTab(
+        template='courses/admin_tabs/lessons.html',
+        queryset=lambda: Lesson.objects.all(),
+        search_fields=('title',),
+        orderings={
+            'title': ('По названию', ('title',)),
+            'new': ('Сначала новые', ('-id',)),
+        },
+        label=lambda lesson: lesson.title,
+    ),
+    'modules': AdminTab(
+        template='courses/admin_tabs/modules.html',
+        queryset=lambda: Module.objects.annotate(
+            lessons_count=Count('lessons', distinct=True),
+            quizzes_count=Count('quizzes', distinct=True),
+        ).prefetch_related('course_set'),
+        search_fields=('title', 'description'),
+        orderings={
+            'title': ('По названию', ('title',)),
+            'new': ('Сначала новые', ('-id',)),
+        },
+        label=lambda module: module.title,
+    ),
+    'quizzes': AdminTab(
+        template='courses/admin_tabs/quizzes.html',
+        queryset=lambda: Quiz.objects.all(),
+        search_fields=('title',),
+        orderings={
+            'title': ('По названию', ('title',)),
+            'new': ('Сначала новые', ('-id',)),
+        },
+        label=lambda quiz: quiz.title,
+    ),
+    'edit_requests': AdminTab(
+        template='courses/admin_tabs/edit_requests.html',
+        queryset=_pending(ProfileEditRequest),
+        search_fields=('student__user__username',),
+        orderings={'new': ('Сначала новые', ('-created_at', '-id')), 'old': ('Сначала старые', ('created_at', 'id'))},
+    ),
+    'course_add_requests': AdminTab(
+        template='courses/admin_tabs/course_add_requests.html',
+        queryset=_pending(CourseAddRequest),
+        search_fields=('student__user__username', 'course_name', 'comment'),
+        orderings={'new': ('Сначала новые', ('-created_at', '-id')), 'old': ('Сначала старые', ('created_at', 'id'))},
+    ),
+    'message_requests': AdminTab(
+        template='courses/admin_tabs/message_requests.html',
+        queryset=_pending(StudentMessageRequest),
+        search_fields=('student__user__username', 'message'),
+        orderings={'new': ('Сначала новые', ('-created_at', '-id')), 'old': ('Сначала старые', ('created_at', 'id'))},
+    ),
+}
+
+
+def search_filter(search_fields, query):
+    """Q для поиска: каждое слово должно встретиться хотя бы в одном поле."""
+    condition = Q()
+    for term in query.split():
+        term_condition = Q()
+        for field in search_fields:
+            term_condition |= Q(**{f'{field}__icontains': term})
+        condition &= term_condition
+    return condition
+
+
+def _per_page(value, default):
+    try:
+        return max(1, min(int(value), MAX_PER_PAGE))
+    except (TypeError, ValueError):
+        return default
+
+
+def tab_page(request, name):
+    """Страница строк вкладки с учётом ?q=, ?order=, ?page=, ?per_page=."""
+    tab = ADMIN_TABS[name]
+    query = request.GET.get('q', '').strip()
+    order = request.GET.get('order')
+    if order not in tab.orderings:
+        order = next(iter(tab.orderings))
+
+    rows = tab.queryset()
+    if query:
+        rows = rows.filter(search_filter(tab.search_fields, query))
+    rows = rows.order_by(*tab.orderings[order][1])
+
+    per_page = _per_page(request.GET.get('per_page'), tab.per_page)
+    page = Paginator(rows, per_page).get_page(request.GET.get('page'))
+    params = {'q': query, 'order': order}
+    if per_page != tab.per_page:
+        params['per_page'] = per_page
+    context = {
+        'tab': name,
+        'page_obj': page,
+        'rows': page.object_list,
+        'q': query,
+        'order': order,
+        'orderings': [(key, label) for key, (label, _) in tab.orderings.items()],
+        'querystring': urlencode({key: value for key, value in params.items() if value}),
+    }
+    if tab.prepare is not None:
+        context.update(tab.prepare(page.object_list))
+    return tab, context
+
+
+def tab_json(tab, context):
+    page = context['page_obj']
+    return {
+        'items': [{'id': obj.pk, 'label': tab.label(obj)} for obj in context['rows']],
+        'page': page.number,
+        'num_pages': page.paginator.num_pages,
+        'count': page.paginator.count,
+        'has_next': page.has_next(),
+    }
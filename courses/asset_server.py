@@ -0,0 +1,178 @@
+"""
+Отдача статики встроенного приложения «AI генератор картинок».
+
+При первом запросе (и при изменении файлов в DEBUG) строится манифест в
+памяти: содержимое, ETag по SHA-256, заранее сжатые gzip/brotli версии.
+index.html переписывается один раз при сборке манифеста. Если собран
+бандл (manage.py build_ai_image_creator), index.html ссылается на
+app.<хэш>.js, который кэшируется браузером навсегда (immutable).
+"""
+import gzip
+import hashlib
+import os
+import threading
+from mimetypes import guess_type
+from typing import NamedTuple
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+try:
+    import brotli
+except ImportError:  # brotli не установлен — отдаём только gzip
+    brotli = None
+
+APP_DIR = os.path.join(settings.BASE_DIR, 'study-task---ai-image-creator')
+URL_PREFIX = '/study-task---ai-image-creator'
+BUNDLE_PATH = os.path.join('dist', 'app.js')
+
+# Файлы сборки и конфигурации браузеру не нужны
+EXCLUDED_FILES = {'package.json', 'package-lock.json', 'tsconfig.json', 'vite.config.ts', 'README.md'}
+EXCLUDED_DIRS = {'node_modules', '.git'}
+SCRIPT_EXTENSIONS = ('.tsx', '.ts', '.jsx', '.js')
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 512
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+
+class Asset(NamedTuple):
+    body: bytes
+    gzip: bytes
+    br: bytes
+    etag: str
+    content_type: str
+    last_modified: float
+    cache_control: str
+
+
+def _content_type(path):
+    if path.endswith(SCRIPT_EXTENSIONS):
+        return 'application/javascript; charset=utf-8'
+    content_type = guess_type(path)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type == 'application/json':
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+def _make_asset(body, content_type, last_modified, cache_control):
+    compressible = len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES)
+    return Asset(
+        body=body,
+        gzip=gzip.compress(body, compresslevel=9, mtime=0) if compressible else b'',
+        br=brotli.compress(body) if compressible and brotli is not None else b'',
+        etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        content_type=content_type,
+        last_modified=last_modified,
+        cache_control=cache_control,
+    )
+
+
+def _source_files(app_dir):
+    for root, dirs, files in os.walk(app_dir):
+        dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
+        for name in files:
+            if name not in EXCLUDED_FILES:
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, app_dir).replace(os.sep, '/'), path
+
+
+def directory_signature(app_dir=APP_DIR):
+    """Размеры и mtime всех файлов: по изменению подписи манифест пересобирается."""
+    signature = []
+    for rel, path in _source_files(app_dir):
+        stat = os.stat(path)
+        signature.append((rel, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(signature))
+
+
+def build_manifest(app_dir=APP_DIR):
+    """Собирает {путь URL: Asset} для всех файлов приложения."""
+    manifest = {}
+    for rel, path in _source_files(app_dir):
+        if rel == 'index.html':
+            continue
+        with open(path, 'rb') as handle:
+            body = handle.read()
+        asset = _make_asset(body, _content_type(rel), os.path.getmtime(path), REVALIDATE_CACHE)
+        manifest[rel] = asset
+        if rel.endswith(SCRIPT_EXTENSIONS):
+            # Импорты без расширения: './App' -> App.tsx
+            manifest.setdefault(os.path.splitext(rel)[0], asset)
+
+    script_src = f'{URL_PREFIX}/index.tsx'
+    bundle = manifest.get(BUNDLE_PATH.replace(os.sep, '/'))
+    if bundle is not None:
+        hashed_name = f'app.{bundle.etag.strip(chr(34))[:16]}.js'
+        manifest[hashed_name] = bundle._replace(cache_control=IMMUTABLE_CACHE)
+        script_src = f'{URL_PREFIX}/{hashed_name}'
+
+    index_path = os.path.join(app_dir, 'index.html')
+    if os.path.exists(index_path):
+        with open(index_path, encoding='utf-8') as handle:
+            html = handle.read()
+        html = html.replace('href="/index.css"', f'href="{URL_PREFIX}/index.css"')
+        html = html.replace('src="/index.tsx"', f'src="{script_src}"')
+        manifest['index.html'] = _make_asset(
+            html.encode('utf-8'), 'text/html; charset=utf-8', os.path.getmtime(index_path), REVALIDATE_CACHE
+        )
+    return manifest
+
+
+_manifest = None
+_signature = None
+_lock = threading.Lock()
+
+
+def get_manifest():
+    """Манифест текущего процесса; в DEBUG пересобирается при изменении файлов."""
+    global _manifest, _signature
+    if _manifest is not None and not settings.DEBUG:
+        return _manifest
+    signature = directory_signature() if settings.DEBUG else None
+    with _lock:
+        if _manifest is None or signature != _signature:
+            _manifest = build_manifest()
+            _signature = signature
+    return _manifest
+
+
+def _not_modified(request, asset):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        # Сжатые варианты имеют ETag с суффиксом (-gzip/-br), сравниваем по хэшу
+        return asset.etag.strip('"') in if_none_match or if_none_match.strip() == '*'
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(asset.last_modified) <= since
+
+
+def _negotiate(request, asset):
+    """Выбирает вариант тела по Accept-Encoding: (тело, кодировка или '')."""
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    if asset.br and 'br' in accept_encoding:
+        return asset.br, 'br'
+    if asset.gzip and 'gzip' in accept_encoding:
+        return asset.gzip, 'gzip'
+    return asset.body, ''
+
+
+def asset_response(request, path):
+    """Ответ с файлом приложения или None, если файла нет в манифесте."""
+    asset = get_manifest().get(path or 'index.html')
+    if asset is None:
+        return None
+
+    body, encoding = _negotiate(request, asset)
+    if _not_modified(request, asset):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type=asset.content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(asset.last_modified)
+    response['ETag'] = f'{asset.etag[:-1]}-{encoding}"' if encoding else asset.etag
+    response['Cache-Control'] = asset.cache_control
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,62 @@
+"""
+Массовое хэширование паролей для импорта пользователей.
+
+Один PBKDF2-хэш занимает сотни миллисекунд процессорного времени, поэтому
+при импорте тысяч студентов пароли хэшируются пачками в отдельных
+процессах. Модуль не зависит от настроек Django: класс хэшера передаётся
+строкой, и дочерние процессы (spawn) импортируют только его.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import get_context
+
+from django.utils.module_loading import import_string
+
+# Меньше этого числа паролей пул процессов не запускаем
+MIN_PASSWORDS_FOR_POOL = 16
+CHUNKS_PER_WORKER = 4
+
+
+def hash_passwords(hasher_path, passwords):
+    """Хэши паролей в формате поля User.password."""
+    hasher = import_string(hasher_path)()
+    return [hasher.encode(password, hasher.salt()) for password in passwords]
+
+
+def split_chunks(items, count):
+    """Делит список на count примерно равных последовательных частей."""
+    size, extra = divmod(len(items), count)
+    chunks, start = [], 0
+    for index in range(count):
+        stop = start + size + (1 if index < extra else 0)
+        if stop > start:
+            chunks.append(items[start:stop])
+        start = stop
+    return chunks
+
+
+def hash_passwords_parallel(hasher_path, passwords, workers=None, progress=None):
+    """Хэширует пароли, распределяя их по процессам; порядок сохраняется.
+
+    progress(done, total) вызывается после каждой готовой части.
+    """
+    passwords = list(passwords)
+    total = len(passwords)
+    workers = min(workers or os.cpu_count() or 1, total or 1)
+    # Частей больше, чем процессов, — чтобы прогресс обновлялся не только в конце
+    chunks = split_chunks(passwords, max(1, min(workers * CHUNKS_PER_WORKER, total)))
+    hashed = []
+    if workers <= 1 or total < MIN_PASSWORDS_FOR_POOL:
+        for chunk in chunks:
+            hashed += hash_passwords(hasher_path, chunk)
+            if progress:
+                progress(len(hashed), total)
+        return hashed
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+        for chunk in pool.map(hash_passwords, repeat(hasher_path), chunks):
+            hashed += chunk
+            if progress:
+                progress(len(hashed), total)
+    return hashed
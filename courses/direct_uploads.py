@@ -0,0 +1,96 @@
+"""
+Прямая загрузка файлов из браузера в хранилище, минуя воркеры Django.
+
+Схема как у S3: браузер запрашивает подписанный PUT-URL (presign),
+загружает файл напрямую в хранилище и сообщает о завершении (finalize),
+после чего файл регистрируется в модели (HomeworkPhoto, Lesson).
+
+Хранилище задаётся в STORAGES['default'] и должно уметь presigned_put():
+- S3DirectUploadStorage — S3-совместимое хранилище (AWS, MinIO и др.),
+  требует django-storages;
+- LocalDirectUploadStorage — локальная замена: PUT-запрос принимает
+  представление direct_upload_local_put и пишет файл в MEDIA_ROOT.
+"""
+import uuid
+from typing import Callable, NamedTuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import FileSystemStorage
+from django.urls import reverse
+from django.utils.text import get_valid_filename
+
+try:
+    from storages.backends.s3 import S3Storage
+    from storages.utils import clean_name
+except ImportError:  # django-storages не установлен
+    S3Storage = None
+
+PRESIGN_SALT = 'courses.direct_uploads.presign'
+PUT_SALT = 'courses.direct_uploads.put'
+
+
+class UploadTarget(NamedTuple):
+    """Куда и что можно загрузить напрямую.
+
+    check_access(user, object_id) -> bool вызывается при presign и finalize;
+    register(user, object_id, key, extra) — finalize-колбэк, привязывающий
+    загруженный объект к модели.
+    """
+    upload_to: str
+    content_types: tuple
+    check_access: Callable
+    register: Callable
+
+    def accepts(self, content_type):
+        return any(content_type.startswith(prefix) for prefix in self.content_types)
+
+
+def make_upload_key(upload_to, filename):
+    """Уникальное имя объекта в хранилище: <upload_to>/<uuid>/<имя файла>."""
+    return f'{upload_to.rstrip("/")}/{uuid.uuid4().hex}/{get_valid_filename(filename)}'
+
+
+def sign_upload(user, target, object_id, key, size):
+    return signing.dumps(
+        {'user': user.pk, 'target': target, 'object_id': object_id, 'key': key, 'size': size},
+        salt=PRESIGN_SALT,
+    )
+
+
+def load_upload(token):
+    """Проверяет токен finalize; бросает signing.BadSignature при подделке или истечении."""
+    return signing.loads(token, salt=PRESIGN_SALT, max_age=settings.DIRECT_UPLOAD_EXPIRES)
+
+
+def supports_direct_upload(storage):
+    return callable(getattr(storage, 'presigned_put', None))
+
+
+class LocalDirectUploadStorage(FileSystemStorage):
+    """Файловое хранилище с S3-подобной прямой загрузкой через PUT."""
+
+    def presigned_put(self, name, content_type, size, expires):
+        token = signing.dumps({'key': name, 'size': size}, salt=PUT_SALT)
+        return reverse('direct_upload_local_put', args=[token]), {'Content-Type': content_type}
+
+
+def load_local_put(token):
+    return signing.loads(token, salt=PUT_SALT, max_age=settings.DIRECT_UPLOAD_EXPIRES)
+
+
+if S3Storage is not None:
+    class S3DirectUploadStorage(S3Storage):
+        """S3-совместимое хранилище с presigned PUT (подходит и для MinIO)."""
+
+        def presigned_put(self, name, content_type, size, expires):
+            params = {
+                'Bucket': self.bucket_name,
+                'Key': self._normalize_name(clean_name(name)),
+                'ContentType': content_type,
+                'ContentLength': size,
+            }
+            url = self.connection.meta.client.generate_presigned_url(
+                'put_object', Params=params, ExpiresIn=expires, HttpMethod='PUT'
+            )
+            return url, {'Content-Type': content_type}
@@ -0,0 +1,70 @@
+"""
+Запросы к Gemini для AI генератора картинок.
+
+Ключ API есть только в настройках сервера: браузерное приложение
+отправляет промпт в ai_image_generate, а к Gemini обращается сервер.
+"""
+import json
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.core.cache import cache
+
+API_URL = 'https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent'
+ASPECT_RATIOS = ('1:1', '4:3', '3:4', '16:9', '9:16')
+MAX_PROMPT_LENGTH = 2000
+
+
+class GeminiError(Exception):
+    """Gemini не настроен, недоступен или не вернул изображение."""
+
+
+def acquire_quota(user_id):
+    """Засчитывает генерацию пользователю; False, если лимит окна исчерпан.
+
+    Счётчик живёт в кэше: с общим кэшем (Redis, Memcached) лимит
+    общий для всех воркеров, с LocMemCache — на каждый воркер.
+    """
+    key = f'gemini-requests:{user_id}'
+    cache.add(key, 0, settings.GEMINI_RATE_WINDOW)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Окно истекло между add и incr
+        cache.set(key, 1, settings.GEMINI_RATE_WINDOW)
+        count = 1
+    return count <= settings.GEMINI_RATE_LIMIT
+
+
+def generate_image(prompt, aspect_ratio, image_data=None, mime_type=None):
+    """data: URL картинки по промпту; с image_data (base64) — правка исходной картинки."""
+    if not settings.GEMINI_API_KEY:
+        raise GeminiError('Генерация картинок не настроена')
+    parts = []
+    if image_data:
+        parts.append({'inlineData': {'data': image_data, 'mimeType': mime_type}})
+    parts.append({'text': prompt})
+    body = {
+        'contents': [{'parts': parts}],
+        'generationConfig': {'imageConfig': {'aspectRatio': aspect_ratio}},
+    }
+    request = urllib.request.Request(
+        API_URL.format(model=settings.GEMINI_IMAGE_MODEL),
+        data=json.dumps(body).encode(),
+        # Ключ в заголовке, а не в URL — не попадёт в тексты ошибок и логи
+        headers={'Content-Type': 'application/json', 'x-goog-api-key': settings.GEMINI_API_KEY},
+        method='POST',
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=settings.GEMINI_TIMEOUT) as response:
+            payload = json.load(response)
+    except (urllib.error.URLError, TimeoutError, ValueError) as error:
+        raise GeminiError(f'Ошибка запроса к Gemini: {error}') from error
+
+    for candidate in payload.get('candidates') or []:
+        for part in (candidate.get('content') or {}).get('parts') or []:
+            inline = part.get('inlineData')
+            if inline and inline.get('data'):
+                return f"data:{inline.get('mimeType', 'image/png')};base64,{inline['data']}"
+    raise GeminiError('Gemini не вернул изображение')
@@ -0,0 +1,129 @@
+"""
+Журнал оценок преподавателя: его студенты × квизы и домашние задания.
+
+Оценки выбираются несколькими сгруппированными запросами (лучший
+результат по квизу, оценка по домашнему заданию), а матрица собирается
+pandas.pivot_table — без запроса на каждую ячейку. Готовый журнал
+кэшируется для преподавателя; версия кэша увеличивается при новых
+попытках квизов и проверке домашних заданий его студентов, состав
+студентов и квизов обновляется не позже чем через GRADEBOOK_TIMEOUT.
+"""
+from typing import NamedTuple
+
+import pandas as pd
+from django.core.cache import cache
+from django.db.models import Max, Min
+
+from .exports import Export
+from .models import Homework, HomeworkSubmission, Quiz, QuizAttempt, Student
+from .services import teacher_quiz_access_filter
+
+GRADEBOOK_TIMEOUT = 10 * 60
+
+
+class GradebookColumn(NamedTuple):
+    key: str    # 'quiz:<id>' или 'homework:<заголовок>'
+    title: str
+    kind: str   # 'quiz' — лучший результат в %, 'homework' — оценка от 1 до 10
+
+
+class Gradebook(NamedTuple):
+    students: list      # [(id студента, подпись)] в порядке строк
+    columns: list       # [GradebookColumn] в порядке столбцов
+    grid: pd.DataFrame  # индекс — id студентов, столбцы — key; NaN — оценки нет
+    averages: pd.Series  # среднее по столбцу без учёта пустых ячеек
+
+    def rows(self):
+        """(подпись студента, [значения ячеек или None]) для шаблона и выгрузки."""
+        for (student_id, label), values in zip(self.students, self.grid.to_numpy()):
+            yield label, [_cell(value) for value in values]
+
+    def average_cells(self):
+        return [_cell(value) for value in self.averages.to_numpy()]
+
+    def as_export(self):
+        def rows():
+            for label, cells in self.rows():
+                yield (label, *cells)
+            yield ('Среднее', *self.average_cells())
+
+        headers = ('Студент', *(column.title for column in self.columns))
+        return Export(title='Журнал оценок', headers=headers, rows=rows)
+
+
+def _cell(value):
+    return None if pd.isna(value) else round(float(value), 1)
+
+
+def _student_label(first_name, last_name, username):
+    return f'{last_name} {first_name}'.strip() or username
+
+
+def _version_key(teacher_id):
+    return f'gradebook-version:{teacher_id}'
+
+
+def invalidate_gradebook(teacher_id):
+    if teacher_id is None:
+        return
+    try:
+        cache.incr(_version_key(teacher_id))
+    except ValueError:
+        cache.set(_version_key(teacher_id), 1, None)
+
+
+def build_gradebook(teacher):
+    """Журнал оценок пятью запросами независимо от числа студентов и заданий."""
+    students = [
+        (student_id, _student_label(first_name, last_name, username))
+        for student_id, first_name, last_name, username in Student.objects.filter(teacher=teacher).order_by(
+            'user__last_name', 'user__first_name', 'user__username',
+        ).values_list('pk', 'user__first_name', 'user__last_name', 'user__username')
+    ]
+
+    quizzes = Quiz.objects.filter(teacher_quiz_access_filter(teacher))
+    columns = [
+        GradebookColumn(f'quiz:{quiz_id}', title, 'quiz')
+        for quiz_id, title in quizzes.order_by('title', 'pk').values_list('pk', 'title')
+    ]
+    # Задание выдаётся каждому студенту отдельно: столбец — заголовок задания
+    homework_titles = Homework.objects.filter(teacher=teacher).values('title').annotate(
+        first_created=Min('created_at'),
+    ).order_by('first_created', 'title').values_list('title', flat=True)
+    columns += [GradebookColumn(f'homework:{title}', title, 'homework') for title in homework_titles]
+
+    scores = [
+        (row['student_id'], f"quiz:{row['quiz_id']}", row['value'])
+        for row in QuizAttempt.objects.filter(student__teacher=teacher, quiz__in=quizzes.values('pk')).values(
+            'student_id', 'quiz_id',
+        ).annotate(value=Max('score'))
+    ]
+    scores += [
+        (row['student_id'], f"homework:{row['homework__title']}", row['value'])
+        for row in HomeworkSubmission.objects.filter(
+            homework__teacher=teacher, student__teacher=teacher, grade__isnull=False,
+        ).values('student_id', 'homework__title').annotate(value=Max('grade'))
+    ]
+
+    student_ids = [student_id for student_id, _ in students]
+    keys = [column.key for column in columns]
+    if scores:
+        grid = pd.DataFrame(scores, columns=['student', 'key', 'value']).pivot_table(
+            index='student', columns='key', values='value', aggfunc='max',
+        )
+        grid = grid.reindex(index=student_ids, columns=keys)
+    else:
+        grid = pd.DataFrame(index=student_ids, columns=keys, dtype=float)
+    grid = grid.astype(float)
+    return Gradebook(students=students, columns=columns, grid=grid, averages=grid.mean())
+
+
+def teacher_gradebook(teacher):
+    """Журнал оценок из кэша; строится заново после изменения оценок."""
+    version = cache.get_or_set(_version_key(teacher.pk), 1, None)
+    cache_key = f'gradebook:{teacher.pk}:{version}'
+    gradebook = cache.get(cache_key)
+    if gradebook is None:
+        gradebook = build_gradebook(teacher)
+        cache.set(cache_key, gradebook, GRADEBOOK_TIMEOUT)
+    return gradebook
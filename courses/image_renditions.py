@@ -0,0 +1,52 @@
+"""
+Уменьшенные копии (renditions) загруженных изображений.
+
+Аватары, обложки курсов, изображения уровней и фото домашних заданий
+загружаются в исходном размере (часто это многомегабайтные фото с телефона).
+Здесь строятся копии фиксированной ширины в WebP/JPEG, которые отдаются
+в списках и через srcset. Модуль не зависит от Django, поэтому функции
+можно выполнять в пуле процессов.
+"""
+import io
+import os
+
+from PIL import Image, ImageOps
+
+RENDITIONS_DIR = 'renditions'
+
+FORMAT_EXTENSIONS = {
+    'webp': 'webp',
+    'jpeg': 'jpg',
+}
+
+
+def rendition_name(name, width, fmt='webp'):
+    """Имя файла копии: renditions/<путь без расширения>_w<ширина>.<ext>."""
+    stem = os.path.splitext(name)[0]
+    return f'{RENDITIONS_DIR}/{stem}_w{width}.{FORMAT_EXTENSIONS[fmt]}'
+
+
+def make_renditions(data, widths, fmt='webp', quality=80):
+    """Строит копии изображения для каждой ширины из widths.
+
+    Принимает байты исходного файла, возвращает {ширина: байты}.
+    Изображение не увеличивается: для узких исходников копия
+    сохраняет исходную ширину.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if fmt == 'webp' and 'A' in image.getbands() else 'RGB')
+
+    result = {}
+    for width in sorted(widths):
+        copy = image.copy()
+        if copy.width > width:
+            height = max(1, round(copy.height * width / copy.width))
+            copy = copy.resize((width, height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if fmt == 'webp':
+            copy.save(buffer, 'WEBP', quality=quality, method=4)
+        else:
+            copy.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+        result[width] = buffer.getvalue()
+    return result
@@ -0,0 +1,291 @@
+"""
+Очередь фоновых задач на базе таблицы Job.
+
+Задачи ставятся в очередь из запросов (enqueue) и выполняются отдельным
+процессом: python manage.py run_jobs. Обработчики регистрируются
+декоратором job_handler по типу задачи (Job.kind).
+"""
+import io
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Course, Group, Job, Lesson, Module, Student
+
+logger = logging.getLogger(__name__)
+
+JOB_HANDLERS = {}
+
+SLIDE_CONVERSION = 'convert_lesson_slides'
+IMAGE_RENDITIONS = 'image_renditions'
+LESSON_PACKAGE = 'build_lesson_package'
+MODULE_PACKAGE = 'build_module_package'
+STUDENT_IMPORT = 'import_students'
+GROUP_COURSE_ATTACH = 'attach_group_to_course'
+STUDENT_DELETE = 'delete_students'
+MEDIA_CLEANUP = 'delete_media_files'
+
+# Подписи задач, которые администратор видит на странице с прогрессом
+JOB_TITLES = {
+    STUDENT_IMPORT: 'Импорт студентов из Excel',
+    GROUP_COURSE_ATTACH: 'Прикрепление группы к курсу',
+    STUDENT_DELETE: 'Удаление студентов',
+    MEDIA_CLEANUP: 'Удаление файлов',
+}
+
+
+def job_handler(kind):
+    """Регистрирует функцию-обработчик для задач типа kind."""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, unique=False, **payload):
+    """Ставит задачу в очередь.
+
+    При unique=True новая задача не создаётся, если такая же
+    (тот же kind и payload) уже ожидает выполнения.
+    """
+    if unique:
+        existing = Job.objects.filter(kind=kind, status='pending', payload=payload).first()
+        if existing:
+            return existing
+    return Job.objects.create(kind=kind, payload=payload)
+
+
+def enqueue_slide_conversion(lesson):
+    """Помечает урок как ожидающий конвертации и ставит задачу в очередь.
+
+    Без локального хранилища урок сразу помечается 'failed' — слайды
+    рендерит браузер.
+    """
+    from .services import server_slides_supported
+
+    if not server_slides_supported():
+        Lesson.objects.filter(pk=lesson.pk).update(converted_slides_status='failed')
+        lesson.converted_slides_status = 'failed'
+        return None
+    Lesson.objects.filter(pk=lesson.pk).update(converted_slides_status='pending')
+    lesson.converted_slides_status = 'pending'
+    return enqueue(SLIDE_CONVERSION, unique=True, lesson_id=lesson.pk)
+
+
+def enqueue_image_renditions(fieldfile):
+    """Ставит в очередь построение уменьшенных копий загруженного изображения."""
+    from .services import image_renditions_missing
+
+    if fieldfile and image_renditions_missing(fieldfile.name):
+        return enqueue(IMAGE_RENDITIONS, unique=True, name=fieldfile.name)
+    return None
+
+
+def report_progress(job, done, total):
+    """Сохраняет прогресс задачи отдельным UPDATE, не трогая остальные поля."""
+    job.progress_done, job.progress_total = done, total
+    Job.objects.filter(pk=job.pk).update(progress_done=done, progress_total=total)
+
+
+def job_status(job):
+    """Состояние задачи для опроса со страницы администратора."""
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'title': JOB_TITLES.get(job.kind, job.kind),
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'done': job.progress_done,
+        'total': job.progress_total,
+        'percent': job.progress_percent,
+        'finished': job.is_finished,
+        'result': job.result,
+        # Трейсбек администратору не нужен — только последняя строка
+        'error': job.error.strip().splitlines()[-1] if job.status == 'failed' and job.error.strip() else '',
+    }
+
+
+def claim_next_job(kinds=None):
+    """Атомарно забирает следующую ожидающую задачу или возвращает None.
+
+    Захват делается условным UPDATE по статусу, поэтому несколько
+    воркеров не получат одну и ту же задачу (в том числе на SQLite).
+    """
+    queryset = Job.objects.filter(status='pending')
+    if kinds:
+        queryset = queryset.filter(kind__in=kinds)
+    for job_id in queryset.order_by('created_at').values_list('id', flat=True)[:10]:
+        claimed = Job.objects.filter(pk=job_id, status='pending').update(
+            status='running', started_at=timezone.now()
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def is_last_attempt(job):
+    """True, если после ошибки в текущей попытке задача уйдёт в 'failed'."""
+    return job.attempts >= job.max_attempts
+
+
+def run_job(job):
+    """Выполняет задачу и сохраняет итоговый статус."""
+    handler = JOB_HANDLERS.get(job.kind)
+    job.attempts += 1
+    try:
+        if handler is None:
+            raise LookupError(f'Нет обработчика для задачи {job.kind}')
+        handler(job)
+    except Exception:
+        job.error = traceback.format_exc()
+        job.status = 'failed' if is_last_attempt(job) else 'pending'
+        logger.exception('Ошибка выполнения задачи %s', job)
+    else:
+        job.error = ''
+        job.status = 'completed'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'attempts', 'error', 'result', 'finished_at'])
+    return job
+
+
+def requeue_stale_jobs(older_than=timedelta(minutes=30)):
+    """Возвращает в очередь задачи, «зависшие» после падения воркера."""
+    with transaction.atomic():
+        return Job.objects.filter(
+            status='running', started_at__lt=timezone.now() - older_than
+        ).update(status='pending')
+
+
+@job_handler(SLIDE_CONVERSION)
+def _convert_lesson_slides(job):
+    from .services import convert_lesson_slides, server_slides_supported
+
+    lesson = Lesson.objects.filter(pk=job.payload.get('lesson_id')).first()
+    if lesson is None or not (lesson.convert_pdf_to_slides and lesson.pdf):
+        return
+    if not server_slides_supported():
+        # Задача поставлена до перехода на удалённое хранилище
+        Lesson.objects.filter(pk=lesson.pk).update(converted_slides_status='failed')
+        return
+    try:
+        convert_lesson_slides(lesson)
+    except Exception:
+        # Иначе урок навсегда остаётся 'pending'/'processing': course_detail таких не переставляет в очередь
+        if is_last_attempt(job):
+            Lesson.objects.filter(pk=lesson.pk).update(converted_slides_status='failed')
+        raise
+    if lesson.converted_slides_status == 'completed':
+        enqueue(LESSON_PACKAGE, unique=True, lesson_id=lesson.pk)
+
+
+@job_handler(IMAGE_RENDITIONS)
+def _generate_image_renditions(job):
+    from .services import generate_image_renditions
+
+    generate_image_renditions(job.payload['name'])
+
+
+@job_handler(LESSON_PACKAGE)
+def _build_lesson_package(job):
+    from .services import build_lesson_package
+
+    lesson = Lesson.objects.filter(pk=job.payload.get('lesson_id')).first()
+    if lesson is None:
+        return
+    build_lesson_package(lesson)
+    # Архивы модулей собираются из тех же слайдов
+    for module_id in lesson.module_set.values_list('id', flat=True):
+        enqueue(MODULE_PACKAGE, unique=True, module_id=module_id)
+
+
+@job_handler(MODULE_PACKAGE)
+def _build_module_package(job):
+    from .services import build_module_package
+
+    module = Module.objects.filter(pk=job.payload.get('module_id')).first()
+    if module is not None:
+        build_module_package(module)
+
+
+@job_handler(STUDENT_IMPORT)
+def _import_students(job):
+    from .student_import import default_group_name, import_students_from_excel
+
+    name = job.payload['file']
+    # Группа создаётся один раз на задачу: повторная попытка импортирует в неё же
+    group = Group.objects.filter(pk=(job.result or {}).get('group_id')).first()
+    if group is None:
+        group = Group.objects.create(name=job.payload.get('group_name') or default_group_name())
+        job.result = {'group_id': group.pk, 'group': group.name}
+        Job.objects.filter(pk=job.pk).update(result=job.result)
+    imported = False
+    try:
+        with default_storage.open(name, 'rb') as file:
+            # Удалённое хранилище может не поддерживать seek, нужный openpyxl
+            data = io.BytesIO(file.read())
+        report = import_students_from_excel(
+            data,
+            group=group,
+            progress=lambda done, total: report_progress(job, done, total),
+        )
+        job.result = report.as_result()
+        imported = True
+    finally:
+        # Файл нужен до последней попытки; после неё он в хранилище уже не нужен
+        if imported or is_last_attempt(job):
+            default_storage.delete(name)
+        if not imported and is_last_attempt(job):
+            Group.objects.filter(pk=group.pk, students=None).delete()
+
+
+@job_handler(GROUP_COURSE_ATTACH)
+def _attach_group_to_course(job):
+    from .services import enroll_group_in_course
+
+    group = Group.objects.filter(pk=job.payload.get('group_id')).first()
+    course = Course.objects.filter(pk=job.payload.get('course_id')).first()
+    if group is None or course is None:
+        job.result = {'attached': 0, 'message': 'Группа или курс не найдены'}
+        return
+
+    enrollment = enroll_group_in_course(group, course,
+                                        progress=lambda done, total: report_progress(job, done, total))
+    message = f'Студенты из группы "{group.name}" прикреплены к курсу "{course.title}": {enrollment.attached}'
+    if enrollment.skipped:
+        message += f'; пропущено с завершённой или приостановленной записью: {len(enrollment.skipped)}'
+    job.result = {
+        'attached': enrollment.attached,
+        'skipped': enrollment.skipped,
+        'message': message,
+    }
+
+
+@job_handler(STUDENT_DELETE)
+def _delete_students(job):
+    from .services import bulk_delete_students
+
+    student_ids = job.payload.get('student_ids', [])
+    batch_size = settings.STUDENT_IMPORT_BATCH_SIZE
+    deleted = 0
+    for start in range(0, len(student_ids), batch_size):
+        chunk = student_ids[start:start + batch_size]
+        user_ids = Student.objects.filter(pk__in=chunk).values_list('user_id', flat=True)
+        deleted += bulk_delete_students(user_ids).users
+        report_progress(job, start + len(chunk), len(student_ids))
+    job.result = {'deleted': deleted, 'message': f'Удалено студентов: {deleted}'}
+
+
+@job_handler(MEDIA_CLEANUP)
+def _delete_media_files(job):
+    names = job.payload.get('names', [])
+    for index, name in enumerate(names, 1):
+        # delete() отсутствующего файла не ошибка — повтор задачи безопасен
+        default_storage.delete(name)
+        if index % 100 == 0 or index == len(names):
+            report_progress(job, index, len(names))
+    job.result = {'deleted': len(names)}
@@ -0,0 +1,281 @@
+"""
+Рейтинги студентов: общий, по группам и по преподавателям.
+
+Места хранятся в LeaderboardRank — по строке на студента в каждом
+рейтинге, где он участвует. Целиком они пересчитываются оконной функцией
+RANK() OVER (PARTITION BY группа/преподаватель ORDER BY stars DESC)
+(команда rebuild_leaderboard, массовые изменения состава). При изменении
+звёзд одного студента места обновляются инкрементально: сдвигаются
+только строки со звёздами между старым и новым значением. «Моё место» —
+чтение одной строки по уникальному индексу, страницы — keyset по
+(rank, student_id).
+"""
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Q, Value, Window
+from django.db.models.functions import Rank
+
+from .models import Group, LeaderboardRank, Student
+
+GLOBAL, GROUP, TEACHER = LeaderboardRank.GLOBAL, LeaderboardRank.GROUP, LeaderboardRank.TEACHER
+BATCH_SIZE = 1000
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class LeaderboardRow(NamedTuple):
+    rank: int
+    stars: int
+    student: Student
+
+
+def _ranked_rows(scope, scope_id=None):
+    """(scope_id, student_id, stars, rank) для всех рейтингов вида scope или одного из них."""
+    if scope == GLOBAL:
+        queryset = Student.objects.annotate(
+            scope_id=Value(0, output_field=IntegerField()),
+            rank=Window(Rank(), order_by=F('stars').desc()),
+        ).values_list('scope_id', 'pk', 'stars', 'rank')
+    elif scope == TEACHER:
+        queryset = Student.objects.filter(teacher__isnull=False)
+        if scope_id is not None:
+            queryset = queryset.filter(teacher_id=scope_id)
+        queryset = queryset.annotate(
+            rank=Window(Rank(), partition_by=[F('teacher_id')], order_by=F('stars').desc()),
+        ).values_list('teacher_id', 'pk', 'stars', 'rank')
+    else:
+        queryset = Group.students.through.objects.all()
+        if scope_id is not None:
+            queryset = queryset.filter(group_id=scope_id)
+        queryset = queryset.annotate(
+            rank=Window(Rank(), partition_by=[F('group_id')], order_by=F('student__stars').desc()),
+        ).values_list('group_id', 'student_id', 'student__stars', 'rank')
+    return queryset.iterator(chunk_size=BATCH_SIZE)
+
+
+def rebuild_leaderboard(scope=None, scope_id=None):
+    """Пересчитывает места оконной функцией: все рейтинги, один вид или один рейтинг.
+
+    Возвращает число записанных строк.
+    """
+    scopes = [scope] if scope else [GLOBAL, TEACHER, GROUP]
+    written = 0
+    with transaction.atomic():
+        for current in scopes:
+            stale = LeaderboardRank.objects.filter(scope=current)
+            if scope_id is not None:
+                stale = stale.filter(scope_id=scope_id)
+            stale.delete()
+            batch = []
+            for partition, student_id, stars, rank in _ranked_rows(current, scope_id):
+                batch.append(LeaderboardRank(scope=current, scope_id=partition, student_id=student_id,
+                                             stars=stars, rank=rank))
+                if len(batch) >= BATCH_SIZE:
+                    written += len(LeaderboardRank.objects.bulk_create(batch))
+                    batch = []
+            written += len(LeaderboardRank.objects.bulk_create(batch))
+    return written
+
+
+def _partitions(student):
+    """Рейтинги, в которых студент участвует сейчас: {(scope, scope_id)}."""
+    partitions = {(GLOBAL, 0)}
+    if student.teacher_id:
+        partitions.add((TEACHER, student.teacher_id))
+    group_ids = Group.students.through.objects.filter(student_id=student.pk).values_list('group_id', flat=True)
+    partitions.update((GROUP, group_id) for group_id in group_ids)
+    return partitions
+
+
+def _in_partitions(partitions):
+    condition = Q(pk__in=[])
+    for scope, scope_id in partitions:
+        condition |= Q(scope=scope, scope_id=scope_id)
+    return condition
+
+
+def _shift(partitions, student, delta, low=None, high=None):
+    """Сдвигает места остальных студентов со звёздами в [low, high) на delta."""
+    if not partitions:
+        return
+    others = LeaderboardRank.objects.filter(_in_partitions(partitions)).exclude(student=student)
+    if low is not None:
+        others = others.filter(stars__gte=low)
+    if high is not None:
+        others = others.filter(stars__lt=high)
+    others.update(rank=F('rank') + delta)
+
+
+def sync_student(student):
+    """Инкрементально обновляет места студента после изменения звёзд, преподавателя или групп.
+
+    RANK() = 1 + число студентов с большим числом звёзд, поэтому при
+    переходе old → new меняются места только у студентов со звёздами
+    между old и new: на единицу вниз при росте, вверх при снижении.
+    """
+    stars = student.stars
+    with transaction.atomic():
+        current = _partitions(student)
+        entries = {
+            (entry.scope, entry.scope_id): entry
+            for entry in LeaderboardRank.objects.select_for_update().filter(student=student)
+        }
+
+        # Вышел из рейтинга (сменил преподавателя или группу): те, кто был ниже, поднимаются
+        left = defaultdict(set)
+        for key, entry in entries.items():
+            if key not in current:
+                left[entry.stars].add(key)
+        for old_stars, partitions in left.items():
+            _shift(partitions, student, -1, high=old_stars)
+        if left:
+            LeaderboardRank.objects.filter(student=student).filter(
+                _in_partitions(set().union(*left.values()))
+            ).delete()
+
+        moved = defaultdict(set)
+        for key, entry in entries.items():
+            if key in current and entry.stars != stars:
+                moved[entry.stars].add(key)
+        for old_stars, partitions in moved.items():
+            if stars > old_stars:
+                _shift(partitions, student, 1, low=old_stars, high=stars)
+            else:
+                _shift(partitions, student, -1, low=stars, high=old_stars)
+
+        joined = current - set(entries)
+        _shift(joined, student, 1, high=stars)
+
+        changed = set().union(*moved.values(), joined)
+        if not changed:
+            return
+        above = dict(
+            ((row['scope'], row['scope_id']), row['count'])
+            for row in LeaderboardRank.objects.filter(_in_partitions(changed), stars__gt=stars).exclude(
+                student=student,
+            ).values('scope', 'scope_id').annotate(count=Count('pk'))
+        )
+        updated = []
+        for key in changed - joined:
+            entry = entries[key]
+            entry.stars, entry.rank = stars, above.get(key, 0) + 1
+            updated.append(entry)
+        LeaderboardRank.objects.bulk_update(updated, ['stars', 'rank'])
+        LeaderboardRank.objects.bulk_create([
+            LeaderboardRank(scope=scope, scope_id=scope_id, student=student, stars=stars,
+                            rank=above.get((scope, scope_id), 0) + 1)
+            for scope, scope_id in joined
+        ])
+
+
+def remove_student(student):
+    """Перед удалением студента поднимает тех, кто был ниже него во всех его рейтингах."""
+    left = defaultdict(set)
+    for scope, scope_id, stars in LeaderboardRank.objects.filter(student=student).values_list(
+        'scope', 'scope_id', 'stars',
+    ):
+        left[stars].add((scope, scope_id))
+    for old_stars, partitions in left.items():
+        _shift(partitions, student, -1, high=old_stars)
+
+
+def drop_scope(scope, scope_id):
+    """Удаляет рейтинг удалённой группы или преподавателя."""
+    LeaderboardRank.objects.filter(scope=scope, scope_id=scope_id).delete()
+
+
+def student_rank(student, scope=GLOBAL, scope_id=0):
+    """Место студента одним чтением строки по индексу (None — не участвует).
+
+    Для общего рейтинга, ещё не построенного командой rebuild_leaderboard,
+    место считается одним COUNT.
+    """
+    rank = LeaderboardRank.objects.filter(scope=scope, scope_id=scope_id, student=student).values_list(
+        'rank', flat=True,
+    ).first()
+    if rank is None and scope == GLOBAL:
+        rank = Student.objects.filter(stars__gt=student.stars).count() + 1
+    return rank
+
+
+def encode_cursor(row):
+    return f'{row.rank}~{row.student.pk}'
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор «место~id студента»; ValueError — если курсор испорчен."""
+    rank, student_id = cursor.split('~')
+    return int(rank), int(student_id)
+
+
+def _rows(queryset):
+    return [LeaderboardRow(entry.rank, entry.stars, entry.student) for entry in queryset]
+
+
+def _entries(scope, scope_id, min_stars):
+    queryset = LeaderboardRank.objects.filter(scope=scope, scope_id=scope_id).select_related('student__user')
+    if min_stars is not None:
+        queryset = queryset.filter(stars__gte=min_stars)
+    return queryset
+
+
+def _before(queryset, key):
+    rank, student_id = key
+    return queryset.filter(Q(rank__lt=rank) | Q(rank=rank, student_id__lt=student_id))
+
+
+def _after(queryset, key):
+    rank, student_id = key
+    return queryset.filter(Q(rank__gt=rank) | Q(rank=rank, student_id__gt=student_id))
+
+
+def _page(queryset, rows):
+    """(rows, prev_cursor, next_cursor) — курсоры только если в ту сторону есть строки."""
+    if not rows:
+        return rows, None, None
+    first, last = rows[0], rows[-1]
+    has_prev = _before(queryset, (first.rank, first.student.pk)).exists()
+    has_next = _after(queryset, (last.rank, last.student.pk)).exists()
+    return rows, encode_cursor(first) if has_prev else None, encode_cursor(last) if has_next else None
+
+
+def leaderboard_page(scope=GLOBAL, scope_id=0, after=None, before=None, limit=DEFAULT_LIMIT, min_stars=None):
+    """Страница рейтинга после курсора after (или перед курсором before).
+
+    Возвращает (rows, prev_cursor, next_cursor).
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    queryset = _entries(scope, scope_id, min_stars)
+    if before:
+        rows = _rows(_before(queryset, decode_cursor(before)).order_by('-rank', '-student_id')[:limit])[::-1]
+    else:
+        page = _after(queryset, decode_cursor(after)) if after else queryset
+        rows = _rows(page.order_by('rank', 'student_id')[:limit])
+    return _page(queryset, rows)
+
+
+def leaderboard_around(student, scope=GLOBAL, scope_id=0, limit=DEFAULT_LIMIT, min_stars=None):
+    """Страница рейтинга, в середине которой — сам студент; если его нет в рейтинге — первая."""
+    limit = max(1, min(limit, MAX_LIMIT))
+    queryset = _entries(scope, scope_id, min_stars)
+    own = queryset.filter(student=student).values_list('rank', 'student_id').first()
+    if own is None:
+        return leaderboard_page(scope, scope_id, limit=limit, min_stars=min_stars)
+    above = _rows(_before(queryset, own).order_by('-rank', '-student_id')[:limit // 2])[::-1]
+    below = _rows(queryset.filter(Q(rank__gt=own[0]) | Q(rank=own[0], student_id__gte=own[1])).order_by(
+        'rank', 'student_id',
+    )[:limit - len(above)])
+    return _page(queryset, above + below)
+
+
+def group_leaderboards(group_ids):
+    """{id группы: [LeaderboardRow]} для нескольких групп одним запросом."""
+    boards = defaultdict(list)
+    entries = LeaderboardRank.objects.filter(scope=GROUP, scope_id__in=list(group_ids)).select_related(
+        'student__user',
+    ).order_by('scope_id', 'rank', 'student_id')
+    for entry in entries:
+        boards[entry.scope_id].append(LeaderboardRow(entry.rank, entry.stars, entry.student))
+    return boards
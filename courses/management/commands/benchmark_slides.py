@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.slide_renderer import FORMAT_EXTENSIONS, render_pdf, thumbnail_path
+
+
+class Command(BaseCommand):
+    help = 'Замеряет скорость конвертации PDF в слайды: страниц/сек и байт/страницу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pdf_path', help='Путь к PDF-файлу')
+        parser.add_argument('--format', action='append', dest='formats', choices=sorted(FORMAT_EXTENSIONS),
+                            help='Формат изображений (можно указать несколько раз)')
+        parser.add_argument('--dpi', type=int, default=settings.SLIDES_DPI)
+        parser.add_argument('--quality', type=int, default=settings.SLIDES_IMAGE_QUALITY)
+        parser.add_argument('--workers', type=int, action='append', dest='workers_list',
+                            help='Число процессов (можно указать несколько раз)')
+
+    def handle(self, *args, **options):
+        pdf_path = options['pdf_path']
+        if not os.path.exists(pdf_path):
+            raise CommandError(f'Файл не найден: {pdf_path}')
+
+        formats = options['formats'] or [settings.SLIDES_IMAGE_FORMAT]
+        workers_list = options['workers_list'] or [settings.SLIDES_RENDER_WORKERS or os.cpu_count() or 1]
+
+        for fmt in formats:
+            for workers in workers_list:
+                output_dir = tempfile.mkdtemp(prefix='slides-bench-')
+                try:
+                    started = time.perf_counter()
+                    paths = render_pdf(
+                        pdf_path, output_dir,
+                        dpi=options['dpi'], fmt=fmt, quality=options['quality'],
+                        thumb_width=settings.SLIDES_THUMBNAIL_WIDTH, workers=workers,
+                    )
+                    elapsed = time.perf_counter() - started
+                    pages = len(paths) or 1
+                    image_bytes = sum(os.path.getsize(p) for p in paths)
+                    thumb_bytes = sum(os.path.getsize(thumbnail_path(p)) for p in paths)
+                finally:
+                    shutil.rmtree(output_dir, ignore_errors=True)
+
+                self.stdout.write(
+                    f'{fmt:>5} dpi={options["dpi"]} workers={workers}: '
+                    f'{len(paths)} стр. за {elapsed:.2f} с, '
+                    f'{len(paths) / elapsed if elapsed else 0:.1f} стр/с, '
+                    f'{image_bytes // pages} байт/стр, миниатюра {thumb_bytes // pages} байт/стр'
+                )
@@ -0,0 +1,49 @@
+import os
+import shutil
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.asset_server import APP_DIR, BUNDLE_PATH
+
+# Зависимости загружаются браузером через importmap в index.html (esm.sh)
+EXTERNAL_MODULES = ('react', 'react/*', 'react-dom', 'react-dom/*', 'lucide-react')
+
+
+class Command(BaseCommand):
+    help = 'Собирает .tsx исходники AI генератора картинок в один JS-бандл (нужен Node.js/npx)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--esbuild', default='esbuild@0.24.2', help='Пакет esbuild для npx')
+        parser.add_argument('--no-minify', action='store_true', help='Не минифицировать бандл')
+
+    def handle(self, *args, **options):
+        npx = shutil.which('npx')
+        if npx is None:
+            raise CommandError('npx не найден: установите Node.js')
+
+        command = [
+            npx, '--yes', options['esbuild'], 'index.tsx',
+            '--bundle', '--format=esm', '--jsx=automatic', '--target=es2020',
+            f'--outfile={BUNDLE_PATH}',
+        ]
+        command += [f'--external:{module}' for module in EXTERNAL_MODULES]
+        if not options['no_minify']:
+            command.append('--minify')
+
+        result = subprocess.run(command, cwd=APP_DIR, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(result.stderr or result.stdout)
+
+        bundle = os.path.join(APP_DIR, BUNDLE_PATH)
+        # Бандл отдаётся без авторизации: ключ Gemini (он нужен только courses/gemini.py) попасть в него не должен
+        key = settings.GEMINI_API_KEY
+        with open(bundle, 'rb') as handle:
+            leaked = bool(key) and key.encode() in handle.read()
+        if leaked:
+            os.remove(bundle)
+            raise CommandError('В бандл попал GEMINI_API_KEY — бандл удалён')
+
+        size = os.path.getsize(bundle)
+        self.stdout.write(self.style.SUCCESS(f'Бандл собран: {BUNDLE_PATH} ({size} байт)'))
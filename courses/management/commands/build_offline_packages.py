@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from courses.jobs import LESSON_PACKAGE, enqueue
+from courses.models import Lesson
+
+
+class Command(BaseCommand):
+    help = 'Ставит в очередь сборку офлайн-архивов для уже сконвертированных уроков (и их модулей)'
+
+    def handle(self, *args, **options):
+        lesson_ids = Lesson.objects.filter(converted_slides_status='completed').values_list('id', flat=True)
+        for lesson_id in lesson_ids:
+            enqueue(LESSON_PACKAGE, unique=True, lesson_id=lesson_id)
+        self.stdout.write(self.style.SUCCESS(f'Поставлено в очередь: {len(lesson_ids)}'))
@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from courses.models import DEDUP_FILE_FIELDS, Lesson, LessonSlide
+from courses.services import BLOBS_DIR, acquire_blob, build_slides_manifest, content_sha256
+
+
+class Command(BaseCommand):
+    help = 'Переводит уже загруженные PDF уроков и ДЗ в хранилище с дедупликацией и объединяет одинаковые слайды'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, сколько места освободится')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.report()
+            return
+        self.dedupe_files()
+        self.dedupe_slides()
+
+    def legacy_files(self):
+        """{имя файла: [(модель, поле, pk), ...]} для файлов вне blobs/."""
+        files = defaultdict(list)
+        for model, field_name in DEDUP_FILE_FIELDS:
+            rows = (
+                model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .exclude(**{f'{field_name}__startswith': BLOBS_DIR + '/'})
+                .values_list('pk', field_name)
+            )
+            for pk, name in rows:
+                files[name].append((model, field_name, pk))
+        return files
+
+    def report(self):
+        by_hash = defaultdict(list)
+        for name in self.legacy_files():
+            if default_storage.exists(name):
+                with default_storage.open(name, 'rb') as handle:
+                    by_hash[content_sha256(handle)].append((name, default_storage.size(name)))
+        total = sum(size for files in by_hash.values() for _, size in files)
+        unique = sum(files[0][1] for files in by_hash.values())
+        self.stdout.write(
+            f'Файлов: {sum(len(files) for files in by_hash.values())}, уникальных: {len(by_hash)}, '
+            f'освободится {(total - unique) / 1024 / 1024:.1f} МБ'
+        )
+
+    def dedupe_files(self):
+        moved = removed = 0
+        for name, refs in self.legacy_files().items():
+            if not default_storage.exists(name):
+                self.stdout.write(self.style.WARNING(f'Файл не найден: {name}'))
+                continue
+            for model, field_name, pk in refs:
+                instance = model.objects.get(pk=pk)
+                fieldfile = getattr(instance, field_name)
+                new_name = acquire_blob(fieldfile, delete_source=False)
+                # update() вместо save(): сигналы не должны повторно учитывать ссылку
+                model.objects.filter(pk=pk).update(**{field_name: new_name})
+                moved += 1
+            default_storage.delete(name)
+            removed += 1
+        self.stdout.write(self.style.SUCCESS(f'Переведено ссылок: {moved}, удалено исходных файлов: {removed}'))
+
+    def dedupe_slides(self):
+        """Уроки с одинаковым отпечатком начинают использовать слайды одного урока."""
+        groups = defaultdict(list)
+        lessons = Lesson.objects.filter(converted_slides_status='completed').exclude(slides_fingerprint='')
+        for lesson in lessons.order_by('pk'):
+            groups[lesson.slides_fingerprint].append(lesson)
+
+        merged = freed = 0
+        for donor, *others in groups.values():
+            donor_slides = list(donor.slides.order_by('order'))
+            if not donor_slides or not others:
+                continue
+            shared = {slide.image.name for slide in donor_slides} | {slide.thumbnail.name for slide in donor_slides}
+            for lesson in others:
+                old_files = set()
+                for slide in lesson.slides.all():
+                    old_files.update(name for name in (slide.image.name, slide.thumbnail.name) if name)
+                with transaction.atomic():
+                    lesson.slides.all().delete()
+                    slides = LessonSlide.objects.bulk_create([
+                        LessonSlide(lesson=lesson, image=slide.image.name, thumbnail=slide.thumbnail.name, order=slide.order)
+                        for slide in donor_slides
+                    ])
+                    Lesson.objects.filter(pk=lesson.pk).update(slides_manifest=build_slides_manifest(lesson, slides))
+                for name in old_files - shared:
+                    if not LessonSlide.objects.filter(Q(image=name) | Q(thumbnail=name)).exists() and default_storage.exists(name):
+                        default_storage.delete(name)
+                        freed += 1
+                merged += 1
+        self.stdout.write(self.style.SUCCESS(f'Уроков с общими слайдами: {merged}, удалено изображений: {freed}'))
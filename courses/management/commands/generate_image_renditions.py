@@ -0,0 +1,54 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from courses.image_renditions import make_renditions
+from courses.models import RENDITION_IMAGE_FIELDS
+from courses.services import generate_image_renditions, image_renditions_missing
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии для уже загруженных изображений (аватары, обложки, уровни, фото ДЗ)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Число процессов')
+        parser.add_argument('--force', action='store_true', help='Пересоздать уже существующие копии')
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field_name in RENDITION_IMAGE_FIELDS:
+            names.update(
+                model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True)
+            )
+        if not options['force']:
+            names = {name for name in names if image_renditions_missing(name)}
+        names = sorted(name for name in names if default_storage.exists(name))
+        self.stdout.write(f'Изображений к обработке: {len(names)}')
+
+        args = (settings.IMAGE_RENDITION_WIDTHS, settings.IMAGE_RENDITION_FORMAT, settings.IMAGE_RENDITION_QUALITY)
+        done = failed = 0
+        # Чтение и запись идут через default_storage в основном процессе,
+        # в пуле выполняется только декодирование и сжатие
+        workers = max(1, options['workers'])
+        batch_size = workers * 4
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+            # Файлы читаются пачками, чтобы не держать в памяти все исходники сразу
+            for start in range(0, len(names), batch_size):
+                futures = {}
+                for name in names[start:start + batch_size]:
+                    with default_storage.open(name, 'rb') as handle:
+                        futures[name] = pool.submit(make_renditions, handle.read(), *args)
+                for name, future in futures.items():
+                    try:
+                        generate_image_renditions(name, force=True, renditions=future.result())
+                        done += 1
+                    except Exception as e:
+                        failed += 1
+                        self.stdout.write(self.style.ERROR(f'{name}: {e}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Готово: {done}, ошибок: {failed}'))
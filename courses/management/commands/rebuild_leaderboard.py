@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.leaderboard import rebuild_leaderboard
+from courses.models import LeaderboardRank
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает места студентов в рейтингах (общем, групп и преподавателей) оконной функцией'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scope', choices=[scope for scope, _ in LeaderboardRank.SCOPE_CHOICES],
+                            help='Пересчитать только рейтинги этого вида')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_leaderboard(options['scope'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано мест: {written} за {time.perf_counter() - started:.2f} с'
+        ))
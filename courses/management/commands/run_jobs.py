@@ -0,0 +1,34 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from courses.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди (конвертация слайдов и др.)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Выполнить все ожидающие задачи и выйти')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Пауза между опросами очереди, сек.')
+        parser.add_argument('--kind', action='append', dest='kinds', help='Обрабатывать только задачи этого типа')
+        parser.add_argument('--stale-minutes', type=int, default=30, help='Через сколько минут считать задачу зависшей')
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs(timedelta(minutes=options['stale_minutes']))
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Возвращено в очередь зависших задач: {requeued}'))
+
+        self.stdout.write('Воркер фоновых задач запущен')
+        while True:
+            job = claim_next_job(options['kinds'])
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            job = run_job(job)
+            style = self.style.SUCCESS if job.status == 'completed' else self.style.ERROR
+            self.stdout.write(style(f'{job}'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0047_job_lesson_processing_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonslide',
+            name='thumbnail',
+            field=models.ImageField(blank=True, default='', upload_to='slides/'),
+        ),
+    ]
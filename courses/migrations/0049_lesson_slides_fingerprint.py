@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0048_lessonslide_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='pdf_sha256',
+            field=models.CharField(blank=True, default='', help_text='SHA-256 исходного PDF/PPTX на момент конвертации', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='slides_fingerprint',
+            field=models.CharField(blank=True, default='', help_text='Отпечаток файла и параметров конвертации слайдов', max_length=64),
+        ),
+    ]
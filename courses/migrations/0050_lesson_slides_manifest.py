@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0049_lesson_slides_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='slides_manifest',
+            field=models.JSONField(blank=True, help_text='Список слайдов урока, сохраняется после конвертации', null=True),
+        ),
+    ]
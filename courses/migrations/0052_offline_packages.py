@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0051_media_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='offline_package',
+            field=models.FileField(blank=True, help_text='Zip-архив слайдов для офлайн-просмотра', null=True, upload_to='packages/lessons/'),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='offline_package',
+            field=models.FileField(blank=True, help_text='Zip-архив слайдов всех уроков модуля', null=True, upload_to='packages/modules/'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0052_offline_packages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='progress_done',
+            field=models.PositiveIntegerField(default=0, verbose_name='Обработано'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='progress_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='Всего к обработке'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='result',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Результат'),
+        ),
+    ]
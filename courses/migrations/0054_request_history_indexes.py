@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0053_job_progress'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='courseaddrequest',
+            index=models.Index(fields=['-created_at', '-id'], name='courses_cou_created_7a1384_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='courseaddrequest',
+            index=models.Index(fields=['status', '-created_at'], name='courses_cou_status_8d8582_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='courseaddrequest',
+            index=models.Index(fields=['student', '-created_at'], name='courses_cou_student_d0de18_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profileeditrequest',
+            index=models.Index(fields=['-created_at', '-id'], name='courses_pro_created_6aa16b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profileeditrequest',
+            index=models.Index(fields=['status', '-created_at'], name='courses_pro_status_2800fd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profileeditrequest',
+            index=models.Index(fields=['student', '-created_at'], name='courses_pro_student_5cdc74_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentmessagerequest',
+            index=models.Index(fields=['-created_at', '-id'], name='courses_stu_created_2b60b0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentmessagerequest',
+            index=models.Index(fields=['status', '-created_at'], name='courses_stu_status_50c39a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentmessagerequest',
+            index=models.Index(fields=['student', '-created_at'], name='courses_stu_student_eb351a_idx'),
+        ),
+    ]
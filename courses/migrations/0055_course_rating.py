@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:28
+
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+def fill_course_rating(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    CourseFeedback = apps.get_model('courses', 'CourseFeedback')
+    stats = CourseFeedback.objects.values('course_id').annotate(avg=Avg('rating'), count=Count('id'))
+    for row in stats:
+        Course.objects.filter(pk=row['course_id']).update(rating_avg=row['avg'], rating_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0054_request_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='rating_avg',
+            field=models.FloatField(default=0, verbose_name='Средняя оценка'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Число отзывов'),
+        ),
+        migrations.RunPython(fill_course_rating, migrations.RunPython.noop),
+    ]
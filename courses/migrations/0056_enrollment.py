@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def _pairs(apps):
+    Course = apps.get_model('courses', 'Course')
+    Student = apps.get_model('courses', 'Student')
+    pairs = set(Course.students.through.objects.values_list('student_id', 'course_id'))
+    pairs |= set(Student.courses.through.objects.values_list('student_id', 'course_id'))
+    return sorted(pairs)
+
+
+def merge_enrollments(apps, schema_editor):
+    """Объединяет записи из Course.students и Student.courses в Enrollment."""
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    Enrollment.objects.bulk_create(
+        [Enrollment(student_id=student_id, course_id=course_id) for student_id, course_id in _pairs(apps)],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def split_enrollments(apps, schema_editor):
+    """Обратная миграция: копирует Enrollment в обе прежние таблицы."""
+    Course = apps.get_model('courses', 'Course')
+    Student = apps.get_model('courses', 'Student')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    pairs = list(Enrollment.objects.values_list('student_id', 'course_id'))
+    for through in (Course.students.through, Student.courses.through):
+        through.objects.bulk_create(
+            [through(student_id=student_id, course_id=course_id) for student_id, course_id in pairs],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0055_course_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Enrollment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enrolled_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата записи')),
+                ('status', models.CharField(choices=[('active', 'Обучается'), ('completed', 'Завершил'), ('suspended', 'Приостановлено')], default='active', max_length=20, verbose_name='Статус')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='courses.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='courses.student')),
+            ],
+            options={
+                'verbose_name': 'Запись на курс',
+                'verbose_name_plural': 'Записи на курсы',
+                'indexes': [models.Index(fields=['course', 'student'], name='courses_enr_course__454701_idx')],
+                'unique_together': {('student', 'course')},
+            },
+        ),
+        migrations.RunPython(merge_enrollments, split_enrollments),
+        # Поле M2M нельзя перевести на through= через AlterField: старые таблицы
+        # удаляются, а поля объявляются заново поверх Enrollment (без изменений схемы)
+        migrations.RemoveField(
+            model_name='course',
+            name='students',
+        ),
+        migrations.RemoveField(
+            model_name='student',
+            name='courses',
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='students',
+            field=models.ManyToManyField(blank=True, related_name='enrolled_courses', through='courses.Enrollment', to='courses.student'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='courses',
+            field=models.ManyToManyField(blank=True, related_name='students_set', through='courses.Enrollment', to='courses.course'),
+        ),
+    ]
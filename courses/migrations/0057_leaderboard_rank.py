@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, IntegerField, Value, Window
+from django.db.models.functions import Rank
+
+
+def build_ranks(apps, schema_editor):
+    """Первичное заполнение мест: RANK() по звёздам в каждом рейтинге."""
+    Student = apps.get_model('courses', 'Student')
+    Group = apps.get_model('courses', 'Group')
+    LeaderboardRank = apps.get_model('courses', 'LeaderboardRank')
+    by_stars = F('stars').desc()
+    sources = [
+        ('global', Student.objects.annotate(
+            partition=Value(0, output_field=IntegerField()), rank=Window(Rank(), order_by=by_stars),
+        ).values_list('partition', 'pk', 'stars', 'rank')),
+        ('teacher', Student.objects.filter(teacher__isnull=False).annotate(
+            rank=Window(Rank(), partition_by=[F('teacher_id')], order_by=by_stars),
+        ).values_list('teacher_id', 'pk', 'stars', 'rank')),
+        ('group', Group.students.through.objects.annotate(
+            rank=Window(Rank(), partition_by=[F('group_id')], order_by=F('student__stars').desc()),
+        ).values_list('group_id', 'student_id', 'student__stars', 'rank')),
+    ]
+    for scope, rows in sources:
+        LeaderboardRank.objects.bulk_create(
+            [
+                LeaderboardRank(scope=scope, scope_id=scope_id, student_id=student_id, stars=stars, rank=rank)
+                for scope_id, student_id, stars, rank in rows.iterator(chunk_size=1000)
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0056_enrollment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('global', 'Общий'), ('group', 'Группа'), ('teacher', 'Преподаватель')], max_length=10, verbose_name='Рейтинг')),
+                ('scope_id', models.PositiveIntegerField(default=0, verbose_name='Группа или преподаватель')),
+                ('stars', models.IntegerField(verbose_name='Звёзды')),
+                ('rank', models.PositiveIntegerField(verbose_name='Место')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_ranks', to='courses.student')),
+            ],
+            options={
+                'verbose_name': 'Место в рейтинге',
+                'verbose_name_plural': 'Места в рейтингах',
+                'indexes': [models.Index(fields=['scope', 'scope_id', 'rank', 'student'], name='courses_lea_scope_3c3eef_idx'), models.Index(fields=['scope', 'scope_id', 'stars'], name='courses_lea_scope_c81f37_idx')],
+                'unique_together': {('scope', 'scope_id', 'student')},
+            },
+        ),
+        migrations.RunPython(build_ranks, migrations.RunPython.noop),
+    ]
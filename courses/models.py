@@ -2,7 +2,7 @@ from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from .validators import validate_video_url
 import os
 from django.conf import settings
@@ -56,11 +56,15 @@ class Lesson(models.Model):
     )
     converted_slides_status = models.CharField(
         max_length=20, 
-        choices=[('pending', 'В ожидании'), ('completed', 'Завершено'), ('failed', 'Ошибка'), ('not_applicable', 'Неприменимо')], 
+        choices=[('pending', 'В ожидании'), ('processing', 'В обработке'), ('completed', 'Завершено'), ('failed', 'Ошибка'), ('not_applicable', 'Неприменимо')], 
         default='not_applicable',
         help_text='Статус конвертации PDF/PPTX в слайды'
     )
     slide_count = models.IntegerField(default=0, help_text='Количество сгенерированных слайдов')
+    pdf_sha256 = models.CharField(max_length=64, blank=True, default='', help_text='SHA-256 исходного PDF/PPTX на момент конвертации')
+    slides_fingerprint = models.CharField(max_length=64, blank=True, default='', help_text='Отпечаток файла и параметров конвертации слайдов')
+    slides_manifest = models.JSONField(null=True, blank=True, help_text='Список слайдов урока, сохраняется после конвертации')
+    offline_package = models.FileField(upload_to='packages/lessons/', blank=True, null=True, help_text='Zip-архив слайдов для офлайн-просмотра')
 
     def __str__(self):
         return self.title
@@ -78,6 +82,7 @@ class Lesson(models.Model):
 class LessonSlide(models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='slides')
     image = models.ImageField(upload_to='slides/')
+    thumbnail = models.ImageField(upload_to='slides/', blank=True, default='')
     order = models.IntegerField()
 
     class Meta:
@@ -90,54 +95,25 @@ class LessonSlide(models.Model):
 
 @receiver(post_save, sender=Lesson)
 def convert_pdf_to_slides_on_save(sender, instance, created, **kwargs):
+    """Ставит конвертацию PDF в слайды в очередь фоновых задач.
+
+    Сама конвертация выполняется воркером (manage.py run_jobs),
+    поэтому сохранение урока не блокируется на PyMuPDF.
+    """
     # Проверяем флаг, чтобы избежать рекурсии
-    if hasattr(instance, '_skip_conversion_signal') and instance._skip_conversion_signal:
+    if getattr(instance, '_skip_conversion_signal', False):
         return
     if kwargs.get('raw'): # If model is loading from fixtures, skip conversion
         return
 
-    from .services import handle_lesson_file_conversion
-    from .models import LessonSlide # Import here to avoid circular dependency
-
     if instance.convert_pdf_to_slides and instance.pdf:
-        # Устанавливаем временный флаг, чтобы избежать рекурсии при вызове save()
-        instance._skip_conversion_signal = True
-
-        # Удаляем существующие слайды, если они есть и урок обновляется
-        if not created: 
-            instance.slides.all().delete()
-
-        # Обновляем статус и количество слайдов
-        instance.converted_slides_status = 'pending'
-        instance.slide_count = 0
-        instance.save(update_fields=['converted_slides_status', 'slide_count'])
-        
-        image_paths = handle_lesson_file_conversion(instance)
-        
-        if image_paths:
-            for order, img_path in enumerate(image_paths):
-                # Путь должен быть относительным к MEDIA_ROOT
-                relative_path = os.path.relpath(img_path, settings.MEDIA_ROOT).replace('\\', '/')
-                print(f"DEBUG: img_path = {img_path}")
-                print(f"DEBUG: settings.MEDIA_ROOT = {settings.MEDIA_ROOT}")
-                print(f"DEBUG: relative_path to save = {relative_path}")
-                LessonSlide.objects.create(
-                    lesson=instance,
-                    image=relative_path,
-                    order=order + 1
-                )
-            instance.converted_slides_status = 'completed'
-            instance.slide_count = len(image_paths)
-        else:
-            instance.converted_slides_status = 'failed'
-            instance.slide_count = 0
-        
-        # Сохраняем окончательный статус. Важно: после этого вызова флаг должен быть удален
-        # или обработка флага должна быть завершена, чтобы не мешать будущим сохранениям.
-        instance.save(update_fields=['converted_slides_status', 'slide_count'])
+        from .services import slides_are_current
+        from .jobs import enqueue_slide_conversion
 
-        # Удаляем флаг после завершения обработки
-        del instance._skip_conversion_signal
+        # Правка названия и т.п. не меняет файл — слайды пересобирать не нужно
+        if slides_are_current(instance):
+            return
+        enqueue_slide_conversion(instance)
 
 
 class Quiz(models.Model):
@@ -176,6 +152,7 @@ class Module(models.Model):
     lessons = models.ManyToManyField(Lesson)
     description = models.TextField(null=True, blank=True, default="")
     quizzes = models.ManyToManyField(Quiz, blank=True)  # Связь с квизами
+    offline_package = models.FileField(upload_to='packages/modules/', blank=True, null=True, help_text='Zip-архив слайдов всех уроков модуля')
 
     def __str__(self):
         return self.title
@@ -186,10 +163,14 @@ class Course(models.Model):
     description = models.TextField()
     modules = models.ManyToManyField('Module', blank=True)
     course_code = models.CharField(max_length=5, blank=True, unique=True)
-    students = models.ManyToManyField('Student', related_name='enrolled_courses', blank=True)
+    # Обе стороны записи на курс (Course.students и Student.courses) хранятся в одной таблице Enrollment
+    students = models.ManyToManyField('Student', through='Enrollment', related_name='enrolled_courses', blank=True)
     teacher = models.ForeignKey('Teacher', on_delete=models.SET_NULL, null=True, blank=True, related_name='courses', verbose_name='Преподаватель')
     image = models.ImageField(upload_to='image/', null=True, blank=True)  # Новое поле для изображения
     stars = models.IntegerField(default=5, verbose_name='Звёзды за курс', help_text='Количество звёзд, которые получит студент за завершение курса')
+    # Денормализованная статистика отзывов, пересчитывается при сохранении/удалении CourseFeedback
+    rating_avg = models.FloatField(default=0, verbose_name='Средняя оценка')
+    rating_count = models.PositiveIntegerField(default=0, verbose_name='Число отзывов')
 
     def __str__(self):
         return self.title
@@ -246,11 +227,14 @@ class Course(models.Model):
     
     def get_average_rating(self):
         """Возвращает среднюю оценку курса"""
-        from django.db.models import Avg
-        avg_rating = self.feedbacks.aggregate(Avg('rating'))['rating__avg']
-        if avg_rating:
-            return round(avg_rating, 1)
-        return 0
+        return round(self.rating_avg, 1) if self.rating_count else 0
+
+    @classmethod
+    def update_rating(cls, course_id):
+        """Пересчитывает rating_avg/rating_count курса одним агрегатом и UPDATE без save()."""
+        from django.db.models import Avg, Count
+        stats = CourseFeedback.objects.filter(course_id=course_id).aggregate(avg=Avg('rating'), count=Count('id'))
+        cls.objects.filter(pk=course_id).update(rating_avg=stats['avg'] or 0, rating_count=stats['count'])
 
 
 # class StudentProgress(models.Model):
@@ -321,7 +305,7 @@ class Student(models.Model):
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
     phone_number = models.CharField(max_length=20, null=True, blank=True)
     email = models.EmailField(null=True, blank=True)
-    courses = models.ManyToManyField('Course', related_name='students_set', blank=True)
+    courses = models.ManyToManyField('Course', through='Enrollment', related_name='students_set', blank=True)
     teacher = models.ForeignKey('Teacher', on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_students', verbose_name='Преподаватель')
     stars = models.IntegerField(default=0)
     completed_quizzes = models.ManyToManyField(Quiz, through='QuizAttempt', related_name='completed_by')
@@ -402,6 +386,65 @@ class Student(models.Model):
         super().save(*args, **kwargs)
 
 
+class Enrollment(models.Model):
+    """Запись студента на курс — единственное хранилище связи студент–курс."""
+    STATUS_CHOICES = [
+        ('active', 'Обучается'),
+        ('completed', 'Завершил'),
+        ('suspended', 'Приостановлено'),
+    ]
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='enrollments')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
+    enrolled_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата записи')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active', verbose_name='Статус')
+
+    class Meta:
+        # Уникальный индекс (student, course) обслуживает поиск курсов студента,
+        # индекс (course, student) — поиск студентов курса
+        unique_together = ('student', 'course')
+        indexes = [
+            models.Index(fields=['course', 'student']),
+        ]
+        verbose_name = 'Запись на курс'
+        verbose_name_plural = 'Записи на курсы'
+
+    def __str__(self):
+        return f'{self.student} — {self.course}'
+
+
+class LeaderboardRank(models.Model):
+    """Место студента в рейтинге (материализованное, см. courses/leaderboard.py)."""
+    GLOBAL = 'global'
+    GROUP = 'group'
+    TEACHER = 'teacher'
+    SCOPE_CHOICES = [
+        (GLOBAL, 'Общий'),
+        (GROUP, 'Группа'),
+        (TEACHER, 'Преподаватель'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES, verbose_name='Рейтинг')
+    # id группы или преподавателя; 0 — общий рейтинг
+    scope_id = models.PositiveIntegerField(default=0, verbose_name='Группа или преподаватель')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='leaderboard_ranks')
+    stars = models.IntegerField(verbose_name='Звёзды')
+    rank = models.PositiveIntegerField(verbose_name='Место')
+
+    class Meta:
+        unique_together = ('scope', 'scope_id', 'student')
+        indexes = [
+            # Страницы рейтинга (keyset по месту и id) и сдвиг мест в диапазоне звёзд
+            models.Index(fields=['scope', 'scope_id', 'rank', 'student']),
+            models.Index(fields=['scope', 'scope_id', 'stars']),
+        ]
+        verbose_name = 'Место в рейтинге'
+        verbose_name_plural = 'Места в рейтингах'
+
+    def __str__(self):
+        return f'{self.student} — {self.rank}'
+
+
 class WheelSpin(models.Model):
     """Модель для отслеживания спина колеса фортуны"""
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='wheel_spins')
@@ -503,6 +546,13 @@ class ProfileEditRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     reviewed_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['status', '-created_at']),
+            models.Index(fields=['student', '-created_at']),
+        ]
+
 
 class CourseAddRequest(models.Model):
     student = models.ForeignKey('Student', on_delete=models.CASCADE)
@@ -514,6 +564,13 @@ class CourseAddRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     reviewed_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['status', '-created_at']),
+            models.Index(fields=['student', '-created_at']),
+        ]
+
 
 class Notification(models.Model):
     student = models.ForeignKey('Student', on_delete=models.CASCADE, related_name='notifications')
@@ -668,6 +725,13 @@ class StudentMessageRequest(models.Model):
     reviewed_at = models.DateTimeField(blank=True, null=True)
     unique_code = models.CharField(max_length=6, unique=True, editable=False, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['status', '-created_at']),
+            models.Index(fields=['student', '-created_at']),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.unique_code:
             while True:
@@ -781,6 +845,15 @@ class CourseFeedback(models.Model):
         return range(self.rating)
 
 
+@receiver(post_save, sender=CourseFeedback)
+@receiver(post_delete, sender=CourseFeedback)
+def update_course_rating(sender, instance, raw=False, **kwargs):
+    """Поддерживает Course.rating_avg/rating_count в актуальном состоянии."""
+    if raw:
+        return
+    Course.update_rating(instance.course_id)
+
+
 class Teacher(models.Model):
     """Модель преподавателя"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='teacher_profile')
@@ -905,5 +978,236 @@ class HomeworkPhoto(models.Model):
         return f"Фото {self.id} - {self.submission.homework.title}"
 
 
+# Поля с изображениями, для которых строятся уменьшенные копии (см. image_renditions.py)
+RENDITION_IMAGE_FIELDS = (
+    (Student, 'avatar'),
+    (Teacher, 'avatar'),
+    (Course, 'image'),
+    (Level, 'image'),
+    (HomeworkPhoto, 'photo'),
+)
+
+
+def track_rendition_images(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Запоминает поля с новым изображением: копии строятся только для них."""
+    instance._changed_rendition_images = []
+    if raw:
+        return
+    for model, field_name in RENDITION_IMAGE_FIELDS:
+        if sender is not model or (update_fields is not None and field_name not in update_fields):
+            continue
+        fieldfile = getattr(instance, field_name)
+        if not fieldfile:
+            continue
+        old_name = None
+        if instance.pk:
+            old_name = sender.objects.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+        if not fieldfile._committed or fieldfile.name != old_name:
+            instance._changed_rendition_images.append(field_name)
+
+
+def enqueue_image_renditions_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .jobs import enqueue_image_renditions
+
+    # Повторное сохранение с тем же файлом (например, начисление звёзд) задачу не ставит
+    for field_name in getattr(instance, '_changed_rendition_images', ()):
+        enqueue_image_renditions(getattr(instance, field_name))
+    instance._changed_rendition_images = []
+
+
+for _model, _field_name in RENDITION_IMAGE_FIELDS:
+    pre_save.connect(
+        track_rendition_images,
+        sender=_model,
+        dispatch_uid=f'image_renditions_track_{_model.__name__}',
+    )
+    post_save.connect(
+        enqueue_image_renditions_on_save,
+        sender=_model,
+        dispatch_uid=f'image_renditions_{_model.__name__}',
+    )
+
+class Job(models.Model):
+    """Фоновая задача, выполняемая воркером (manage.py run_jobs)"""
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('completed', 'Завершено'),
+        ('failed', 'Ошибка'),
+    ]
+
+    kind = models.CharField(max_length=50, verbose_name='Тип задачи')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    max_attempts = models.PositiveIntegerField(default=3, verbose_name='Максимум попыток')
+    error = models.TextField(blank=True, default='', verbose_name='Ошибка')
+    progress_done = models.PositiveIntegerField(default=0, verbose_name='Обработано')
+    progress_total = models.PositiveIntegerField(default=0, verbose_name='Всего к обработке')
+    result = models.JSONField(default=dict, blank=True, verbose_name='Результат')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name='Начало выполнения')
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name='Окончание выполнения')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['kind', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.get_status_display()})"
 
+    @property
+    def progress_percent(self):
+        if self.status == 'completed':
+            return 100
+        if not self.progress_total:
+            return 0
+        return min(100, self.progress_done * 100 // self.progress_total)
+
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+
+
+class MediaBlob(models.Model):
+    """Файл в контентно-адресуемом хранилище (blobs/<sha256>).
+
+    Одинаковые по содержимому загрузки хранятся один раз; ref_count —
+    число полей моделей, ссылающихся на файл. При обнулении файл удаляется.
+    """
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name='SHA-256')
+    name = models.CharField(max_length=255, unique=True, verbose_name='Путь в хранилище')
+    size = models.BigIntegerField(default=0, verbose_name='Размер, байт')
+    ref_count = models.PositiveIntegerField(default=0, verbose_name='Число ссылок')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Файл хранилища'
+        verbose_name_plural = 'Файлы хранилища'
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+# Поля с файлами, которые хранятся с дедупликацией по содержимому (см. MediaBlob)
+DEDUP_FILE_FIELDS = (
+    (Lesson, 'pdf'),
+    (Homework, 'pdf_file'),
+)
+
+
+def intern_media_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .services import acquire_blob, release_blob
+
+    for model, field_name in DEDUP_FILE_FIELDS:
+        if sender is not model:
+            continue
+        fieldfile = getattr(instance, field_name)
+        old_name = None
+        if instance.pk:
+            old_name = sender.objects.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+        if (fieldfile.name or '') == (old_name or ''):
+            continue
+        if fieldfile:
+            acquire_blob(fieldfile)
+        release_blob(old_name)
+
+
+def release_media_on_delete(sender, instance, **kwargs):
+    from .services import release_blob
+
+    for model, field_name in DEDUP_FILE_FIELDS:
+        if sender is model:
+            release_blob(getattr(instance, field_name).name)
+
+
+for _model, _field_name in DEDUP_FILE_FIELDS:
+    pre_save.connect(intern_media_on_save, sender=_model, dispatch_uid=f'media_blobs_{_model.__name__}')
+    post_delete.connect(release_media_on_delete, sender=_model, dispatch_uid=f'media_blobs_delete_{_model.__name__}')
+
+
+def invalidate_teacher_stats_on_change(sender, raw=False, **kwargs):
+    if raw:
+        return
+    from .services import invalidate_teacher_stats
+
+    invalidate_teacher_stats()
+
+
+# Изменения, от которых зависит статистика дашборда преподавателя
+for _model in (Course, Module, Lesson, Quiz, Enrollment):
+    post_delete.connect(invalidate_teacher_stats_on_change, sender=_model,
+                        dispatch_uid=f'teacher_stats_delete_{_model.__name__}')
+for _model in (Course, Enrollment):
+    post_save.connect(invalidate_teacher_stats_on_change, sender=_model,
+                      dispatch_uid=f'teacher_stats_save_{_model.__name__}')
+for _through in (Course.modules.through, Module.lessons.through, Module.quizzes.through, Enrollment):
+    m2m_changed.connect(invalidate_teacher_stats_on_change, sender=_through,
+                        dispatch_uid=f'teacher_stats_m2m_{_through.__name__}')
+
+
+def invalidate_gradebook_on_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .gradebook import invalidate_gradebook
+
+    if sender is Homework:
+        teacher_id = instance.teacher_id
+    elif sender is HomeworkSubmission:
+        teacher_id = Homework.objects.filter(pk=instance.homework_id).values_list('teacher_id', flat=True).first()
+    else:
+        teacher_id = Student.objects.filter(pk=instance.student_id).values_list('teacher_id', flat=True).first()
+    invalidate_gradebook(teacher_id)
+
+
+# Изменения оценок в журнале преподавателя
+for _model in (QuizAttempt, Homework, HomeworkSubmission):
+    post_save.connect(invalidate_gradebook_on_change, sender=_model, dispatch_uid=f'gradebook_save_{_model.__name__}')
+    post_delete.connect(invalidate_gradebook_on_change, sender=_model,
+                        dispatch_uid=f'gradebook_delete_{_model.__name__}')
+
+
+@receiver(post_save, sender=Student)
+def sync_leaderboard_on_save(sender, instance, raw=False, **kwargs):
+    """Инкрементально обновляет места студента в рейтингах (звёзды, преподаватель)."""
+    if raw:
+        return
+    from .leaderboard import sync_student
+
+    sync_student(instance)
+
+
+@receiver(pre_delete, sender=Student)
+def sync_leaderboard_on_delete(sender, instance, **kwargs):
+    from .leaderboard import remove_student
+
+    remove_student(instance)
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Teacher)
+def drop_leaderboard_scope(sender, instance, **kwargs):
+    from .leaderboard import GROUP, TEACHER, drop_scope
+
+    drop_scope(GROUP if sender is Group else TEACHER, instance.pk)
+
+
+@receiver(m2m_changed, sender=Group.students.through)
+def sync_leaderboard_on_membership(sender, instance, action, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    from .leaderboard import GROUP, rebuild_leaderboard, sync_student
 
+    if isinstance(instance, Group):
+        rebuild_leaderboard(GROUP, instance.pk)
+    else:
+        sync_student(instance)
@@ -0,0 +1,110 @@
+"""
+Отдача защищённых медиафайлов (видео и PDF уроков, файлы домашних заданий).
+
+Права доступа проверяет представление; здесь — только формирование ответа:
+поддержка Range/206 для перемотки видео, потоковая отдача блоками через
+FileResponse и, при настроенном фронт-прокси, передача файла nginx
+(X-Accel-Redirect) или Apache (X-Sendfile), чтобы не занимать sync-воркер.
+"""
+import os
+import re
+from mimetypes import guess_type
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangedFile:
+    """Обёртка над файлом, читающая не больше length байт с позиции start."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Разбирает заголовок Range и возвращает (start, end) включительно.
+
+    None — заголовка нет или он не поддерживается (несколько диапазонов),
+    тогда отдаётся весь файл. ValueError — диапазон вне файла (416).
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # bytes=-N — последние N байт
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def _accel_response(fieldfile, content_type, filename, as_attachment):
+    response = HttpResponse(content_type=content_type)
+    if settings.PROTECTED_MEDIA_SERVER == 'nginx':
+        response['X-Accel-Redirect'] = settings.PROTECTED_MEDIA_INTERNAL_URL + quote(fieldfile.name)
+    else:
+        response['X-Sendfile'] = fieldfile.path
+    disposition = 'attachment' if as_attachment else 'inline'
+    response['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(filename)}"
+    return response
+
+
+def protected_file_response(request, fieldfile, as_attachment=False, filename=None):
+    """Ответ с содержимым файла модели с поддержкой Range-запросов."""
+    filename = filename or os.path.basename(fieldfile.name)
+    content_type = guess_type(filename)[0] or 'application/octet-stream'
+    if not isinstance(fieldfile.storage, FileSystemStorage):
+        # Удалённое хранилище (S3): отдаём короткоживущую подписанную ссылку,
+        # Range обслуживает само хранилище
+        return HttpResponseRedirect(fieldfile.url)
+    if settings.PROTECTED_MEDIA_SERVER in ('nginx', 'apache'):
+        # Range, If-Modified-Since и sendfile() обрабатывает прокси
+        return _accel_response(fieldfile, content_type, filename, as_attachment)
+
+    size = fieldfile.size
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = fieldfile.storage.open(fieldfile.name, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type,
+                                as_attachment=as_attachment, filename=filename)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangedFile(file, start, end - start + 1), status=206,
+                                content_type=content_type,
+                                as_attachment=as_attachment, filename=filename)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response.block_size = settings.PROTECTED_MEDIA_CHUNK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
@@ -0,0 +1,134 @@
+"""
+Единая история запросов студентов (профиль, добавление курса, произвольные).
+
+Три таблицы объединяются одним запросом UNION ALL с одинаковым набором
+колонок и сортируются в БД по настоящему времени создания. Страницы
+выбираются по ключу (keyset): курсор — (created_at, type, id) последней
+строки; условие «после курсора» накладывается на каждую часть UNION
+отдельно, поэтому фильтры по статусу, студенту и дате используют индексы
+каждой таблицы.
+"""
+from datetime import datetime
+from typing import NamedTuple
+
+from django.db.models import CharField, F, Q, TextField, Value
+from django.db.models.functions import Coalesce
+
+from .models import CourseAddRequest, ProfileEditRequest, StudentMessageRequest
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+CURSOR_SEPARATOR = '~'
+
+STATUS_LABELS = dict(ProfileEditRequest._meta.get_field('status').choices)
+
+
+class RequestKind(NamedTuple):
+    model: type
+    label: str
+    code: str  # тип запроса в admin_requests_page и get_request_details
+    course: object
+    message: object
+
+
+REQUEST_KINDS = {
+    'profile_edit': RequestKind(
+        model=ProfileEditRequest,
+        label='Редактирование профиля',
+        code='profile',
+        course=Value(''),
+        message=Value('', output_field=TextField()),
+    ),
+    'course_add': RequestKind(
+        model=CourseAddRequest,
+        label='Добавление курса',
+        code='course',
+        course=Coalesce('assigned_course__title', 'course_name', Value('Не указан')),
+        message=Coalesce('comment', Value(''), output_field=TextField()),
+    ),
+    'message': RequestKind(
+        model=StudentMessageRequest,
+        label='Произвольный запрос',
+        code='message',
+        course=Value(''),
+        message=F('message'),
+    ),
+}
+
+COLUMNS = (
+    'type', 'id', 'student_id', 'student_username', 'student_first_name', 'student_last_name',
+    'status', 'created_at', 'reviewed_at', 'course', 'message', 'admin_response',
+)
+
+
+def encode_cursor(row):
+    return CURSOR_SEPARATOR.join((row['created_at'].isoformat(), row['type'], str(row['id'])))
+
+
+def decode_cursor(cursor):
+    """(created_at, type, id) из строки курсора; ValueError, если курсор некорректен."""
+    created_at, kind, pk = cursor.split(CURSOR_SEPARATOR)
+    if kind not in REQUEST_KINDS:
+        raise ValueError(f'Неизвестный тип запроса: {kind}')
+    return datetime.fromisoformat(created_at), kind, int(pk)
+
+
+def _after_cursor(kind, cursor):
+    """Строки части kind, идущие после курсора при сортировке (-created_at, -type, -id)."""
+    created_at, cursor_kind, cursor_id = cursor
+    if kind < cursor_kind:
+        return Q(created_at__lte=created_at)
+    if kind > cursor_kind:
+        return Q(created_at__lt=created_at)
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=cursor_id)
+
+
+def history_queryset(student_id=None, status=None, types=None, cursor=None):
+    """UNION ALL запросов выбранных типов, от новых к старым."""
+    parts = []
+    for kind, spec in REQUEST_KINDS.items():
+        if types and kind not in types:
+            continue
+        queryset = spec.model.objects.all()
+        if student_id:
+            queryset = queryset.filter(student_id=student_id)
+        if status:
+            queryset = queryset.filter(status=status)
+        if cursor:
+            queryset = queryset.filter(_after_cursor(kind, cursor))
+        parts.append(queryset.annotate(
+            type=Value(kind, output_field=CharField()),
+            student_username=F('student__user__username'),
+            student_first_name=F('student__user__first_name'),
+            student_last_name=F('student__user__last_name'),
+            course=spec.course,
+            message_text=spec.message,
+        ).values_list(*COLUMNS[:-2], 'message_text', 'admin_response'))
+    if not parts:
+        return None
+    first, *rest = parts
+    return first.union(*rest, all=True).order_by('-created_at', '-type', '-id')
+
+
+def _row(values):
+    row = dict(zip(COLUMNS, values))
+    spec = REQUEST_KINDS[row['type']]
+    full_name = f"{row['student_first_name'] or ''} {row['student_last_name'] or ''}".strip()
+    row.update(
+        student=full_name or row['student_username'],
+        status_display=STATUS_LABELS.get(row['status'], row['status']),
+        type_label=spec.label,
+        request_type=spec.code,
+        admin_response=row['admin_response'] or '',
+    )
+    return row
+
+
+def history_page(student_id=None, status=None, types=None, cursor=None, limit=DEFAULT_LIMIT):
+    """Страница истории после строки курсора: (строки, курсор следующей страницы или None)."""
+    queryset = history_queryset(student_id, status, types, decode_cursor(cursor) if cursor else None)
+    if queryset is None:
+        return [], None
+    rows = [_row(values) for values in queryset[:limit + 1]]
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
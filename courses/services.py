@@ -1,38 +1,60 @@
+import hashlib
+import json
 import os
+import tempfile
+import zipfile
+from typing import NamedTuple
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
 from PIL import Image
-from django.db.models import Count, Sum
-from .models import Achievement, Student, StudentAchievement, QuizAttempt, CourseResult, Notification, Level
+from django.db.models import Count, Sum, Exists, Max, OuterRef, Q, F, Subquery
+from .models import (
+    Achievement, Student, StudentAchievement, QuizAttempt, CourseResult, Notification, Level,
+    Course, Module, Quiz, Lesson, LessonSlide, Homework, HomeworkSubmission, HomeworkPhoto, MediaBlob,
+    Enrollment, Group, LeaderboardRank, User,
+)
 import fitz  # PyMuPDF for PDF processing
 from pptx import Presentation
+from .direct_uploads import UploadTarget
+from .leaderboard import rebuild_leaderboard
+from .image_renditions import rendition_name, make_renditions
+from .slide_renderer import (
+    FORMAT_EXTENSIONS, render_pdf, thumbnail_path, render_single_page, file_lock, page_count,
+)
 
 # Ensure MEDIA_ROOT/slides exists
 SLIDES_ROOT = os.path.join(settings.MEDIA_ROOT, 'slides')
 os.makedirs(SLIDES_ROOT, exist_ok=True)
 
-def convert_pdf_to_images(pdf_path, lesson_id):
+def convert_pdf_to_images(pdf_path, slides_key, dpi=None, fmt=None, workers=None):
     """
-    Converts each page of a PDF into an image and saves it.
-    Requires PyMuPDF (fitz) and Pillow.
+    Converts each page of a PDF into an image (WebP/JPEG/PNG) plus a thumbnail.
+    Pages are rendered in parallel by slide_renderer; resolution, format and
+    number of processes come from the SLIDES_* settings unless overridden.
+    Images are written to SLIDES_ROOT/<slides_key>.
     """
     images_paths = []
     try:
-        doc = fitz.open(pdf_path)
-        output_dir = os.path.join(SLIDES_ROOT, str(lesson_id))
-        os.makedirs(output_dir, exist_ok=True)
-
-        for i, page in enumerate(doc):
-            pix = page.get_pixmap()
-            img_path = os.path.join(output_dir, f'page_{i+1}.png')
-            pix.save(img_path)
-            images_paths.append(img_path)
-        doc.close()
+        output_dir = os.path.join(SLIDES_ROOT, str(slides_key))
+        images_paths = render_pdf(
+            pdf_path,
+            output_dir,
+            dpi=dpi or settings.SLIDES_DPI,
+            fmt=fmt or settings.SLIDES_IMAGE_FORMAT,
+            quality=settings.SLIDES_IMAGE_QUALITY,
+            thumb_width=settings.SLIDES_THUMBNAIL_WIDTH,
+            workers=workers or settings.SLIDES_RENDER_WORKERS,
+        )
     except Exception as e:
         print(f"Error converting PDF {pdf_path}: {e}")
         # Log the error, maybe send a notification to admin
     return images_paths
 
-def convert_pptx_to_images(pptx_path, lesson_id):
+def convert_pptx_to_images(pptx_path, slides_key):
     """
     Converts each slide of a PPTX into an image and saves it.
     Requires python-pptx and Pillow.
@@ -40,7 +62,7 @@ def convert_pptx_to_images(pptx_path, lesson_id):
     images_paths = []
     try:
         prs = Presentation(pptx_path)
-        output_dir = os.path.join(SLIDES_ROOT, str(lesson_id))
+        output_dir = os.path.join(SLIDES_ROOT, str(slides_key))
         os.makedirs(output_dir, exist_ok=True)
 
         for i, slide in enumerate(prs.slides):
@@ -62,22 +84,625 @@ def convert_pptx_to_images(pptx_path, lesson_id):
         print(f"Error converting PPTX {pptx_path}: {e}")
     return images_paths
 
-def handle_lesson_file_conversion(lesson_instance):
+def handle_lesson_file_conversion(lesson_instance, slides_key=None):
     """
     Handles the conversion of PDF/PPTX files associated with a lesson
     into a series of images if convert_pdf_to_slides is True.
+    slides_key is the directory under SLIDES_ROOT (lesson id by default).
     """
+    slides_key = slides_key or lesson_instance.id
     if lesson_instance.convert_pdf_to_slides and lesson_instance.pdf:
         file_extension = os.path.splitext(lesson_instance.pdf.path)[1].lower()
         if file_extension == '.pdf':
             print(f"Converting PDF: {lesson_instance.pdf.path}")
-            return convert_pdf_to_images(lesson_instance.pdf.path, lesson_instance.id)
+            return convert_pdf_to_images(lesson_instance.pdf.path, slides_key)
         elif file_extension in ['.pptx', '.ppt']:
             print(f"Converting PPTX: {lesson_instance.pdf.path}")
-            return convert_pptx_to_images(lesson_instance.pdf.path, lesson_instance.id)
+            return convert_pptx_to_images(lesson_instance.pdf.path, slides_key)
     return [] 
 
 
+def server_slides_supported():
+    """True, если слайды можно рендерить на сервере.
+
+    PyMuPDF читает PDF по пути на диске, а слайды и кэш страниц пишутся в
+    MEDIA_ROOT, поэтому нужен локальный FileSystemStorage. При удалённом
+    хранилище (MEDIA_STORAGE=s3) страница курса рендерит PDF в браузере.
+    """
+    return isinstance(default_storage, FileSystemStorage)
+
+
+def slide_conversion_fingerprint(lesson):
+    """SHA-256 от хэша исходного файла и параметров конвертации."""
+    params = ':'.join(str(value) for value in (
+        lesson_pdf_hash(lesson),
+        settings.SLIDES_DPI,
+        settings.SLIDES_IMAGE_FORMAT,
+        settings.SLIDES_IMAGE_QUALITY,
+        settings.SLIDES_THUMBNAIL_WIDTH,
+    ))
+    return hashlib.sha256(params.encode()).hexdigest()
+
+
+def slides_are_current(lesson):
+    """True, если слайды уже сконвертированы из того же файла с теми же параметрами."""
+    if lesson.converted_slides_status != 'completed' or not lesson.slides_fingerprint:
+        return False
+    try:
+        return lesson.slides_fingerprint == slide_conversion_fingerprint(lesson)
+    except (OSError, ValueError):
+        return False
+
+
+def build_slides_manifest(lesson, slides=None):
+    """Манифест слайдов урока: порядок, пути к изображениям и миниатюрам."""
+    if slides is None:
+        slides = lesson.slides.all().order_by('order')
+    return {
+        'version': lesson.slides_fingerprint or lesson.pdf_sha256 or '',
+        'count': len(slides),
+        'slides': [
+            {
+                'order': slide.order,
+                'image': slide.image.name,
+                'thumbnail': slide.thumbnail.name if slide.thumbnail else '',
+            }
+            for slide in slides
+        ],
+    }
+
+
+def convert_lesson_slides(lesson):
+    """Конвертирует файл урока в слайды и обновляет LessonSlide и статус урока.
+
+    Вызывается из фонового воркера, а не из HTTP-запроса. Если отпечаток
+    (хэш файла + параметры) не изменился, повторная конвертация не делается.
+    Слайды хранятся в каталоге по отпечатку, поэтому уроки с одинаковым
+    файлом используют одни и те же изображения: если такой файл уже
+    сконвертирован для другого урока, слайды просто копируются.
+    Статус и количество слайдов обновляются через queryset.update(), чтобы
+    не вызывать повторно сигнал post_save урока.
+    """
+    fingerprint = slide_conversion_fingerprint(lesson)
+    if lesson.slides_fingerprint == fingerprint and lesson.slides.exists():
+        Lesson.objects.filter(pk=lesson.pk).update(converted_slides_status='completed')
+        lesson.converted_slides_status = 'completed'
+        return []
+
+    Lesson.objects.filter(pk=lesson.pk).update(converted_slides_status='processing')
+
+    donor = (
+        Lesson.objects.filter(slides_fingerprint=fingerprint, converted_slides_status='completed')
+        .exclude(pk=lesson.pk).filter(slides__isnull=False).first()
+    )
+    if donor is not None:
+        image_paths = []
+        slides = [
+            LessonSlide(lesson=lesson, image=slide.image.name, thumbnail=slide.thumbnail.name, order=slide.order)
+            for slide in donor.slides.order_by('order')
+        ]
+    else:
+        image_paths = handle_lesson_file_conversion(lesson, slides_key=f'shared/{fingerprint[:32]}')
+        slides = []
+    for order, img_path in enumerate(image_paths):
+        # Путь должен быть относительным к MEDIA_ROOT
+        relative_path = os.path.relpath(img_path, settings.MEDIA_ROOT).replace('\\', '/')
+        thumb_path = thumbnail_path(img_path)
+        thumbnail = ''
+        if os.path.exists(thumb_path):
+            thumbnail = os.path.relpath(thumb_path, settings.MEDIA_ROOT).replace('\\', '/')
+        slides.append(LessonSlide(lesson=lesson, image=relative_path, thumbnail=thumbnail, order=order + 1))
+
+    with transaction.atomic():
+        lesson.slides.all().delete()
+        LessonSlide.objects.bulk_create(slides)
+        fields = {
+            'converted_slides_status': 'completed' if slides else 'failed',
+            'slide_count': len(slides),
+            'pdf_sha256': lesson_pdf_hash(lesson),
+            'slides_fingerprint': fingerprint if slides else '',
+        }
+        lesson.slides_fingerprint = fields['slides_fingerprint']
+        lesson.pdf_sha256 = fields['pdf_sha256']
+        fields['slides_manifest'] = build_slides_manifest(lesson, slides)
+        Lesson.objects.filter(pk=lesson.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(lesson, name, value)
+    return image_paths
+
+
+BLOBS_DIR = 'blobs'
+
+
+def blob_name(sha256, filename):
+    """Путь blob в хранилище: blobs/<2 символа>/<sha256><расширение>."""
+    return f'{BLOBS_DIR}/{sha256[:2]}/{sha256}{os.path.splitext(filename)[1].lower()}'
+
+
+def content_sha256(content):
+    """SHA-256 файла; для загрузок берётся хэш, посчитанный обработчиком загрузки."""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def acquire_blob(fieldfile, delete_source=True):
+    """Переводит файл поля модели в контентно-адресуемое хранилище.
+
+    Если такой же файл уже есть, новая копия не сохраняется (а уже
+    загруженная — удаляется, если delete_source), поле начинает ссылаться
+    на существующий blob.
+    Счётчик ссылок blob увеличивается на 1. Возвращает имя blob.
+    """
+    storage = fieldfile.storage
+    if fieldfile.name.startswith(BLOBS_DIR + '/') and fieldfile._committed:
+        MediaBlob.objects.filter(name=fieldfile.name).update(ref_count=F('ref_count') + 1)
+        return fieldfile.name
+
+    uploaded_name = fieldfile.name if fieldfile._committed else None
+    content = fieldfile.file if not fieldfile._committed else storage.open(fieldfile.name, 'rb')
+    try:
+        sha256 = content_sha256(content)
+        with transaction.atomic():
+            blob, created = MediaBlob.objects.select_for_update().get_or_create(
+                sha256=sha256,
+                defaults={'name': blob_name(sha256, fieldfile.name), 'size': content.size},
+            )
+            if not storage.exists(blob.name):
+                storage.save(blob.name, content)
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+    finally:
+        if uploaded_name:
+            content.close()
+    if delete_source and uploaded_name and uploaded_name != blob.name:
+        storage.delete(uploaded_name)
+
+    fieldfile.name = blob.name
+    fieldfile._committed = True
+    return blob.name
+
+
+def release_blob(name):
+    """Уменьшает счётчик ссылок blob; файл без ссылок удаляется после коммита."""
+    if not name or not name.startswith(BLOBS_DIR + '/'):
+        return
+    released = MediaBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    if released:
+        transaction.on_commit(lambda: delete_unreferenced_blob(name))
+
+
+def delete_unreferenced_blob(name):
+    """Удаляет blob без ссылок — файл и строку — под блокировкой строки.
+
+    Строка с ref_count=0 живёт до этого момента: acquire_blob того же
+    содержимого либо успевает раньше (счётчик уже не 0, файл остаётся),
+    либо ждёт на select_for_update и после удаления записывает файл заново.
+    """
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(name=name, ref_count=0).first()
+        if blob is None:
+            return False
+        default_storage.delete(name)
+        blob.delete()
+    return True
+
+
+def _write_package(name, manifest, files):
+    """Собирает zip: manifest.json и файлы [(путь в архиве, имя в хранилище)].
+
+    Изображения уже сжаты (WebP/JPEG), поэтому кладутся без deflate —
+    архив собирается быстро, а размер почти не меняется.
+    """
+    with tempfile.TemporaryFile() as tmp:
+        with zipfile.ZipFile(tmp, 'w') as archive:
+            archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=1),
+                             compress_type=zipfile.ZIP_DEFLATED)
+            for arcname, storage_name in files:
+                with default_storage.open(storage_name, 'rb') as handle:
+                    archive.writestr(arcname, handle.read(), compress_type=zipfile.ZIP_STORED)
+        tmp.seek(0)
+        return default_storage.save(name, File(tmp))
+
+
+def _package_slides(lesson, prefix):
+    slides, files = [], []
+    for slide in lesson.slides.order_by('order'):
+        arcname = f'{prefix}{slide.order:03d}{os.path.splitext(slide.image.name)[1]}'
+        slides.append({'order': slide.order, 'image': arcname})
+        files.append((arcname, slide.image.name))
+    return slides, files
+
+
+def _replace_package(instance, name, manifest, files):
+    old_name = instance.offline_package.name if instance.offline_package else ''
+    new_name = _write_package(name, manifest, files) if files else ''
+    type(instance).objects.filter(pk=instance.pk).update(offline_package=new_name)
+    instance.offline_package = new_name
+    if old_name and old_name != new_name:
+        default_storage.delete(old_name)
+    return new_name
+
+
+def build_lesson_package(lesson):
+    """Zip-архив слайдов урока с manifest.json для офлайн-просмотра.
+
+    Имя архива содержит версию слайдов, поэтому пересборка нужна только
+    после новой конвертации. Возвращает имя файла в хранилище или ''.
+    """
+    version = (lesson.slides_fingerprint or '')[:16]
+    name = f'packages/lessons/{lesson.pk}/{version}.zip'
+    if lesson.offline_package and lesson.offline_package.name == name and default_storage.exists(name):
+        return name
+    slides, files = _package_slides(lesson, 'slides/')
+    manifest = {'lesson_id': lesson.pk, 'title': lesson.title, 'version': version, 'slides': slides}
+    return _replace_package(lesson, name, manifest, files)
+
+
+def build_module_package(module):
+    """Zip-архив слайдов всех сконвертированных уроков модуля."""
+    lessons = list(
+        module.lessons.filter(converted_slides_status='completed').exclude(slides_fingerprint='').order_by('id')
+    )
+    version = hashlib.sha256(
+        ':'.join(f'{lesson.pk}-{lesson.slides_fingerprint}' for lesson in lessons).encode()
+    ).hexdigest()[:16]
+    name = f'packages/modules/{module.pk}/{version}.zip'
+    if module.offline_package and module.offline_package.name == name and default_storage.exists(name):
+        return name
+
+    manifest = {'module_id': module.pk, 'title': module.title, 'version': version, 'lessons': []}
+    files = []
+    for lesson in lessons:
+        slides, lesson_files = _package_slides(lesson, f'lessons/{lesson.pk}/')
+        manifest['lessons'].append({'lesson_id': lesson.pk, 'title': lesson.title, 'slides': slides})
+        files.extend(lesson_files)
+    return _replace_package(module, name, manifest, files)
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 содержимого файла, читается блоками."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def lesson_pdf_hash(lesson):
+    """Хэш PDF урока; кэшируется по пути, размеру и mtime файла."""
+    path = lesson.pdf.path
+    stat = os.stat(path)
+    cache_key = f'pdf-sha256:{hashlib.md5(path.encode()).hexdigest()}:{stat.st_size}:{stat.st_mtime_ns}'
+    digest = cache.get(cache_key)
+    if digest is None:
+        digest = file_sha256(path)
+        cache.set(cache_key, digest, None)
+    return digest
+
+
+def lesson_pdf_page_count(lesson, pdf_hash):
+    cache_key = f'pdf-pages:{pdf_hash}'
+    count = cache.get(cache_key)
+    if count is None:
+        count = page_count(lesson.pdf.path)
+        cache.set(cache_key, count, None)
+    return count
+
+
+def render_lesson_slide(lesson, page_number, dpi=None):
+    """Возвращает путь к изображению страницы PDF урока, рендеря её при первом обращении.
+
+    Кэш лежит в MEDIA_ROOT/slides/<lesson>/<hash>/ и зависит от содержимого
+    PDF и DPI, поэтому замена файла автоматически даёт новые URL/ETag.
+    Одновременные первые запросы одной страницы ждут друг друга на
+    файловой блокировке, и страница рендерится один раз.
+    Возвращает (path, etag, page_count, version) или None, если страницы нет;
+    version — версия PDF для URL страниц (?v=).
+    """
+    dpi = dpi or settings.SLIDES_DPI
+    fmt = settings.SLIDES_IMAGE_FORMAT
+    pdf_hash = lesson_pdf_hash(lesson)
+    total = lesson_pdf_page_count(lesson, pdf_hash)
+    if not 1 <= page_number <= total:
+        return None
+
+    cache_dir = os.path.join(SLIDES_ROOT, str(lesson.pk), pdf_hash[:32])
+    path = os.path.join(cache_dir, f'page_{page_number}_{dpi}.{FORMAT_EXTENSIONS[fmt]}')
+    etag = f'"{pdf_hash[:16]}-{dpi}-{page_number}-{fmt}"'
+    if not os.path.exists(path):
+        with file_lock(f'{path}.lock'):
+            if not os.path.exists(path):
+                render_single_page(
+                    lesson.pdf.path, page_number - 1, path,
+                    dpi=dpi, fmt=fmt, quality=settings.SLIDES_IMAGE_QUALITY,
+                )
+    return path, etag, total, pdf_hash[:16]
+
+
+def user_can_view_lesson(user, lesson) -> bool:
+    """Может ли пользователь просматривать материалы урока.
+
+    Администраторы видят всё; преподаватель — уроки своих курсов;
+    студент — уроки курсов, на которых он обучается (запись в статусе
+    'active').
+    """
+    if user.is_staff or user.is_superuser or getattr(user, 'is_admin', False):
+        return True
+    lesson_id = lesson.pk if isinstance(lesson, Lesson) else lesson
+    course_modules = Module.lessons.through.objects.filter(lesson_id=lesson_id).values('module_id')
+    courses = Course.objects.filter(modules__in=course_modules)
+    teacher = getattr(user, 'teacher_profile', None)
+    if teacher is not None and courses.filter(teacher=teacher).exists():
+        return True
+    return courses.filter(enrollments__student__user=user, enrollments__status='active').exists()
+
+
+def user_can_view_module(user, module_id) -> bool:
+    """Может ли пользователь просматривать уроки модуля (те же правила, что для урока)."""
+    if user.is_staff or user.is_superuser or getattr(user, 'is_admin', False):
+        return True
+    courses = Course.objects.filter(modules=module_id)
+    teacher = getattr(user, 'teacher_profile', None)
+    if teacher is not None and courses.filter(teacher=teacher).exists():
+        return True
+    return courses.filter(enrollments__student__user=user, enrollments__status='active').exists()
+
+
+def user_can_view_homework(user, homework) -> bool:
+    """Может ли пользователь открыть файлы домашнего задания."""
+    if user.is_staff or user.is_superuser or getattr(user, 'is_admin', False):
+        return True
+    return homework.student.user_id == user.pk or homework.teacher.user_id == user.pk
+
+
+def user_can_edit_lesson(user, lesson_id) -> bool:
+    """Может ли пользователь менять файлы урока: админ или преподаватель курса."""
+    if user.is_staff or user.is_superuser or getattr(user, 'is_admin', False):
+        return True
+    teacher = getattr(user, 'teacher_profile', None)
+    if teacher is None:
+        return False
+    course_modules = Module.lessons.through.objects.filter(lesson_id=lesson_id).values('module_id')
+    return Course.objects.filter(modules__in=course_modules, teacher=teacher).exists()
+
+
+def _student_owns_homework(user, homework_id):
+    return Homework.objects.filter(pk=homework_id, student__user=user).exists()
+
+
+def _register_homework_photo(user, homework_id, key, extra):
+    # Токен загрузки можно отправить повторно: фото с тем же ключом регистрируется один раз.
+    # Блокировка ДЗ упорядочивает параллельные повторы и создание выполнения
+    with transaction.atomic():
+        homework = Homework.objects.select_for_update().get(pk=homework_id)
+        submission = homework.submissions.first()
+        if not submission:
+            submission = HomeworkSubmission.objects.create(homework=homework, student=homework.student)
+        photo, _ = HomeworkPhoto.objects.get_or_create(
+            submission=submission, photo=key, defaults={'description': extra.get('description', '')[:200]},
+        )
+    return {'photo_id': photo.pk, 'url': photo.photo.url}
+
+
+def _register_lesson_file(field):
+    def register(user, lesson_id, key, extra):
+        lesson = Lesson.objects.get(pk=lesson_id)
+        setattr(lesson, field, key)
+        lesson.save()
+        return {'lesson_id': lesson.pk}
+    return register
+
+
+# Цели прямой загрузки (см. direct_uploads.py): имя -> куда класть файл,
+# допустимые типы, проверка доступа и finalize-колбэк
+UPLOAD_TARGETS = {
+    'homework_photo': UploadTarget(
+        HomeworkPhoto._meta.get_field('photo').upload_to, ('image/',),
+        _student_owns_homework, _register_homework_photo,
+    ),
+    'lesson_video': UploadTarget(
+        Lesson._meta.get_field('video').upload_to, ('video/',),
+        user_can_edit_lesson, _register_lesson_file('video'),
+    ),
+    'lesson_pdf': UploadTarget(
+        Lesson._meta.get_field('pdf').upload_to,
+        ('application/pdf', 'application/vnd.openxmlformats-officedocument.presentationml'),
+        user_can_edit_lesson, _register_lesson_file('pdf'),
+    ),
+}
+
+
+# Сколько секунд помнить, что копии ещё нет (пока задача её не построила)
+RENDITION_MISSING_TIMEOUT = 60
+
+
+def _rendition_cache_key(name):
+    return f'rendition:{hashlib.md5(name.encode()).hexdigest()}'
+
+
+def _rendition_exists(name):
+    # exists() на удалённом хранилище — сетевой запрос: положительный результат
+    # кэшируем навсегда (копии не удаляются), отрицательный — ненадолго
+    cache_key = _rendition_cache_key(name)
+    exists = cache.get(cache_key)
+    if exists is None:
+        exists = default_storage.exists(name)
+        cache.set(cache_key, exists, None if exists else RENDITION_MISSING_TIMEOUT)
+    return exists
+
+
+def image_renditions_missing(name):
+    """True, если для файла ещё не построена самая большая копия."""
+    width = max(settings.IMAGE_RENDITION_WIDTHS)
+    return not _rendition_exists(rendition_name(name, width, settings.IMAGE_RENDITION_FORMAT))
+
+
+def image_rendition_url(fieldfile, width):
+    """URL копии изображения не уже width; если копии ещё нет — URL оригинала."""
+    if not fieldfile:
+        return ''
+    widths = sorted(settings.IMAGE_RENDITION_WIDTHS)
+    chosen = next((w for w in widths if w >= int(width)), widths[-1])
+    name = rendition_name(fieldfile.name, chosen, settings.IMAGE_RENDITION_FORMAT)
+    if _rendition_exists(name):
+        return default_storage.url(name)
+    return fieldfile.url
+
+
+def image_rendition_srcset(fieldfile):
+    """Значение атрибута srcset из готовых копий изображения."""
+    if not fieldfile:
+        return ''
+    entries = []
+    for width in sorted(settings.IMAGE_RENDITION_WIDTHS):
+        name = rendition_name(fieldfile.name, width, settings.IMAGE_RENDITION_FORMAT)
+        if not _rendition_exists(name):
+            break
+        entries.append(f'{default_storage.url(name)} {width}w')
+    return ', '.join(entries)
+
+
+def generate_image_renditions(name, force=False, data=None, renditions=None):
+    """Строит и сохраняет копии изображения name в default_storage.
+
+    data/renditions можно передать заранее (например, посчитанные в пуле
+    процессов командой generate_image_renditions).
+    """
+    fmt = settings.IMAGE_RENDITION_FORMAT
+    if not force and not image_renditions_missing(name):
+        return []
+    if renditions is None:
+        if data is None:
+            with default_storage.open(name, 'rb') as handle:
+                data = handle.read()
+        renditions = make_renditions(data, settings.IMAGE_RENDITION_WIDTHS, fmt, settings.IMAGE_RENDITION_QUALITY)
+
+    saved = []
+    for width, content in renditions.items():
+        target = rendition_name(name, width, fmt)
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        saved.append(default_storage.save(target, ContentFile(content)))
+        cache.set(_rendition_cache_key(target), True, None)
+    return saved
+
+
+def _student_course_ids(student):
+    """Подзапрос id курсов, на которых студент обучается (запись не завершена и не приостановлена)."""
+    return Enrollment.objects.filter(student=student, status='active').values('course_id')
+
+
+def _quiz_id(quiz):
+    return quiz.pk if isinstance(quiz, Quiz) else quiz
+
+
+def student_quiz_access_filter(student):
+    """Q-условие для Quiz: квиз доступен студенту через курс или прямое назначение.
+
+    Проверка строится на EXISTS по промежуточным таблицам M2M
+    (course_modules → module_quizzes, quiz_assigned_students), поэтому
+    её можно использовать как для одного квиза, так и для списков.
+    """
+    course_modules = Course.modules.through.objects.filter(course_id__in=_student_course_ids(student))
+    in_course = Module.quizzes.through.objects.filter(
+        quiz_id=OuterRef('pk'),
+        module_id__in=course_modules.values('module_id'),
+    )
+    assigned = Quiz.assigned_students.through.objects.filter(
+        quiz_id=OuterRef('pk'),
+        student_id=student.pk,
+    )
+    return Q(Exists(in_course)) | Q(Exists(assigned))
+
+
+def teacher_module_ids(teacher):
+    """Подзапрос id модулей, входящих в курсы преподавателя."""
+    return Course.modules.through.objects.filter(course__teacher=teacher).values('module_id')
+
+
+def teacher_quiz_access_filter(teacher):
+    """Q-условие для Quiz: квиз входит в курсы преподавателя или назначен его студентам."""
+    in_course = Module.quizzes.through.objects.filter(
+        quiz_id=OuterRef('pk'),
+        module_id__in=teacher_module_ids(teacher),
+    )
+    assigned = Quiz.assigned_students.through.objects.filter(
+        quiz_id=OuterRef('pk'),
+        student__teacher=teacher,
+    )
+    return Q(Exists(in_course)) | Q(Exists(assigned))
+
+
+def teacher_modules_queryset(teacher):
+    """Модули курсов преподавателя с числом уроков и квизов и списком курсов."""
+    return Module.objects.filter(pk__in=teacher_module_ids(teacher)).annotate(
+        lessons_count=Count('lessons', distinct=True),
+        quizzes_count=Count('quizzes', distinct=True),
+    ).prefetch_related('course_set').order_by('title', 'pk')
+
+
+def teacher_lessons_queryset(teacher):
+    """Уроки модулей курсов преподавателя с модулями и курсами для отображения."""
+    lesson_ids = Module.lessons.through.objects.filter(module_id__in=teacher_module_ids(teacher)).values('lesson_id')
+    return Lesson.objects.filter(pk__in=lesson_ids).prefetch_related('module_set__course_set').order_by('title', 'pk')
+
+
+def teacher_quizzes_queryset(teacher):
+    """Квизы курсов преподавателя и назначенные его студентам, с числом вопросов и назначений."""
+    return Quiz.objects.filter(teacher_quiz_access_filter(teacher)).annotate(
+        questions_count=Count('questions', distinct=True),
+        assigned_count=Count('assigned_students', distinct=True),
+    ).prefetch_related('module_set__course_set').order_by('title', 'pk')
+
+
+def student_can_take_quiz(student, quiz) -> bool:
+    """Может ли студент проходить квиз (один запрос EXISTS)."""
+    return Quiz.objects.filter(pk=_quiz_id(quiz)).filter(student_quiz_access_filter(student)).exists()
+
+
+def teacher_owns_quiz(teacher, quiz) -> bool:
+    """Имеет ли преподаватель доступ к квизу (один запрос EXISTS)."""
+    return Quiz.objects.filter(pk=_quiz_id(quiz)).filter(teacher_quiz_access_filter(teacher)).exists()
+
+
+def quizzes_with_attempts(quizzes, student):
+    """Список квизов с последней попыткой студента (latest_attempt) и лучшим результатом (best_score).
+
+    Последняя попытка и лучший результат считаются подзапросами в том же
+    запросе, сами последние попытки загружаются одним in_bulk.
+    """
+    attempts = QuizAttempt.objects.filter(student=student, quiz=OuterRef('pk'))
+    quizzes = list(quizzes.annotate(
+        latest_attempt_id=Subquery(attempts.order_by('-created_at', '-pk').values('pk')[:1]),
+        best_score=Subquery(attempts.order_by().values('quiz').annotate(best=Max('score')).values('best')),
+    ))
+    latest = QuizAttempt.objects.in_bulk([quiz.latest_attempt_id for quiz in quizzes if quiz.latest_attempt_id])
+    for quiz in quizzes:
+        quiz.latest_attempt = latest.get(quiz.latest_attempt_id)
+    return quizzes
+
+
+def student_quiz_list(student):
+    """Активные квизы, доступные студенту (через курсы и прямые назначения), с его результатами."""
+    quizzes = Quiz.objects.filter(student_quiz_access_filter(student), is_active=True).order_by('pk')
+    return quizzes_with_attempts(quizzes, student)
+
+
+def student_active_courses(student):
+    """Курсы, на которых студент обучается: только они открываются, поэтому только их и показываем."""
+    return Course.objects.filter(enrollments__student=student, enrollments__status='active')
+
+
+def student_is_enrolled(student, course) -> bool:
+    """Записан ли студент на курс и обучается ли на нём сейчас."""
+    course_id = course.pk if isinstance(course, Course) else course
+    return Enrollment.objects.filter(student=student, course_id=course_id, status='active').exists()
+
+
 def _get_student_achievement_metrics(student: Student) -> dict:
     """Возвращает ключевые метрики для расчёта достижений."""
     try:
@@ -126,6 +751,33 @@ def get_achievement_progress(student: Student, achievement: Achievement) -> dict
         }
 
 
+def achievements_close_to_unlock(students, achievements, low=50, high=100):
+    """Достижения, выполненные больше чем на low%, но меньше чем на high%.
+
+    Метрики считаются один раз на студента. Возвращает список словарей
+    (student, achievement, progress_data), отсортированный по проценту.
+    """
+    items = []
+    for student in students:
+        metrics = _get_student_achievement_metrics(student)
+        for achievement in achievements:
+            current_value = metrics.get(achievement.condition_type, 0)
+            target = achievement.condition_value or 1
+            percentage = int(min(100, (current_value / target) * 100))
+            if low < percentage < high:
+                items.append({
+                    'student': student,
+                    'achievement': achievement,
+                    'progress_data': {
+                        'progress_percentage': percentage,
+                        'current_value': current_value,
+                        'target_value': target,
+                    },
+                })
+    items.sort(key=lambda item: item['progress_data']['progress_percentage'], reverse=True)
+    return items
+
+
 def evaluate_and_unlock_achievements(student: Student):
     """Пересчитывает прогресс и открывает доступные достижения.
     Вызывает уведомления для новых достижений.
@@ -162,4 +814,248 @@ def evaluate_and_unlock_achievements(student: Student):
         return newly_unlocked
     except Exception as e:
         print(f"Ошибка при пересчёте достижений для студента {student.username}: {e}")
-        return []
\ No newline at end of file
+        return []
+
+
+class StudentDeletion(NamedTuple):
+    users: int      # удалено пользователей-студентов
+    skipped: list   # id пользователей, которые не удалялись (преподаватели и персонал)
+    rows: dict      # {модель: удалено строк}
+    files: int      # файлов поставлено в очередь на удаление
+
+
+def _delete_rows(queryset, rows):
+    """Один DELETE ... WHERE без выборки объектов и сигналов (их работу делает вызывающий)."""
+    count = queryset._raw_delete(queryset.db)
+    if count:
+        label = queryset.model._meta.label
+        rows[label] = rows.get(label, 0) + count
+
+
+def bulk_delete_students(user_ids):
+    """Удаляет студентов (по id пользователей) со всеми их данными в одной транзакции.
+
+    Вместо каскада Django, который загружает каждый связанный объект и
+    шлёт сигналы, для каждой таблицы выполняется один DELETE в порядке
+    зависимостей. Работа сигналов делается явно: освобождаются ссылки на
+    blob-файлы ДЗ, пересчитываются рейтинг курсов и места студентов.
+    Аватары и фото ДЗ удаляются фоновой задачей после коммита.
+    """
+    from django.contrib.admin.models import LogEntry
+    from .gradebook import invalidate_gradebook
+    from .jobs import enqueue, MEDIA_CLEANUP
+    from .models import (
+        CourseAddRequest, CourseFeedback, ProfileEditRequest, QuizResult, StudentMessageRequest,
+        StudentProgress, WheelSpin,
+    )
+
+    user_ids = set(user_ids)
+    # Преподаватели и персонал этим путём не удаляются: у них свои связи (курсы, проверка ДЗ)
+    deletable = User.objects.filter(pk__in=user_ids, teacher_profile__isnull=True, is_staff=False, is_superuser=False)
+    rows, files = {}, []
+    with transaction.atomic():
+        users = list(deletable.select_for_update().values_list('pk', flat=True))
+        student_ids = list(Student.objects.filter(user_id__in=users).values_list('pk', flat=True))
+        teacher_ids = set(Student.objects.filter(pk__in=student_ids, teacher__isnull=False).values_list('teacher_id', flat=True))
+        homeworks = Homework.objects.filter(student_id__in=student_ids)
+        submissions = HomeworkSubmission.objects.filter(Q(student_id__in=student_ids) | Q(homework__in=homeworks))
+        photos = HomeworkPhoto.objects.filter(submission__in=submissions)
+        course_ids = set(CourseFeedback.objects.filter(student_id__in=student_ids).values_list('course_id', flat=True))
+
+        files += [name for name in Student.objects.filter(pk__in=student_ids).values_list('avatar', flat=True) if name]
+        files += [name for name in photos.values_list('photo', flat=True) if name]
+        homework_files = [name for name in homeworks.values_list('pdf_file', flat=True) if name]
+        files += [name for name in homework_files if not name.startswith(BLOBS_DIR + '/')]
+
+        _delete_rows(photos, rows)
+        _delete_rows(submissions, rows)
+        _delete_rows(homeworks, rows)
+        for model in (CourseFeedback, QuizAttempt, WheelSpin, ProfileEditRequest, CourseAddRequest,
+                      StudentMessageRequest, Notification, StudentAchievement, LeaderboardRank):
+            _delete_rows(model.objects.filter(student_id__in=student_ids), rows)
+        for through in (Enrollment, Student.blocked_modules.through, Quiz.assigned_students.through,
+                        Group.students.through):
+            _delete_rows(through.objects.filter(student_id__in=student_ids), rows)
+        progress = StudentProgress.objects.filter(user_id__in=users)
+        for through in (StudentProgress.completed_lessons.through, StudentProgress.completed_modules.through):
+            _delete_rows(through.objects.filter(studentprogress__in=progress), rows)
+        _delete_rows(progress, rows)
+        for model in (QuizResult, CourseResult, LogEntry):
+            _delete_rows(model.objects.filter(user_id__in=users), rows)
+        _delete_rows(Student.objects.filter(pk__in=student_ids), rows)
+        for through in (User.groups.through, User.user_permissions.through):
+            _delete_rows(through.objects.filter(user_id__in=users), rows)
+        _delete_rows(User.objects.filter(pk__in=users), rows)
+
+        for name in homework_files:
+            release_blob(name)
+        for course_id in course_ids:
+            Course.update_rating(course_id)
+        invalidate_teacher_stats()
+        for teacher_id in teacher_ids:
+            invalidate_gradebook(teacher_id)
+        if student_ids:
+            rebuild_leaderboard()
+        if files:
+            transaction.on_commit(lambda: enqueue(MEDIA_CLEANUP, names=files))
+
+    return StudentDeletion(
+        users=len(users), skipped=sorted(user_ids - set(users)), rows=rows, files=len(files),
+    )
+
+
+# Сколько имён новых участников перечисляется в сводном уведомлении группы
+GROUP_JOINED_NAMES_SHOWN = 5
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def notify_group_joined(group, student_ids):
+    """Уведомления о вступлении в группу одной пачкой.
+
+    Новые участники получают по уведомлению о вступлении, остальные
+    участники группы — одно сводное со списком новичков (а не по одному
+    на каждого присоединившегося).
+    """
+    joined = set(student_ids)
+    if not joined:
+        return 0
+    names = list(User.objects.filter(student__pk__in=joined).order_by('username').values_list('username', flat=True))
+    shown = ', '.join(names[:GROUP_JOINED_NAMES_SHOWN])
+    if len(names) > GROUP_JOINED_NAMES_SHOWN:
+        shown += f' и ещё {len(names) - GROUP_JOINED_NAMES_SHOWN}'
+    if len(names) == 1:
+        members_message = f'К вам в группу "{group.name}" присоединился {shown}.'
+    else:
+        members_message = f'К вам в группу "{group.name}" присоединились: {shown}.'
+
+    notifications = [
+        Notification(student_id=student_id, type='group_added', message=f'Вы присоединились к группе "{group.name}".')
+        for student_id in sorted(joined)
+    ]
+    notifications += [
+        Notification(student_id=student_id, type='group_added', message=members_message)
+        for student_id in group.students.exclude(pk__in=joined).values_list('pk', flat=True)
+    ]
+    Notification.objects.bulk_create(notifications, batch_size=settings.STUDENT_IMPORT_BATCH_SIZE)
+    return len(notifications)
+
+
+def add_students_to_group(group, student_ids, notify=True):
+    """Добавляет студентов в группу пачками INSERT в промежуточную таблицу.
+
+    Уже состоящие в группе пропускаются; возвращает id добавленных.
+    """
+    Membership = Group.students.through
+    student_ids = set(Student.objects.filter(pk__in=student_ids).values_list('pk', flat=True))
+    existing = set(
+        Membership.objects.filter(group_id=group.pk, student_id__in=student_ids).values_list('student_id', flat=True)
+    )
+    added = sorted(student_ids - existing)
+    with transaction.atomic():
+        for chunk in _batches(added, settings.STUDENT_IMPORT_BATCH_SIZE):
+            # ignore_conflicts — на случай параллельного добавления тех же студентов
+            Membership.objects.bulk_create(
+                [Membership(group_id=group.pk, student_id=student_id) for student_id in chunk],
+                ignore_conflicts=True,
+            )
+        if notify:
+            notify_group_joined(group, added)
+        if added:
+            # bulk_create не отправляет m2m_changed: рейтинг группы пересчитывается здесь
+            rebuild_leaderboard(LeaderboardRank.GROUP, group.pk)
+    return added
+
+
+def remove_students_from_group(group, student_ids):
+    """Исключает студентов из группы одним DELETE; возвращает число удалённых связей."""
+    memberships = Group.students.through.objects.filter(group_id=group.pk, student_id__in=student_ids)
+    removed = memberships._raw_delete(memberships.db)
+    if removed:
+        rebuild_leaderboard(LeaderboardRank.GROUP, group.pk)
+    return removed
+
+
+def set_group_students(group, student_ids, notify=True):
+    """Приводит состав группы к student_ids; возвращает (добавлены, исключено)."""
+    # id из формы приходят строками: сравниваются настоящие pk существующих студентов
+    student_ids = set(Student.objects.filter(pk__in=student_ids).values_list('pk', flat=True))
+    with transaction.atomic():
+        current = set(group.students.values_list('pk', flat=True))
+        removed = remove_students_from_group(group, current - student_ids) if current - student_ids else 0
+        added = add_students_to_group(group, student_ids - current, notify=notify)
+    return added, removed
+
+
+class GroupEnrollment(NamedTuple):
+    attached: int   # участников, обучающихся на курсе после прикрепления
+    skipped: list   # id студентов, чья запись на курс завершена или приостановлена
+
+
+def enroll_group_in_course(group, course, progress=None):
+    """Прикрепляет всех участников группы к курсу; progress(done, total) — после каждой пачки.
+
+    Завершённые и приостановленные записи не меняются: такие студенты
+    возвращаются в skipped, чтобы администратор видел, кто не получил доступ.
+    """
+    student_ids = list(group.students.values_list('pk', flat=True))
+    skipped = []
+    done = 0
+    for chunk in _batches(student_ids, settings.STUDENT_IMPORT_BATCH_SIZE):
+        # Уже прикреплённые студенты пропускаются уникальным ограничением
+        Enrollment.objects.bulk_create(
+            [Enrollment(student_id=student_id, course_id=course.pk) for student_id in chunk],
+            ignore_conflicts=True,
+        )
+        skipped += Enrollment.objects.filter(course_id=course.pk, student_id__in=chunk).exclude(
+            status='active',
+        ).values_list('student_id', flat=True)
+        done += len(chunk)
+        if progress:
+            progress(done, len(student_ids))
+    # bulk_create не отправляет m2m_changed
+    invalidate_teacher_stats()
+    return GroupEnrollment(attached=len(student_ids) - len(skipped), skipped=sorted(skipped))
+
+
+# Статистика дашборда преподавателя кэшируется под версией каталога:
+# любое изменение курсов, модулей, уроков, квизов или записей на курсы
+# увеличивает версию, и все закэшированные значения устаревают разом
+TEACHER_STATS_VERSION_KEY = 'teacher-stats-version'
+TEACHER_STATS_TIMEOUT = 60 * 60
+
+
+def invalidate_teacher_stats():
+    try:
+        cache.incr(TEACHER_STATS_VERSION_KEY)
+    except ValueError:
+        cache.set(TEACHER_STATS_VERSION_KEY, 1, None)
+
+
+def _distinct_count(queryset, field):
+    return queryset.aggregate(total=Count(field, distinct=True))['total']
+
+
+def teacher_dashboard_stats(teacher):
+    """Число различных модулей, уроков, квизов и студентов в курсах преподавателя.
+
+    Считается четырьмя агрегатными запросами по промежуточным таблицам,
+    независимо от размера каталога.
+    """
+    version = cache.get_or_set(TEACHER_STATS_VERSION_KEY, 1, None)
+    cache_key = f'teacher-stats:{teacher.pk}:{version}'
+    stats = cache.get(cache_key)
+    if stats is None:
+        course_modules = Course.modules.through.objects.filter(course__teacher=teacher)
+        module_ids = course_modules.values('module_id')
+        stats = {
+            'total_modules': _distinct_count(course_modules, 'module_id'),
+            'total_lessons': _distinct_count(Module.lessons.through.objects.filter(module_id__in=module_ids), 'lesson_id'),
+            'total_quizzes': _distinct_count(Module.quizzes.through.objects.filter(module_id__in=module_ids), 'quiz_id'),
+            'total_students': _distinct_count(Enrollment.objects.filter(course__teacher=teacher), 'student_id'),
+        }
+        cache.set(cache_key, stats, TEACHER_STATS_TIMEOUT)
+    return stats
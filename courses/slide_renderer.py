@@ -0,0 +1,164 @@
+"""
+Растеризация страниц PDF в изображения слайдов.
+
+Модуль не зависит от Django: функции рендеринга запускаются в отдельных
+процессах (ProcessPoolExecutor), и каждый процесс открывает свой
+документ fitz. Это позволяет параллельно обрабатывать большие PDF.
+"""
+import math
+import os
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+FORMAT_EXTENSIONS = {
+    'webp': 'webp',
+    'jpeg': 'jpg',
+    'png': 'png',
+}
+
+THUMBNAILS_DIR = 'thumbs'
+
+# Меньше этого числа страниц пул процессов не запускаем — накладные расходы больше выигрыша
+MIN_PAGES_FOR_POOL = 8
+
+
+def _save_image(image, path, fmt, quality):
+    if fmt == 'webp':
+        image.save(path, 'WEBP', quality=quality, method=4)
+    elif fmt == 'jpeg':
+        image.save(path, 'JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(path, 'PNG', optimize=True)
+
+
+def thumbnail_path(image_path):
+    """Путь к миниатюре для изображения слайда."""
+    directory, name = os.path.split(image_path)
+    return os.path.join(directory, THUMBNAILS_DIR, name)
+
+
+def _render_page(doc, index, matrix):
+    pix = doc[index].get_pixmap(matrix=matrix, alpha=False)
+    return Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+
+
+def render_page_range(pdf_path, start, stop, output_dir, dpi=110, fmt='webp', quality=80, thumb_width=320):
+    """Рендерит страницы [start, stop) и возвращает пути к изображениям.
+
+    Вызывается в отдельном процессе, поэтому документ открывается здесь же.
+    """
+    ext = FORMAT_EXTENSIONS[fmt]
+    thumbs_dir = os.path.join(output_dir, THUMBNAILS_DIR)
+    os.makedirs(thumbs_dir, exist_ok=True)
+    zoom = dpi / 72.0
+    matrix = fitz.Matrix(zoom, zoom)
+
+    paths = []
+    with fitz.open(pdf_path) as doc:
+        for index in range(start, stop):
+            image = _render_page(doc, index, matrix)
+            img_path = os.path.join(output_dir, f'page_{index + 1}.{ext}')
+            _save_image(image, img_path, fmt, quality)
+
+            if thumb_width:
+                thumb = image.copy()
+                thumb.thumbnail((thumb_width, thumb_width * 4))
+                _save_image(thumb, thumbnail_path(img_path), fmt, quality)
+            paths.append(img_path)
+    return paths
+
+
+def render_single_page(pdf_path, index, output_path, dpi=110, fmt='webp', quality=80):
+    """Рендерит одну страницу (с нуля) в output_path.
+
+    Запись идёт во временный файл с последующим os.replace, поэтому
+    параллельные читатели никогда не увидят недописанное изображение.
+    """
+    zoom = dpi / 72.0
+    with fitz.open(pdf_path) as doc:
+        image = _render_page(doc, index, fitz.Matrix(zoom, zoom))
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    _save_image(image, tmp_path, fmt, quality)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+@contextmanager
+def file_lock(lock_path, timeout=60):
+    """Эксклюзивная межпроцессная блокировка на файле.
+
+    На POSIX используется fcntl.flock; иначе — создание lock-файла с
+    O_EXCL и ожиданием (устаревший lock-файл удаляется по таймауту).
+    """
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    if fcntl is not None:
+        with open(lock_path, 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+        return
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                os.remove(lock_path)
+                deadline = time.monotonic() + timeout
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+def page_count(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def split_ranges(total, parts):
+    """Делит [0, total) на не более чем parts непрерывных диапазонов."""
+    parts = max(1, min(parts, total))
+    size = math.ceil(total / parts) if total else 0
+    return [(start, min(start + size, total)) for start in range(0, total, size)] if size else []
+
+
+def render_pdf(pdf_path, output_dir, dpi=110, fmt='webp', quality=80, thumb_width=320, workers=None):
+    """Рендерит все страницы PDF, распределяя диапазоны страниц по процессам.
+
+    Возвращает пути к изображениям в порядке страниц.
+    """
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f'Неподдерживаемый формат слайдов: {fmt}')
+    os.makedirs(output_dir, exist_ok=True)
+    total = page_count(pdf_path)
+    workers = workers or os.cpu_count() or 1
+    options = dict(output_dir=output_dir, dpi=dpi, fmt=fmt, quality=quality, thumb_width=thumb_width)
+
+    if workers <= 1 or total < MIN_PAGES_FOR_POOL:
+        return render_page_range(pdf_path, 0, total, **options)
+
+    ranges = split_ranges(total, workers)
+    # spawn: дочерние процессы не наследуют состояние MuPDF родителя
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=get_context('spawn')) as pool:
+        futures = [
+            pool.submit(render_page_range, pdf_path, start, stop, **options)
+            for start, stop in ranges
+        ]
+        return [path for future in futures for path in future.result()]
@@ -0,0 +1,205 @@
+"""
+Массовый импорт студентов из Excel.
+
+Файл читается целиком в DataFrame, колонки нормализуются векторно, уже
+существующие пользователи и занятые имена загружаются несколькими
+запросами, пароли хэшируются в пуле процессов (bulk_passwords), а строки
+записываются bulk_create/bulk_update пачками в одной транзакции. Ошибки
+не прерывают импорт: по каждой отклонённой строке возвращается RowError.
+"""
+import datetime
+import secrets
+import string
+from typing import NamedTuple
+
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .bulk_passwords import hash_passwords_parallel
+from .leaderboard import rebuild_leaderboard
+from .models import Group, LeaderboardRank, Student, User
+
+# Допустимые названия колонок (без учёта регистра)
+COLUMN_ALIASES = {
+    'email': ('Электронная почта', 'Почта', 'email'),
+    'first_name': ('Имя', 'first_name'),
+    'last_name': ('Фамилия', 'last_name'),
+}
+EMAIL_RE = r'^[^@\s]+@[^@\s]+\.[^@\s]+$'
+# Первая строка листа — заголовок, поэтому строка данных с индексом 0 — это строка 2
+FIRST_DATA_ROW = 2
+# Сколько ошибок сохраняется в результате фоновой задачи
+IMPORT_ERRORS_STORED = 500
+
+
+class RowError(NamedTuple):
+    row: int
+    email: str
+    message: str
+
+
+class ImportReport(NamedTuple):
+    created: int
+    updated: int
+    group: Group
+    errors: list
+
+    def as_result(self, max_errors=IMPORT_ERRORS_STORED):
+        """Итог импорта для Job.result (JSON)."""
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'group_id': self.group.pk,
+            'group': self.group.name,
+            'errors': [list(error) for error in self.errors[:max_errors]],
+            'errors_total': len(self.errors),
+        }
+
+
+def temporary_password(length=8):
+    characters = string.ascii_letters + string.digits
+    return ''.join(secrets.choice(characters) for _ in range(length))
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def normalize_frame(df):
+    """Колонки email/first_name/last_name со строковыми значениями и номер строки листа."""
+    columns = {str(column).strip().lower(): column for column in df.columns}
+    frame = pd.DataFrame(index=df.index)
+    for field, aliases in COLUMN_ALIASES.items():
+        source = next((columns[alias.lower()] for alias in aliases if alias.lower() in columns), None)
+        frame[field] = df[source] if source is not None else ''
+    frame = frame.fillna('').astype(str).apply(lambda column: column.str.strip())
+    frame['email'] = frame['email'].str.lower()
+    frame['row'] = range(FIRST_DATA_ROW, FIRST_DATA_ROW + len(frame))
+    return frame.reset_index(drop=True)
+
+
+def validate_frame(frame):
+    """Делит строки на пригодные к импорту и ошибки; пустые строки пропускаются молча."""
+    blank = (frame[['email', 'first_name', 'last_name']] == '').all(axis=1)
+    invalid = ~blank & ~frame['email'].str.match(EMAIL_RE)
+    duplicate = ~blank & ~invalid & frame['email'].duplicated(keep='first')
+
+    errors = [RowError(row, email, 'Некорректный email')
+              for row, email in frame.loc[invalid, ['row', 'email']].itertuples(index=False)]
+    first_rows = frame[~blank & ~invalid & ~duplicate].set_index('email')['row']
+    errors += [RowError(row, email, f'Email повторяется в файле (строка {first_rows[email]})')
+               for row, email in frame.loc[duplicate, ['row', 'email']].itertuples(index=False)]
+    return frame[~blank & ~invalid & ~duplicate], errors
+
+
+def _existing_users(emails, batch_size):
+    """{email: User} по email без учёта регистра и имена, занятые другими пользователями."""
+    users, taken = {}, set()
+    for chunk in _chunks(emails, batch_size):
+        for user in User.objects.annotate(email_lower=Lower('email')).filter(email_lower__in=chunk):
+            users.setdefault(user.email_lower, user)
+        for username, email in User.objects.filter(username__in=chunk).values_list('username', 'email'):
+            if (email or '').lower() != username:
+                taken.add(username)
+    return users, taken
+
+
+def default_group_name():
+    """Название группы импорта, если администратор его не задал."""
+    return f'Группа от {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
+
+
+def import_students(frame, group=None, group_name=None, progress=None):
+    """Создаёт или обновляет студентов из нормализованного DataFrame.
+
+    Всем импортированным выдаётся новый временный пароль; все они
+    добавляются в группу group или, если она не передана, в новую
+    группу. progress(done, total) сообщает о ходе хэширования паролей —
+    самой долгой части. Возвращает ImportReport.
+    """
+    batch_size = settings.STUDENT_IMPORT_BATCH_SIZE
+    rows, errors = validate_frame(frame)
+    existing, taken = _existing_users(rows['email'].tolist(), batch_size)
+
+    conflict = rows['email'].isin(taken)
+    errors += [RowError(row, email, 'Имя пользователя занято пользователем с другим email')
+               for row, email in rows.loc[conflict, ['row', 'email']].itertuples(index=False)]
+    rows = rows[~conflict]
+    records = list(rows[['email', 'first_name', 'last_name']].itertuples(index=False))
+
+    hasher = get_hasher()
+    hasher_path = f'{type(hasher).__module__}.{type(hasher).__qualname__}'
+    passwords = [temporary_password() for _ in records]
+    hashes = hash_passwords_parallel(hasher_path, passwords, workers=settings.STUDENT_IMPORT_WORKERS,
+                                     progress=progress)
+
+    with transaction.atomic():
+        new_users, changed_users = [], []
+        for (email, first_name, last_name), password_hash in zip(records, hashes):
+            user = existing.get(email)
+            if user is None:
+                new_users.append(User(username=email, email=email, first_name=first_name,
+                                      last_name=last_name, is_student=True, password=password_hash))
+            else:
+                user.username = email  # username всегда равен email
+                user.password = password_hash
+                changed_users.append(user)
+        User.objects.bulk_create(new_users, batch_size=batch_size)
+        User.objects.bulk_update(changed_users, ['username', 'password'], batch_size=batch_size)
+
+        emails = [record.email for record in records]
+        users = {}
+        for chunk in _chunks(emails, batch_size):
+            users.update(User.objects.filter(username__in=chunk).in_bulk(field_name='username'))
+        user_ids = [user.pk for user in users.values()]
+        students = {}
+        for chunk in _chunks(user_ids, batch_size):
+            students.update({student.user_id: student for student in Student.objects.filter(user_id__in=chunk)})
+
+        new_students, changed_students = [], []
+        for (email, first_name, last_name), password in zip(records, passwords):
+            user = users[email]
+            student = students.get(user.pk)
+            if student is None:
+                new_students.append(Student(user=user, email=email, first_name=first_name,
+                                            last_name=last_name, temporary_password=password))
+            else:
+                student.email = student.email or email
+                student.first_name = student.first_name or first_name
+                student.last_name = student.last_name or last_name
+                student.temporary_password = password
+                changed_students.append(student)
+        Student.objects.bulk_create(new_students, batch_size=batch_size)
+        Student.objects.bulk_update(changed_students, ['email', 'first_name', 'last_name', 'temporary_password'],
+                                    batch_size=batch_size)
+
+        if group is None:
+            group = Group.objects.create(name=group_name or default_group_name())
+        student_ids = []
+        for chunk in _chunks(user_ids, batch_size):
+            student_ids += Student.objects.filter(user_id__in=chunk).values_list('id', flat=True)
+        Membership = Group.students.through
+        Membership.objects.bulk_create(
+            [Membership(group_id=group.pk, student_id=student_id) for student_id in student_ids],
+            batch_size=batch_size,
+            # Повторный импорт в ту же группу: уже добавленные студенты пропускаются
+            ignore_conflicts=True,
+        )
+        # bulk_create не отправляет сигналов: новые студенты попадают в общий рейтинг и рейтинг группы здесь
+        rebuild_leaderboard(LeaderboardRank.GLOBAL)
+        rebuild_leaderboard(LeaderboardRank.GROUP, group.pk)
+
+    created_user_ids = {user.pk for user in users.values()} - {user.pk for user in changed_users}
+    created = len(created_user_ids | {student.user_id for student in new_students})
+    errors.sort()
+    return ImportReport(created=created, updated=len(records) - created, group=group, errors=errors)
+
+
+def import_students_from_excel(file, group=None, group_name=None, progress=None):
+    """Читает Excel-файл (путь или загруженный файл) и импортирует студентов."""
+    df = pd.read_excel(file, dtype=str)
+    return import_students(normalize_frame(df), group=group, group_name=group_name, progress=progress)
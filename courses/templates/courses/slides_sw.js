@@ -0,0 +1,90 @@
+{% load static %}// slides_sw.js - офлайн-кэш слайдов уроков
+// Изображения слайдов берутся из кэша (их пути зависят от содержимого PDF),
+// страницы /lesson/<id>/slide/<n>/ — из кэша только с версией PDF (?v=),
+// манифесты уроков и страницы без версии — из сети с откатом на кэш.
+const CACHE_NAME = 'lesson-slides-v2';
+const MEDIA_SLIDES_PREFIX = '{% get_media_prefix %}slides/';
+const SLIDE_PAGE_RE = /^\/lesson\/\d+\/slide\/\d+\/$/;
+const MANIFEST_RE = /^\/lesson\/\d+\/slides\/$/;
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil((async () => {
+        const names = await caches.keys();
+        await Promise.all(names.filter(name => name.startsWith('lesson-slides-') && name !== CACHE_NAME)
+            .map(name => caches.delete(name)));
+        await self.clients.claim();
+    })());
+});
+
+async function cacheFirst(request) {
+    const cache = await caches.open(CACHE_NAME);
+    const cached = await cache.match(request);
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    if (response.ok) {
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function networkFirst(request) {
+    const cache = await caches.open(CACHE_NAME);
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            cache.put(request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await cache.match(request);
+        if (cached) {
+            return cached;
+        }
+        throw error;
+    }
+}
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (request.method !== 'GET' || url.origin !== self.location.origin) {
+        return;
+    }
+    const versionedPage = SLIDE_PAGE_RE.test(url.pathname) && url.searchParams.has('v');
+    if (url.pathname.startsWith(MEDIA_SLIDES_PREFIX) || versionedPage) {
+        event.respondWith(cacheFirst(request));
+    } else if (MANIFEST_RE.test(url.pathname) || SLIDE_PAGE_RE.test(url.pathname)) {
+        // Без версии страница могла устареть после замены PDF преподавателем
+        event.respondWith(networkFirst(request));
+    }
+});
+
+// Сохранение урока для офлайн-просмотра: {type: 'cache-lesson', urls: [...]}
+self.addEventListener('message', (event) => {
+    const data = event.data || {};
+    if (data.type !== 'cache-lesson') {
+        return;
+    }
+    event.waitUntil((async () => {
+        const cache = await caches.open(CACHE_NAME);
+        let done = 0;
+        for (const url of data.urls) {
+            if (!(await cache.match(url))) {
+                try {
+                    const response = await fetch(url, { credentials: 'same-origin' });
+                    if (response.ok) {
+                        await cache.put(url, response);
+                    }
+                } catch (error) {
+                    // Пропускаем слайд: он будет закэширован при следующем просмотре
+                }
+            }
+            done += 1;
+        }
+        event.source.postMessage({ type: 'lesson-cached', lessonId: data.lessonId, cached: done, total: data.urls.length });
+    })());
+});
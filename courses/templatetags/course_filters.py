@@ -1,5 +1,6 @@
 from django import template
 from django.urls import reverse
+from django.core.files.storage import default_storage
 import json
 
 register = template.Library()
@@ -65,7 +66,13 @@ def stars_to_next_level(student):
 def jsonify_slide_urls(slides_queryset):
     """
     Converts a queryset of LessonSlide objects into a JSON array of their image URLs.
+    A Lesson may be passed instead: its stored slides manifest is used without queries.
     """
+    manifest = getattr(slides_queryset, 'slides_manifest', None)
+    if manifest:
+        return json.dumps([default_storage.url(slide['image']) for slide in manifest['slides']])
+    if hasattr(slides_queryset, 'slides'):
+        slides_queryset = slides_queryset.slides
     slide_urls = []
     for slide in slides_queryset.all():
         if slide.image:
@@ -0,0 +1,24 @@
+from django import template
+
+from courses.services import image_rendition_srcset, image_rendition_url
+
+register = template.Library()
+
+
+@register.filter
+def rendition(image_field, width):
+    """
+    URL уменьшенной копии изображения не уже width пикселей.
+    Usage: <img src="{{ student.avatar|rendition:160 }}">
+    Пока копия не построена, возвращается URL оригинала.
+    """
+    return image_rendition_url(image_field, width)
+
+
+@register.simple_tag
+def srcset(image_field):
+    """
+    Значение атрибута srcset из готовых копий.
+    Usage: <img src="{{ course.image|rendition:320 }}" srcset="{% srcset course.image %}" sizes="320px">
+    """
+    return image_rendition_srcset(image_field)
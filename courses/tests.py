@@ -1,3 +1,604 @@
-from django.test import TestCase
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.contrib.admin.models import ADDITION, LogEntry
+from django.contrib.auth.models import Group as AuthGroup, Permission
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .direct_uploads import make_upload_key, sign_upload
+from .jobs import MEDIA_CLEANUP
+from .leaderboard import rebuild_leaderboard
+from .models import (
+    Achievement, Course, CourseAddRequest, CourseFeedback, CourseResult, Enrollment, Group, Homework,
+    HomeworkPhoto, HomeworkSubmission, Job, LeaderboardRank, Lesson, MediaBlob, Module, Notification,
+    ProfileEditRequest, Quiz, QuizAttempt, QuizResult, Student, StudentAchievement, StudentMessageRequest,
+    StudentProgress, Teacher, User, WheelSpin,
+)
+from .protected_media import parse_range, protected_file_response
+from .request_history import decode_cursor, history_page
+from .services import (
+    acquire_blob, add_students_to_group, bulk_delete_students, remove_students_from_group, set_group_students,
+    enroll_group_in_course, student_active_courses, student_can_take_quiz, student_is_enrolled, student_quiz_list,
+    user_can_view_lesson, user_can_view_module,
+)
+
+
+class TempMediaMixin:
+    """MEDIA_ROOT во временном каталоге на время теста."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_no_header(self):
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('', 100))
+
+    def test_closed_range(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=10-19', 100), (10, 19))
+
+    def test_end_is_clamped_to_file_size(self):
+        self.assertEqual(parse_range('bytes=90-500', 100), (90, 99))
+
+    def test_open_range(self):
+        self.assertEqual(parse_range('bytes=40-', 100), (40, 99))
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        # Суффикс длиннее файла — весь файл
+        self.assertEqual(parse_range('bytes=-500', 100), (0, 99))
+
+    def test_unsatisfiable(self):
+        for header in ('bytes=100-', 'bytes=150-200', 'bytes=20-10'):
+            with self.subTest(header=header), self.assertRaises(ValueError):
+                parse_range(header, 100)
+
+    def test_unsupported_forms_fall_back_to_whole_file(self):
+        for header in ('bytes=0-9,20-29', 'bytes=-', 'items=0-9', 'bytes=a-b'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 100))
+
+
+@override_settings(PROTECTED_MEDIA_SERVER='')
+class ProtectedFileResponseTests(SimpleTestCase):
+    data = bytes(range(256)) * 4
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        storage = FileSystemStorage(location=self.location)
+        name = storage.save('file.bin', ContentFile(self.data))
+        self.fieldfile = SimpleNamespace(name=name, size=len(self.data), storage=storage)
+
+    def get(self, range_header=None):
+        headers = {'Range': range_header} if range_header else {}
+        request = RequestFactory().get('/', headers=headers)
+        return protected_file_response(request, self.fieldfile)
+
+    def test_whole_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+
+    def test_partial_content(self):
+        response = self.get('bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.data)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), self.data[100:200])
+
+    def test_suffix_and_open_ranges(self):
+        response = self.get('bytes=-24')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-24:])
+        response = self.get('bytes=1000-')
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1023/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[1000:])
+
+    def test_unsatisfiable_range(self):
+        response = self.get(f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_multi_range_returns_whole_file(self):
+        response = self.get('bytes=0-9,20-29')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+
+
+class MediaBlobTests(TempMediaMixin, TestCase):
+    content = b'%PDF-1.4 lesson'
+
+    def make_lesson(self, content=None):
+        lesson = Lesson(title='Урок')
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.pdf.save('lesson.pdf', ContentFile(content or self.content))
+        return lesson
+
+    def delete(self, lesson):
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.delete()
+
+    def test_same_content_is_stored_once(self):
+        first, second = self.make_lesson(), self.make_lesson()
+        self.assertEqual(first.pdf.name, second.pdf.name)
+        self.assertTrue(first.pdf.name.startswith('blobs/'))
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob.size, len(self.content))
+        # Загруженная копия удалена, остался только blob
+        self.assertEqual(default_storage.listdir('pdfs')[1], [])
+
+    def test_file_is_deleted_with_last_reference(self):
+        first, second = self.make_lesson(), self.make_lesson()
+        name = first.pdf.name
+        self.delete(first)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        self.assertTrue(default_storage.exists(name))
+        self.delete(second)
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_replacing_file_releases_old_blob(self):
+        lesson = self.make_lesson()
+        old_name = lesson.pdf.name
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.pdf.save('lesson.pdf', ContentFile(b'%PDF-1.4 other'))
+        self.assertNotEqual(lesson.pdf.name, old_name)
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertEqual(MediaBlob.objects.get().name, lesson.pdf.name)
+
+    def test_acquire_between_release_and_commit_keeps_file(self):
+        lesson = self.make_lesson()
+        name = lesson.pdf.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            lesson.delete()
+            # Та же загрузка до того, как отложенное удаление файла выполнилось
+            other = Lesson(title='Другой урок')
+            other.pdf.save('copy.pdf', ContentFile(self.content))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(other.pdf.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_acquire_existing_blob_name_only_counts_reference(self):
+        lesson = self.make_lesson()
+        self.assertEqual(acquire_blob(lesson.pdf), lesson.pdf.name)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+
+
+class RequestHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.students = [
+            Student.objects.create(user=User.objects.create_user(f'student{i}', password='x', is_student=True))
+            for i in range(2)
+        ]
+        now = timezone.now().replace(microsecond=0)
+        models = [ProfileEditRequest, CourseAddRequest, StudentMessageRequest]
+        for i in range(30):
+            model = models[i % 3]
+            fields = {'message': f'Запрос {i}'} if model is StudentMessageRequest else {}
+            request = model.objects.create(
+                student=cls.students[i % 2], status='approved' if i % 4 == 0 else 'pending', **fields,
+            )
+            # По несколько запросов разных и одного типа с одинаковым временем создания
+            model.objects.filter(pk=request.pk).update(created_at=now - timedelta(minutes=i // 5))
+
+    def all_pages(self, limit, **filters):
+        rows, cursor, pages = [], None, 0
+        while True:
+            page, cursor = history_page(cursor=cursor, limit=limit, **filters)
+            rows += page
+            pages += 1
+            if cursor is None:
+                return rows, pages
+
+    def keys(self, rows):
+        return [(row['created_at'], row['type'], row['id']) for row in rows]
+
+    def test_pages_cover_history_without_gaps_or_duplicates(self):
+        full, _ = history_page(limit=100)
+        self.assertEqual(len(full), 30)
+        expected = sorted(self.keys(full), reverse=True)
+        self.assertEqual(self.keys(full), expected)
+        for limit in (1, 4, 7, 30):
+            with self.subTest(limit=limit):
+                rows, pages = self.all_pages(limit)
+                self.assertEqual(self.keys(rows), expected)
+                self.assertEqual(pages, -(-30 // limit))
+
+    def test_filters_apply_to_every_page(self):
+        student = self.students[0]
+        cases = [
+            ({'status': 'approved'}, lambda row: row['status'] == 'approved'),
+            ({'student_id': student.pk}, lambda row: row['student_id'] == student.pk),
+            ({'types': ['course_add', 'message']}, lambda row: row['type'] in ('course_add', 'message')),
+        ]
+        for filters, matches in cases:
+            with self.subTest(filters=filters):
+                full, _ = history_page(limit=100, **filters)
+                rows, _ = self.all_pages(3, **filters)
+                self.assertTrue(full)
+                self.assertTrue(all(matches(row) for row in full))
+                self.assertEqual(self.keys(rows), self.keys(full))
+
+    def test_last_page_has_no_cursor(self):
+        rows, cursor = history_page(limit=30)
+        self.assertEqual(len(rows), 30)
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor(self):
+        for cursor in ('', 'garbage', '2024-01-01T00:00:00~unknown~1', '2024-01-01T00:00:00~message~x'):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class BulkDeleteStudentsTests(TempMediaMixin, TestCase):
+    # Таблицы, строки которых ссылаются на удаляемого студента; новая связь должна попасть и сюда,
+    # и в bulk_delete_students — иначе тест упадёт на проверке заполненности
+    PARENTS = (User, Student, StudentProgress, Homework, HomeworkSubmission)
+
+    def setUp(self):
+        super().setUp()
+        teacher_user = User.objects.create_user('teacher', password='x')
+        self.teacher = Teacher.objects.create(user=teacher_user, first_name='Иван', last_name='Петров',
+                                              email='teacher@example.com')
+        self.course = Course.objects.create(title='Курс', description='', course_code='C1', teacher=self.teacher)
+        self.lesson = Lesson.objects.create(title='Урок')
+        self.module = Module.objects.create(title='Модуль')
+        self.quiz = Quiz.objects.create(title='Квиз')
+        self.group = Group.objects.create(name='Группа')
+        self.achievement = Achievement.objects.create(code='first', title='Первый', condition_type='total_stars',
+                                                      condition_value=1, reward='Наклейка')
+
+    def make_student(self, username, rating):
+        user = User.objects.create_user(username, password='x', is_student=True)
+        student = Student.objects.create(user=user, teacher=self.teacher, stars=rating)
+        with self.captureOnCommitCallbacks(execute=True):
+            student.avatar.save('avatar.png', ContentFile(b'avatar'))
+        Enrollment.objects.create(student=student, course=self.course)
+        self.group.students.add(student)
+        self.quiz.assigned_students.add(student)
+        student.blocked_modules.add(self.module)
+        CourseFeedback.objects.create(student=student, course=self.course, rating=rating)
+        QuizAttempt.objects.create(student=student, quiz=self.quiz, score=1)
+        QuizResult.objects.create(user=user, quiz=self.quiz, score=1)
+        CourseResult.objects.create(user=user, course=self.course)
+        WheelSpin.objects.create(student=student, stars_earned=1)
+        ProfileEditRequest.objects.create(student=student)
+        CourseAddRequest.objects.create(student=student, course_name='Другой курс')
+        StudentMessageRequest.objects.create(student=student, message='Вопрос')
+        Notification.objects.create(student=student, type='general', message='Уведомление')
+        StudentAchievement.objects.create(student=student, achievement=self.achievement)
+        progress = StudentProgress.objects.create(user=user, course=self.course)
+        progress.completed_lessons.add(self.lesson)
+        progress.completed_modules.add(self.module)
+        homework = Homework(title='ДЗ', description='', teacher=self.teacher, student=student,
+                            due_date=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            homework.pdf_file.save('homework.pdf', ContentFile(b'%PDF-1.4 ' + username.encode()))
+        submission = HomeworkSubmission.objects.create(homework=homework, student=student)
+        photo = HomeworkPhoto(submission=submission)
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.photo.save('photo.png', ContentFile(username.encode()))
+        user.groups.add(AuthGroup.objects.get_or_create(name='Студенты')[0])
+        user.user_permissions.add(Permission.objects.first())
+        LogEntry.objects.create(user=user, object_repr=username, action_flag=ADDITION)
+        return student
+
+    def relations(self):
+        """(модель-родитель, модель со ссылкой, имя поля) для всех таблиц, ссылающихся на данные студента."""
+        return [
+            (parent, relation.related_model, relation.field.name)
+            for parent in self.PARENTS
+            for relation in parent._meta.get_fields(include_hidden=True)
+            if relation.auto_created and not relation.concrete and not relation.many_to_many
+            and relation.related_model is not Teacher
+        ]
+
+    def referencing(self, ids):
+        return {
+            (model._meta.label, field): model._base_manager.filter(**{f'{field}__in': ids[parent]}).count()
+            for parent, model, field in self.relations()
+        }
+
+    def test_deletes_fully_populated_student(self):
+        student = self.make_student('student', rating=5)
+        other = self.make_student('other', rating=3)
+        homework = Homework.objects.get(student=student)
+        ids = {
+            User: [student.user_id],
+            Student: [student.pk],
+            StudentProgress: list(StudentProgress.objects.filter(user=student.user).values_list('pk', flat=True)),
+            Homework: [homework.pk],
+            HomeworkSubmission: list(HomeworkSubmission.objects.filter(student=student).values_list('pk', flat=True)),
+        }
+        blob_name = homework.pdf_file.name
+        files = [student.avatar.name, HomeworkPhoto.objects.get(submission__student=student).photo.name]
+        before = self.referencing(ids)
+        empty = sorted(table for table, count in before.items() if not count)
+        self.assertEqual(empty, [], 'Тест не заполняет эти таблицы — проверьте и bulk_delete_students')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion = bulk_delete_students([student.user_id])
+
+        self.assertEqual(deletion.users, 1)
+        self.assertEqual(deletion.skipped, [])
+        self.assertEqual(deletion.files, 2)
+        self.assertEqual({table: count for table, count in self.referencing(ids).items() if count}, {})
+        # Данные другого студента не тронуты, производные данные пересчитаны
+        self.assertTrue(Student.objects.filter(pk=other.pk).exists())
+        self.assertEqual(list(self.group.students.all()), [other])
+        course = Course.objects.get(pk=self.course.pk)
+        self.assertEqual((course.rating_avg, course.rating_count), (3, 1))
+        self.assertEqual(
+            list(LeaderboardRank.objects.filter(scope=LeaderboardRank.GLOBAL).values_list('student_id', 'rank')),
+            [(other.pk, 1)],
+        )
+        # На blob-файл PDF ДЗ ссылался только удалённый студент — удалены и строка, и файл
+        self.assertFalse(MediaBlob.objects.filter(name=blob_name).exists())
+        self.assertFalse(default_storage.exists(blob_name))
+        self.assertTrue(default_storage.exists(Homework.objects.get(student=other).pdf_file.name))
+        self.assertEqual(sorted(Job.objects.get(kind=MEDIA_CLEANUP).payload['names']), sorted(files))
+
+    def test_skips_teachers_and_staff(self):
+        staff = User.objects.create_user('admin', password='x', is_staff=True)
+        deletion = bulk_delete_students([staff.pk, self.teacher.user_id])
+        self.assertEqual(deletion.users, 0)
+        self.assertEqual(deletion.skipped, sorted([staff.pk, self.teacher.user_id]))
+        self.assertEqual(User.objects.filter(pk__in=[staff.pk, self.teacher.user_id]).count(), 2)
+
+
+class EnrollmentAccessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lesson = Lesson.objects.create(title='Урок')
+        cls.quiz = Quiz.objects.create(title='Квиз')
+        cls.module = Module.objects.create(title='Модуль')
+        cls.module.lessons.add(cls.lesson)
+        cls.module.quizzes.add(cls.quiz)
+        cls.course = Course.objects.create(title='Курс', description='', course_code='C1')
+        cls.course.modules.add(cls.module)
+        user = User.objects.create_user('student', password='x', is_student=True)
+        cls.student = Student.objects.create(user=user)
+        cls.enrollment = Enrollment.objects.create(student=cls.student, course=cls.course)
+
+    def access(self):
+        user = self.student.user
+        return [
+            student_is_enrolled(self.student, self.course),
+            user_can_view_lesson(user, self.lesson),
+            user_can_view_module(user, self.module.pk),
+            student_can_take_quiz(self.student, self.quiz),
+        ]
+
+    def test_active_enrollment_grants_access(self):
+        self.assertEqual(self.access(), [True] * 4)
+
+    def test_inactive_enrollment_denies_access(self):
+        for status in ('completed', 'suspended'):
+            with self.subTest(status=status):
+                Enrollment.objects.filter(pk=self.enrollment.pk).update(status=status)
+                self.assertEqual(self.access(), [False] * 4)
+
+    def test_active_courses_lists_only_active_enrollments(self):
+        self.assertEqual(list(student_active_courses(self.student)), [self.course])
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(status='suspended')
+        self.assertEqual(list(student_active_courses(self.student)), [])
+
+    def test_group_attach_reports_inactive_enrollments(self):
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(status='suspended')
+        newcomer = Student.objects.create(user=User.objects.create_user('newcomer', is_student=True))
+        group = Group.objects.create(name='Группа')
+        group.students.add(self.student, newcomer)
+
+        enrollment = enroll_group_in_course(group, self.course)
+
+        self.assertEqual(enrollment.attached, 1)
+        self.assertEqual(enrollment.skipped, [self.student.pk])
+        self.assertTrue(student_is_enrolled(newcomer, self.course))
+        # Приостановленная запись не возобновляется прикреплением группы
+        self.assertEqual(Enrollment.objects.get(pk=self.enrollment.pk).status, 'suspended')
+
+    def test_quiz_list_has_each_active_quiz_once_with_results(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(is_active=True)
+        # Квиз доступен и через курс, и прямым назначением
+        self.quiz.assigned_students.add(self.student)
+        assigned = Quiz.objects.create(title='Назначенный', is_active=True)
+        assigned.assigned_students.add(self.student)
+        Quiz.objects.create(title='Неактивный').assigned_students.add(self.student)
+        for score in (40, 90, 60):
+            QuizAttempt.objects.create(student=self.student, quiz=self.quiz, score=score)
+
+        quizzes = student_quiz_list(self.student)
+
+        self.assertEqual([quiz.pk for quiz in quizzes], [self.quiz.pk, assigned.pk])
+        self.assertEqual((quizzes[0].latest_attempt.score, quizzes[0].best_score), (60, 90))
+        self.assertEqual((quizzes[1].latest_attempt, quizzes[1].best_score), (None, None))
+
+    def test_direct_quiz_assignment_does_not_depend_on_enrollment(self):
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(status='suspended')
+        self.quiz.assigned_students.add(self.student)
+        self.assertTrue(student_can_take_quiz(self.student, self.quiz))
+
+
+class LeaderboardSyncTests(TestCase):
+    """Инкрементальные обновления мест (sync_student/_shift) совпадают с полным пересчётом."""
+    steps = 80
+
+    def setUp(self):
+        self.random = random.Random(50)
+        self.teachers = [
+            Teacher.objects.create(user=User.objects.create_user(f'teacher{i}'),
+                                   first_name='Имя', last_name='Фамилия', email=f'teacher{i}@example.com')
+            for i in range(3)
+        ]
+        self.groups = [Group.objects.create(name=f'Группа {i}') for i in range(3)]
+        self.created = 0
+        for _ in range(20):
+            self.new_student()
+        for student in Student.objects.all():
+            for group in self.groups:
+                if self.random.random() < 0.4:
+                    group.students.add(student)
+
+    def new_student(self):
+        self.created += 1
+        user = User.objects.create_user(f'student{self.created}', is_student=True)
+        return Student.objects.create(user=user, stars=self.random.randint(0, 10),
+                                      teacher=self.random.choice(self.teachers + [None]))
+
+    def assertMatchesRebuild(self, step):
+        fields = ('scope', 'scope_id', 'student_id', 'stars', 'rank')
+        incremental = set(LeaderboardRank.objects.values_list(*fields))
+        rebuild_leaderboard()
+        self.assertEqual(incremental, set(LeaderboardRank.objects.values_list(*fields)), step)
+
+    def random_change(self):
+        students = list(Student.objects.all())
+        student = self.random.choice(students)
+        group = self.random.choice(self.groups)
+        sample = [other.pk for other in self.random.sample(students, min(5, len(students)))]
+        operation = self.random.choice([
+            'stars', 'stars', 'stars', 'teacher', 'group_add', 'group_remove', 'group_set',
+            'bulk_add', 'bulk_remove', 'delete', 'bulk_delete', 'create',
+        ])
+        if operation == 'stars':
+            # Повторяющиеся значения дают равные места
+            student.stars = max(0, student.stars + self.random.randint(-5, 5))
+            student.save()
+        elif operation == 'teacher':
+            student.teacher = self.random.choice(self.teachers + [None])
+            student.save()
+        elif operation == 'group_add':
+            group.students.add(student)
+        elif operation == 'group_remove':
+            student.groups.remove(group)
+        elif operation == 'group_set':
+            set_group_students(group, sample, notify=False)
+        elif operation == 'bulk_add':
+            add_students_to_group(group, sample, notify=False)
+        elif operation == 'bulk_remove':
+            remove_students_from_group(group, sample)
+        elif operation == 'delete':
+            student.user.delete()
+        elif operation == 'bulk_delete':
+            bulk_delete_students([student.user_id])
+        else:
+            self.new_student()
+        return operation
+
+    def test_random_changes(self):
+        self.assertMatchesRebuild('initial')
+        for step in range(self.steps):
+            operation = self.random_change()
+            self.assertMatchesRebuild(f'step {step}: {operation}')
+
+    def test_deleting_group_and_teacher(self):
+        self.groups[0].delete()
+        self.assertMatchesRebuild('group deleted')
+        self.teachers[0].user.delete()
+        self.assertMatchesRebuild('teacher deleted')
+
+
+class GroupMembershipTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.students = [
+            Student.objects.create(user=User.objects.create_user(f'student{i}', is_student=True)) for i in range(3)
+        ]
+        cls.group = Group.objects.create(name='Группа')
+
+    def test_resaving_group_with_form_ids_notifies_only_newcomers(self):
+        first, second, newcomer = (str(student.pk) for student in self.students)
+        set_group_students(self.group, [first, second])
+        Notification.objects.all().delete()
+
+        added, removed = set_group_students(self.group, [first, second, newcomer])
+
+        self.assertEqual((added, removed), ([self.students[2].pk], 0))
+        self.assertEqual(set(self.group.students.all()), set(self.students))
+        joined = Notification.objects.filter(message__startswith='Вы присоединились')
+        self.assertEqual(list(joined.values_list('student_id', flat=True)), [self.students[2].pk])
+        summary = Notification.objects.filter(message__startswith='К вам в группу')
+        self.assertEqual(sorted(summary.values_list('student_id', flat=True)),
+                         [self.students[0].pk, self.students[1].pk])
+
+    def test_members_missing_from_form_are_removed(self):
+        set_group_students(self.group, [student.pk for student in self.students], notify=False)
+        added, removed = set_group_students(self.group, [str(self.students[0].pk)], notify=False)
+        self.assertEqual((added, removed), ([], 2))
+        self.assertEqual(list(self.group.students.all()), [self.students[0]])
+
+
+@override_settings(GEMINI_API_KEY='test-key', GEMINI_RATE_LIMIT=2)
+class AiImageGenerateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('student', is_student=True)
+        self.client.force_login(self.user)
+
+    def post(self):
+        return self.client.post(reverse('ai_image_generate'), {'prompt': 'Кот', 'aspectRatio': '1:1'},
+                                content_type='application/json')
+
+    @mock.patch('courses.views.generate_ai_image', return_value='data:image/png;base64,AA==')
+    def test_requests_are_throttled_per_user(self, generate):
+        self.assertEqual([self.post().status_code for _ in range(3)], [200, 200, 429])
+        self.assertEqual(generate.call_count, 2)
+        # Лимит считается отдельно для каждого пользователя
+        self.client.force_login(User.objects.create_user('other', is_student=True))
+        self.assertEqual(self.post().status_code, 200)
+
+    def test_gemini_failure_is_reported_as_json(self):
+        with mock.patch('urllib.request.urlopen', side_effect=TimeoutError('timed out')):
+            response = self.post()
+        self.assertEqual(response.status_code, 502)
+        self.assertIn('timed out', response.json()['error'])
+
+
+class DirectUploadFinalizeTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        teacher = Teacher.objects.create(user=User.objects.create_user('teacher'), first_name='Иван',
+                                         last_name='Петров', email='teacher@example.com')
+        self.student = Student.objects.create(user=User.objects.create_user('student', is_student=True))
+        self.homework = Homework.objects.create(title='ДЗ', description='', teacher=teacher, student=self.student,
+                                                due_date=timezone.now())
+        self.client.force_login(self.student.user)
+
+    def test_replayed_token_registers_photo_once(self):
+        key = make_upload_key(HomeworkPhoto._meta.get_field('photo').upload_to, 'photo.png')
+        default_storage.save(key, ContentFile(b'photo'))
+        token = sign_upload(self.student.user, 'homework_photo', self.homework.pk, key, 5)
+
+        responses = [
+            self.client.post(reverse('direct_upload_finalize'), {'token': token, 'extra': {'description': 'Фото'}},
+                             content_type='application/json').json()
+            for _ in range(2)
+        ]
+
+        self.assertTrue(all(response['success'] for response in responses))
+        photo = HomeworkPhoto.objects.get()
+        self.assertEqual((photo.photo.name, photo.description), (key, 'Фото'))
+        self.assertEqual({response['photo_id'] for response in responses}, {photo.pk})
+        self.assertEqual(HomeworkSubmission.objects.filter(homework=self.homework).count(), 1)
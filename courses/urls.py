@@ -26,6 +26,7 @@ urlpatterns = [
     path('teacher/quizzes/', views.teacher_quizzes, name='teacher_quizzes'),
     path('teacher/students/', views.teacher_students, name='teacher_students'),
 path('teacher/student/progress/', views.teacher_student_progress, name='teacher_student_progress'),
+path('teacher/gradebook/', views.teacher_gradebook, name='teacher_gradebook'),
 path('teacher/quiz/<int:quiz_id>/questions/', views.teacher_quiz_questions, name='teacher_quiz_questions'),
 path('teacher/profile/', views.teacher_profile, name='teacher_profile'),
     
@@ -46,6 +47,9 @@ path('teacher/profile/', views.teacher_profile, name='teacher_profile'),
 
     # Main Pages
     path('admin_page/', views.admin_page, name='admin_page'),
+    path('admin_page/tab/<slug:tab>/', views.admin_page_tab, name='admin_page_tab'),
+    path('admin_page/jobs/<int:job_id>/', views.admin_job_status, name='admin_job_status'),
+    path('admin_page/export/<slug:name>/', views.admin_export, name='admin_export'),
     path('admin_students/', views.admin_students_page, name='admin_students_page'),
     path('admin_courses/', views.admin_courses_page, name='admin_courses_page'),
     path('admin_modules/', views.admin_modules_page, name='admin_modules_page'),
@@ -91,6 +95,16 @@ path('teacher/profile/', views.teacher_profile, name='teacher_profile'),
     path('create_lesson/<int:module_id>/', views.create_lesson, name='create_lesson_with_module'),
     path('delete/lesson/<int:lesson_id>/', views.delete_lesson, name='delete_lesson'),
     path('lesson/<int:lesson_id>/', views.view_lesson, name='view_lesson'),
+    path('lesson/<int:lesson_id>/slide/<int:page>/', views.lesson_slide, name='lesson_slide'),
+    path('lesson/<int:lesson_id>/slides/', views.lesson_slides_manifest, name='lesson_slides_manifest'),
+    path('lesson/<int:lesson_id>/package/', views.lesson_package, name='lesson_package'),
+    path('module/<int:module_id>/package/', views.module_package, name='module_package'),
+    path('slides-sw.js', views.slides_service_worker, name='slides_service_worker'),
+    path('protected/lesson/<int:lesson_id>/<str:kind>/', views.lesson_media, name='lesson_media'),
+    path('protected/homework/<int:homework_id>/file/', views.homework_file, name='homework_file'),
+    path('uploads/presign/', views.direct_upload_presign, name='direct_upload_presign'),
+    path('uploads/local/<str:token>/', views.direct_upload_local_put, name='direct_upload_local_put'),
+    path('uploads/finalize/', views.direct_upload_finalize, name='direct_upload_finalize'),
     path('replace-video/<int:lesson_id>/', views.replace_video, name='replace_video'),
     path('replace-pdf/<int:lesson_id>/', views.replace_pdf, name='replace_pdf'),
     path('detach-lesson/<int:lesson_id>/from-module/<int:module_id>/', views.detach_lesson_from_module, name='detach_lesson_from_module'),
@@ -172,6 +186,7 @@ path('teacher/profile/', views.teacher_profile, name='teacher_profile'),
     path('create_teacher/', views.create_teacher, name='create_teacher'),
 
     # AI Image Creator (более специфичный маршрут должен быть первым)
+    path('study-task---ai-image-creator/api/generate/', views.ai_image_generate, name='ai_image_generate'),
     path('study-task---ai-image-creator/<path:path>', views.ai_image_creator, name='ai_image_creator_file'),
     path('study-task---ai-image-creator/', views.ai_image_creator, name='ai_image_creator'),
 
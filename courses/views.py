@@ -4,9 +4,14 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.http import (
+    JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse, Http404,
+    HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotModified,
+)
 from django.template.loader import render_to_string
+from django.urls import reverse
 from django.forms import modelformset_factory
+from django.middleware.csrf import get_token
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 import json
@@ -15,12 +20,16 @@ import time
 from datetime import datetime
 from django.db.models import Count, Avg, Max
 import pandas as pd
+from django.core import signing
+from django.core.paginator import Paginator
+from django.core.files import File
 from django.core.files.storage import default_storage
 from django.conf import settings
 import os
 import random
 import string
 import traceback
+import uuid
 from django.db.utils import IntegrityError
 import fitz
 
@@ -39,12 +48,49 @@ from .forms import (
 from .models import (
     Lesson, Module, Course, StudentProgress, Student,
     Question, Answer, Quiz, QuizResult, ProfileEditRequest, CourseAddRequest, Notification, Group, QuizAttempt, StudentMessageRequest, Level,
-    CourseFeedback, CourseResult, Achievement, Teacher, Homework, HomeworkSubmission, HomeworkPhoto, WheelSpin
+    CourseFeedback, CourseResult, Achievement, Teacher, Homework, HomeworkSubmission, HomeworkPhoto, WheelSpin, Job,
+    LeaderboardRank,
+)
+from .services import (
+    evaluate_and_unlock_achievements, get_achievement_progress,
+    student_can_take_quiz, teacher_owns_quiz, student_is_enrolled, student_active_courses,
+    student_quiz_list, quizzes_with_attempts,
+    user_can_view_lesson, render_lesson_slide, build_slides_manifest, server_slides_supported,
+    user_can_view_homework, user_can_view_module, UPLOAD_TARGETS, bulk_delete_students,
+    add_students_to_group, remove_students_from_group, set_group_students, teacher_dashboard_stats,
+    teacher_module_ids, teacher_modules_queryset, teacher_lessons_queryset, teacher_quizzes_queryset,
+)
+from .jobs import (
+    enqueue, enqueue_slide_conversion, job_status, STUDENT_IMPORT, GROUP_COURSE_ATTACH, STUDENT_DELETE,
+)
+from .protected_media import protected_file_response
+from .asset_server import asset_response
+from .admin_tabs import ADMIN_TABS, tab_page, tab_json
+from .request_history import DEFAULT_LIMIT as DEFAULT_HISTORY_LIMIT, MAX_LIMIT as MAX_HISTORY_LIMIT, history_page
+from .exports import EXPORTS, csv_response, xlsx_available, xlsx_response
+from .gradebook import teacher_gradebook as get_teacher_gradebook
+from .gemini import (
+    ASPECT_RATIOS as GEMINI_ASPECT_RATIOS, MAX_PROMPT_LENGTH as GEMINI_MAX_PROMPT_LENGTH, GeminiError,
+    acquire_quota as acquire_gemini_quota, generate_image as generate_ai_image,
+)
+from .leaderboard import group_leaderboards, leaderboard_around, leaderboard_page, student_rank as get_student_rank
+from .direct_uploads import (
+    make_upload_key, sign_upload, load_upload, load_local_put, supports_direct_upload,
 )
-from .services import evaluate_and_unlock_achievements, get_achievement_progress
 
 logger = logging.getLogger(__name__)
 
+# Ключ сессии со списком фоновых задач, прогресс которых показывается администратору
+ADMIN_JOBS_SESSION_KEY = 'admin_jobs'
+# Строк на странице в списках модулей, уроков и квизов преподавателя
+TEACHER_LISTING_PER_PAGE = 25
+
+
+def track_admin_job(request, job):
+    """Запоминает задачу в сессии, чтобы admin_page показал её прогресс."""
+    job_ids = request.session.get(ADMIN_JOBS_SESSION_KEY, [])
+    request.session[ADMIN_JOBS_SESSION_KEY] = job_ids + [job.pk]
+
 # Landing Page View
 def landing_page(request):
     """
@@ -200,6 +246,9 @@ def logout_view(request):
 # Admin Views
 @login_required
 def admin_page(request):
+    # Форма страницы ставит в очередь импорт и массовое удаление студентов — только для персонала
+    if not request.user.is_staff:
+        return HttpResponseForbidden('Доступ запрещен')
     from .models import ProfileEditRequest, CourseAddRequest, Notification, Group, StudentMessageRequest, Level
     student_form = StudentRegistrationForm()
     excel_form = StudentExcelUploadForm()
@@ -333,65 +382,12 @@ def admin_page(request):
             excel_form = StudentExcelUploadForm(request.POST, request.FILES)
             if excel_form.is_valid():
                 excel_file = excel_form.cleaned_data['file']
-                file_path = default_storage.save('tmp/' + excel_file.name, excel_file)
-                abs_path = os.path.join(settings.MEDIA_ROOT, file_path)
-                try:
-                    import datetime
-                    df = pd.read_excel(abs_path)
-                    added_count = 0
-                    new_students = []
-                    for idx, row in df.iterrows():
-                        email = get_col(row, 'Электронная почта', 'Почта', 'email')
-                        first_name = get_col(row, 'Имя', 'first_name')
-                        last_name = get_col(row, 'Фамилия', 'last_name')
-                        if not email or '@' not in email:
-                            continue
-                        username = email
-                        try:
-                            # Проверяем, нет ли другого пользователя с таким username, но другим email
-                            conflict = User.objects.filter(username=username).exclude(email=email).first()
-                            if conflict:
-                                continue  # Можно заменить на conflict.delete() если нужно удалять
-                            temp_password = generate_random_password()
-                            user, created = User.objects.get_or_create(email=email, defaults={
-                                'username': username,
-                                'first_name': first_name,
-                                'last_name': last_name,
-                                'is_student': True
-                            })
-                            user.username = email  # username всегда равен email
-                            user.set_password(temp_password)
-                            user.save()
-                            student, s_created = Student.objects.get_or_create(user=user)
-                            if not student.email:
-                                student.email = email
-                            if not student.first_name:
-                                student.first_name = first_name
-                            if not student.last_name:
-                                student.last_name = last_name
-                            student.temporary_password = temp_password
-                            student.save()
-                            if created or s_created:
-                                added_count += 1
-                            new_students.append(student)
-                        except IntegrityError as e:
-                            # Пропускаем дубликаты
-                            continue
-                        except Exception as e:
-                            # Логируем другие ошибки и пропускаем проблемную строку
-                            logger.error(f"Ошибка при обработке студента {email}: {e}")
-                            continue
-                    # Создаём новую группу для этой загрузки
-                    group_name = f'Группа от {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
-                    group = Group.objects.create(name=group_name)
-                    group.students.set(new_students)
-                    group.save()
-                    messages.success(request, f'Все студенты из файла успешно добавлены! ({added_count}) Создана группа: {group_name}')
-                except Exception as e:
-                    messages.error(request, f'Ошибка при обработке файла: {e}')
-                finally:
-                    if os.path.exists(abs_path):
-                        os.remove(abs_path)
+                # Импорт выполняет воркер (run_jobs): файл сохраняется в хранилище до его обработки
+                extension = os.path.splitext(excel_file.name)[1].lower() or '.xlsx'
+                name = default_storage.save(f'imports/{uuid.uuid4().hex}{extension}', excel_file)
+                job = enqueue(STUDENT_IMPORT, file=name)
+                track_admin_job(request, job)
+                messages.info(request, 'Файл принят, импорт студентов выполняется в фоне.')
                 return redirect('admin_page')
         elif 'add_lesson' in request.POST:
             lesson_form = LessonCreationForm(request.POST, request.FILES)
@@ -509,35 +505,25 @@ def admin_page(request):
             student_ids = request.POST.getlist('group_students')
             if group_name and student_ids:
                 group, created = Group.objects.get_or_create(name=group_name)
-                new_students = Student.objects.filter(id__in=student_ids)
-                old_students = set(group.students.all())
-                group.students.set(new_students)
-                # Уведомления для новых участников
-                for student in new_students:
-                    if student not in old_students:
-                        Notification.objects.create(
-                            student=student,
-                            type='profile_edit',
-                            message=f'Вы присоединились к группе "{group.name}".'
-                        )
-                        # Уведомления для остальных участников
-                        for other in new_students:
-                            if other != student:
-                                Notification.objects.create(
-                                    student=other,
-                                    type='profile_edit',
-                                    message=f'К вам в группу "{group.name}" присоединился {student.user.username}.'
-                                )
+                # Состав группы меняется пачками, уведомления о вступлении — одной пачкой
+                set_group_students(group, student_ids)
                 messages.success(request, f'Группа "{group_name}" создана!')
             return redirect('admin_page')
         elif 'attach_group_to_course' in request.POST:
-            group_id = request.POST.get('group_id')
-            course_id = request.POST.get('course_id')
-            group = Group.objects.get(id=group_id)
-            course = Course.objects.get(id=course_id)
-            for student in group.students.all():
-                student.courses.add(course)
-            messages.success(request, f'Все студенты из группы "{group.name}" прикреплены к курсу "{course.title}"!')
+            group = get_object_or_404(Group, id=request.POST.get('group_id'))
+            course = get_object_or_404(Course, id=request.POST.get('course_id'))
+            job = enqueue(GROUP_COURSE_ATTACH, group_id=group.pk, course_id=course.pk)
+            track_admin_job(request, job)
+            messages.info(request, f'Студенты группы "{group.name}" прикрепляются к курсу "{course.title}" в фоне.')
+            return redirect('admin_page')
+        elif 'delete_students' in request.POST:
+            student_ids = [int(value) for value in request.POST.getlist('student_ids') if value.isdigit()]
+            if student_ids:
+                job = enqueue(STUDENT_DELETE, student_ids=student_ids)
+                track_admin_job(request, job)
+                messages.info(request, f'Удаление студентов ({len(student_ids)}) выполняется в фоне.')
+            else:
+                messages.error(request, 'Не выбрано ни одного студента.')
             return redirect('admin_page')
         # === Notifications CRUD ===
         elif 'create_notification' in request.POST:
@@ -632,93 +618,62 @@ def admin_page(request):
                 messages.error(request, f'Ошибка удаления достижения: {e}')
             return redirect('admin_page')
 
-    students = Student.objects.all()
-    lessons = Lesson.objects.all()
-    modules = Module.objects.all()
-    courses = Course.objects.all()
-    quizzes = Quiz.objects.all()
-    available_lessons = Lesson.objects.all()  # Все доступные уроки
-    edit_requests = ProfileEditRequest.objects.filter(status='pending').select_related('student__user')
-    course_add_requests = CourseAddRequest.objects.filter(status='pending').select_related('student__user', 'assigned_course')
-    message_requests = StudentMessageRequest.objects.filter(status='pending').select_related('student__user')
-    groups = Group.objects.all().prefetch_related('students')
-    levels = Level.objects.all().order_by('number')
-    teachers = Teacher.objects.all().order_by('last_name', 'first_name')
-    # Notifications list for admin management
-    notifications_admin = Notification.objects.all().select_related('student__user').order_by('-created_at')[:500]
-    notification_type_choices = Notification._meta.get_field('type').choices
-    achievements_admin = Achievement.objects.all().order_by('condition_type', 'condition_value')
-
-    # Формируем данные о прогрессе достижений студентов (для подвкладки "Скоро подарок")
-    from .services import get_achievement_progress
-    achievement_progress_data = []
-    
-    for student in students:
-        for achievement in achievements_admin:
-            if achievement.is_active:
-                progress_data = get_achievement_progress(student, achievement)
-                if progress_data['percentage'] > 50 and progress_data['percentage'] < 100:
-                    achievement_progress_data.append({
-                        'student': student,
-                        'achievement': achievement,
-                        'progress_data': {
-                            'progress_percentage': progress_data['percentage'],
-                            'current_value': progress_data['current'],
-                            'target_value': progress_data['target']
-                        }
-                    })
-    
-    # Сортируем по проценту выполнения (по убыванию)
-    achievement_progress_data.sort(key=lambda x: x['progress_data']['progress_percentage'], reverse=True)
-
-    # Формируем словарь прогресса для быстрого доступа в шаблоне (по факту завершённых уроков)
-    progress_dict = {}
-    for student in students:
-        for course in student.courses.all():
-            # Создаём объект прогресса, если его нет
-            sp, created = StudentProgress.objects.get_or_create(user=student.user, course=course)
-            # Получаем все уроки курса
-            all_lessons = set()
-            for module in course.modules.all():
-                all_lessons.update(module.lessons.values_list('id', flat=True))
-            all_lessons_count = len(all_lessons)
-            completed_lessons = set(sp.completed_lessons.values_list('id', flat=True))
-            if all_lessons_count > 0:
-                percent = int((len(completed_lessons) / all_lessons_count) * 100)
-            else:
-                percent = 0
-            sp.progress = percent
-            sp.save()
-            key = f'{student.user.id}_{course.id}'
-            progress_dict[key] = percent
-
+    # Таблицы вкладок загружаются отдельно (admin_page_tab), когда вкладка открыта
     context = {
         'student_form': student_form,
         'excel_form': excel_form,
         'lesson_form': lesson_form,
         'module_form': module_form,
         'course_form': course_form,
-        'students': students,
-        'lessons': lessons,
-        'modules': modules,
-        'courses': courses,
-        'quizzes': quizzes,
-        'available_lessons': available_lessons,  # Добавляем в контекст
-        'progress_dict': progress_dict,          # Новый словарь для шаблона
-        'edit_requests': edit_requests,
-        'course_add_requests': course_add_requests,
-        'groups': groups,
-        'message_requests': message_requests,
-        'levels': levels,
-        'teachers': teachers,
         'error': error,
-        'notifications_admin': notifications_admin,
-        'notification_type_choices': notification_type_choices,
-        'all_achievements': achievements_admin,
-        'achievement_progress_data': achievement_progress_data,
+        'notification_type_choices': Notification._meta.get_field('type').choices,
+        'exports': EXPORTS,
+        'admin_jobs': [
+            job_status(job)
+            for job in Job.objects.filter(pk__in=request.session.get(ADMIN_JOBS_SESSION_KEY, [])).order_by('created_at')
+        ],
     }
     return render(request, 'courses/admin_page_test.html', context)
 
+@login_required
+def admin_page_tab(request, tab):
+    """Страница таблицы вкладки админ-панели: HTML-фрагмент или JSON (?format=json)."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden('Доступ запрещен')
+    if tab not in ADMIN_TABS:
+        raise Http404('Неизвестная вкладка')
+    spec, context = tab_page(request, tab)
+    if request.GET.get('format') == 'json':
+        return JsonResponse(tab_json(spec, context))
+    return render(request, spec.template, context)
+
+@login_required
+def admin_export(request, name):
+    """Потоковая выгрузка данных студентов: CSV по умолчанию, ?format=xlsx — Excel."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden('Доступ запрещен')
+    if name not in EXPORTS:
+        raise Http404('Неизвестная выгрузка')
+    if request.GET.get('format') == 'xlsx':
+        if not xlsx_available():
+            return HttpResponseBadRequest('Выгрузка в Excel недоступна: не установлен openpyxl')
+        return xlsx_response(name)
+    return csv_response(name)
+
+@login_required
+def admin_job_status(request, job_id):
+    """Лёгкий endpoint для опроса прогресса фоновой задачи со страницы администратора."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden('Доступ запрещен')
+    job = get_object_or_404(Job, pk=job_id)
+    status = job_status(job)
+    if status['finished']:
+        # Итог показан — при следующем открытии страницы задача уже не отображается
+        job_ids = request.session.get(ADMIN_JOBS_SESSION_KEY, [])
+        if job.pk in job_ids:
+            request.session[ADMIN_JOBS_SESSION_KEY] = [pk for pk in job_ids if pk != job.pk]
+    return JsonResponse(status)
+
 @login_required
 def admin_levels(request):
     levels = Level.objects.all().order_by('number')
@@ -778,7 +733,13 @@ def rating_page(request):
         return redirect('student_login')
     
     student = request.user.student
-    groups = student.groups.all().prefetch_related('students__user')
+    groups = list(student.groups.order_by('pk'))
+    boards = group_leaderboards(group.pk for group in groups)
+    for group in groups:
+        group.ranked_students = []
+        for row in boards.get(group.pk, []):
+            row.student.position = row.rank
+            group.ranked_students.append(row.student)
     
     context = {
         'student': student,
@@ -789,7 +750,7 @@ def rating_page(request):
 @login_required
 def student_page(request):
     student = get_object_or_404(Student, user=request.user)
-    courses = student.courses.all()
+    courses = student_active_courses(student)
     from .models import QuizResult, Quiz, CourseAddRequest, Course, StudentMessageRequest, Level
     quiz_results = QuizResult.objects.filter(user=request.user)
     for result in quiz_results:
@@ -899,55 +860,23 @@ def student_page(request):
             progress_by_id[ach.id] = get_achievement_progress(student, ach)
         except Exception as e:
             progress_by_id[ach.id] = {'current': 0, 'target': ach.condition_value or 1, 'percentage': 0}
-    groups = student.groups.all().prefetch_related('students__user')
-    
-    # Получаем квизы студента (из модулей курсов и прямые назначения)
-    student_quizzes = []
+    groups = student.groups.order_by('pk')
     
-    # Сначала получаем прямые назначения квизов (важно!)
-    for quiz in student.assigned_quizzes.filter(is_active=True):
-        if quiz not in student_quizzes:
-            student_quizzes.append(quiz)
+    # Квизы студента (из модулей курсов и прямые назначения) с последней и лучшей попыткой
+    student_quizzes = student_quiz_list(student)
     
-    # Затем добавляем квизы из модулей курсов
-    for course in courses:
-        for module in course.modules.all():
-            for quiz in module.quizzes.filter(is_active=True):
-                if quiz not in student_quizzes:
-                    student_quizzes.append(quiz)
-    
-    # Добавляем информацию о результатах квизов
-    for quiz in student_quizzes:
-        latest_attempt = QuizAttempt.objects.filter(
-            student=student, 
-            quiz=quiz
-        ).order_by('-created_at').first()
-        
-        if latest_attempt:
-            quiz.latest_attempt = latest_attempt
-            quiz.best_score = QuizAttempt.objects.filter(
-                student=student, 
-                quiz=quiz
-            ).aggregate(Max('score'))['score__max']
-        else:
-            quiz.latest_attempt = None
-            quiz.best_score = None
-    
-    # Создаем рейтинг групп
-    rating_groups = []
-    for group in groups:
-        group_students = group.students.all().select_related('user').order_by('-stars', 'user__first_name')
-        students_with_rating = []
-        for position, group_student in enumerate(group_students, 1):
-            students_with_rating.append({
-                'student': group_student,
-                'position': position
-            })
-        
-        rating_groups.append({
+    # Рейтинги групп — готовые места из LeaderboardRank одним запросом
+    group_list = list(groups)
+    boards = group_leaderboards(group.pk for group in group_list)
+    rating_groups = [
+        {
             'name': group.name,
-            'students_with_rating': students_with_rating
-        })
+            'students_with_rating': [
+                {'student': row.student, 'position': row.rank} for row in boards.get(group.pk, [])
+            ],
+        }
+        for group in group_list
+    ]
     
     # Количество групп для хедера
     groups_count = groups.count()
@@ -971,13 +900,13 @@ def student_page(request):
                 # Пересчитываем данные прогресса для обновленного списка курсов
                 updated_progress_data = {}
                 updated_course_completed_data = {}
-                for course in student.courses.all():
+                for course in student_active_courses(student):
                     progress_value = student.calculate_progress(course)
                     updated_progress_data[course.id] = progress_value
                     updated_course_completed_data[course.id] = course.is_completed_by(student)
                 
                 return render(request, 'courses/student_page.html', {
-                    'courses': student.courses.all(),
+                    'courses': student_active_courses(student),
                     'progress_data': updated_progress_data,
                     'course_completed_data': updated_course_completed_data,
                     'student': student,
@@ -1151,7 +1080,7 @@ def student_details(request, user_id):
     
     # Подготовка данных о прогрессе
     progress_data = []
-    for course in student.courses.all():
+    for course in student_active_courses(student):
         # Используем правильную логику расчета прогресса (уроки + квизы)
         progress_value = student.calculate_progress(course)
         progress_data.append({
@@ -1175,9 +1104,11 @@ def student_details(request, user_id):
 def course_detail(request, course_id):
     course = get_object_or_404(Course, id=course_id)
     quiz_results = {}
-    for module in course.modules.all():
-        for quiz in module.quizzes.all():
-            result = QuizAttempt.objects.filter(student__user=request.user, quiz=quiz).order_by('-attempt_number').first()
+    student = Student.objects.filter(user=request.user).first()
+    if student is not None:
+        # Последние попытки по всем квизам курса — одним запросом вместо запроса на квиз
+        for quiz in quizzes_with_attempts(Quiz.objects.filter(module__course=course).distinct(), student):
+            result = quiz.latest_attempt
             if result:
                 quiz_results[quiz.id] = {
                     'score': result.score,
@@ -1206,34 +1137,17 @@ def course_detail(request, course_id):
                 next_lesson_id_by_module[module.id] = lesson.id
                 break
 
-    # Подготавливаем данные о слайдах для передачи через json_script
-    all_lesson_slides_data = {}
-    for module in course.modules.all():
-        for lesson in module.lessons.all():
-            # Если требуется конвертация, но слайдов нет — попробуем сконвертировать на лету
-            if lesson.convert_pdf_to_slides and lesson.pdf and not lesson.slides.exists():
-                try:
-                    from .services import handle_lesson_file_conversion
-                    from .models import LessonSlide
-                    image_paths = handle_lesson_file_conversion(lesson)
-                    if image_paths:
-                        for order, img_path in enumerate(image_paths):
-                            relative_path = os.path.relpath(img_path, settings.MEDIA_ROOT).replace('\\', '/')
-                            LessonSlide.objects.create(lesson=lesson, image=relative_path, order=order + 1)
-                        lesson.converted_slides_status = 'completed'
-                        lesson.slide_count = len(image_paths)
-                        lesson.save(update_fields=['converted_slides_status', 'slide_count'])
-                    else:
-                        lesson.converted_slides_status = 'failed'
-                        lesson.slide_count = 0
-                        lesson.save(update_fields=['converted_slides_status', 'slide_count'])
-                except Exception:
-                    # Не прерываем страницу курса, просто оставим без слайдов
-                    pass
-            # Собираем URL слайдов, если они есть
-            if lesson.slides.exists():
-                slides_urls = [slide.image.url for slide in lesson.slides.all().order_by('order')]
-                all_lesson_slides_data[lesson.id] = slides_urls
+    # Слайды не встраиваются в страницу — их манифест загружается при открытии урока.
+    # Уроки, которые ещё ни разу не конвертировались, ставим в очередь воркеру
+    unconverted_lessons = (
+        Lesson.objects.filter(module__course=course, convert_pdf_to_slides=True, slides_manifest__isnull=True)
+        .exclude(pdf='')
+        .exclude(converted_slides_status__in=['pending', 'processing', 'failed'])
+        .distinct()
+    )
+    for lesson in unconverted_lessons:
+        if not lesson.slides.exists():
+            enqueue_slide_conversion(lesson)
 
     completed_modules_ids = set()
     if student_progress:
@@ -1285,7 +1199,6 @@ def course_detail(request, course_id):
         'completed_lessons': completed_lessons,
         'module_progress': module_progress,
         'next_lesson_id_by_module': next_lesson_id_by_module,
-        'all_lesson_slides_data': all_lesson_slides_data, # Передаем данные о слайдах
         'completed_modules_ids': completed_modules_ids,
         'unlocked_modules_ids': unlocked_modules_ids,
         'module_can_be_completed': module_can_be_completed,
@@ -1405,6 +1318,204 @@ def view_lesson(request, lesson_id):
             lesson.save()
     return render(request, 'courses/view_lesson.html', {'lesson': lesson})
 
+@login_required
+def lesson_slide(request, lesson_id, page):
+    """Отдаёт одну страницу PDF урока как изображение, рендеря её при первом запросе."""
+    lesson = get_object_or_404(Lesson, id=lesson_id)
+    if not lesson.pdf or os.path.splitext(lesson.pdf.name)[1].lower() != '.pdf':
+        raise Http404('У урока нет PDF')
+    if not server_slides_supported():
+        # PDF в удалённом хранилище: страницу курса рендерит PDF.js в браузере
+        raise Http404('Слайды не рендерятся на сервере')
+    if not user_can_view_lesson(request.user, lesson):
+        return HttpResponseForbidden('Нет доступа к уроку')
+
+    dpi = settings.SLIDES_DPI
+    if request.GET.get('dpi'):
+        try:
+            dpi = int(request.GET['dpi'])
+        except ValueError:
+            dpi = None
+        if dpi not in settings.SLIDES_ALLOWED_DPI:
+            return HttpResponseBadRequest('Недопустимое значение dpi')
+
+    rendered = render_lesson_slide(lesson, page, dpi=dpi)
+    if rendered is None:
+        raise Http404('Страница не найдена')
+    path, etag, total, version = rendered
+
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=guess_type(path)[0] or 'application/octet-stream')
+    response['ETag'] = etag
+    # Навсегда кэшируется только URL с версией текущего PDF (?v=); без неё — проверка по ETag,
+    # чтобы после замены файла преподавателем браузер не показывал старые страницы
+    if request.GET.get('v') == version:
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'private, no-cache'
+    response['X-Slide-Count'] = str(total)
+    response['X-Slide-Version'] = version
+    return response
+
+@login_required
+def lesson_slides_manifest(request, lesson_id):
+    """JSON-манифест слайдов урока; загружается страницей курса при открытии урока."""
+    lesson = get_object_or_404(Lesson, id=lesson_id)
+    if not user_can_view_lesson(request.user, lesson):
+        return JsonResponse({'error': 'Нет доступа к уроку'}, status=403)
+
+    manifest = lesson.slides_manifest
+    if manifest is None and lesson.converted_slides_status == 'completed':
+        # Уроки, сконвертированные до появления манифеста
+        manifest = build_slides_manifest(lesson)
+        Lesson.objects.filter(pk=lesson.pk).update(slides_manifest=manifest)
+    manifest = manifest or {'version': '', 'count': 0, 'slides': []}
+
+    etag = f'"{lesson.pk}-{lesson.converted_slides_status}-{manifest["version"]}-{bool(lesson.offline_package)}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({
+            'lesson_id': lesson.pk,
+            'status': lesson.converted_slides_status,
+            'count': manifest['count'],
+            'package_url': reverse('lesson_package', args=[lesson.pk]) if lesson.offline_package else '',
+            'slides': [
+                {
+                    'url': default_storage.url(slide['image']),
+                    'thumbnail': default_storage.url(slide['thumbnail']) if slide['thumbnail'] else '',
+                }
+                for slide in manifest['slides']
+            ],
+        })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
+
+@login_required
+def lesson_media(request, lesson_id, kind):
+    """Отдаёт видео или PDF урока записанным на курс (с поддержкой Range)."""
+    if kind not in ('video', 'pdf'):
+        raise Http404('Неизвестный тип файла')
+    lesson = get_object_or_404(Lesson, id=lesson_id)
+    fieldfile = getattr(lesson, kind)
+    if not fieldfile:
+        raise Http404('Файл не найден')
+    if not user_can_view_lesson(request.user, lesson):
+        return HttpResponseForbidden('Нет доступа к уроку')
+    return protected_file_response(request, fieldfile)
+
+@login_required
+def lesson_package(request, lesson_id):
+    """Zip-архив слайдов урока для офлайн-просмотра (докачка через Range)."""
+    lesson = get_object_or_404(Lesson, id=lesson_id)
+    if not lesson.offline_package:
+        raise Http404('Архив ещё не готов')
+    if not user_can_view_lesson(request.user, lesson):
+        return HttpResponseForbidden('Нет доступа к уроку')
+    return protected_file_response(request, lesson.offline_package, as_attachment=True,
+                                   filename=f'lesson-{lesson.pk}-slides.zip')
+
+@login_required
+def module_package(request, module_id):
+    """Zip-архив слайдов всех уроков модуля."""
+    module = get_object_or_404(Module, id=module_id)
+    if not module.offline_package:
+        raise Http404('Архив ещё не готов')
+    if not user_can_view_module(request.user, module.pk):
+        return HttpResponseForbidden('Нет доступа к модулю')
+    return protected_file_response(request, module.offline_package, as_attachment=True,
+                                   filename=f'module-{module.pk}-slides.zip')
+
+def slides_service_worker(request):
+    """Service worker офлайн-кэша слайдов; отдаётся с корня сайта, чтобы охватить все страницы."""
+    response = render(request, 'courses/slides_sw.js', content_type='application/javascript; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@login_required
+def homework_file(request, homework_id):
+    """Отдаёт PDF домашнего задания студенту, которому оно выдано, и его преподавателю."""
+    homework = get_object_or_404(Homework.objects.select_related('student', 'teacher'), id=homework_id)
+    if not homework.pdf_file:
+        raise Http404('Файл не найден')
+    if not user_can_view_homework(request.user, homework):
+        return HttpResponseForbidden('Нет доступа к заданию')
+    return protected_file_response(request, homework.pdf_file)
+
+@login_required
+@require_POST
+def direct_upload_presign(request):
+    """Выдаёт подписанный URL для загрузки файла из браузера прямо в хранилище."""
+    try:
+        data = json.loads(request.body)
+        target_name = data['target']
+        object_id = int(data['object_id'])
+        size = int(data['size'])
+        content_type = data.get('content_type') or 'application/octet-stream'
+        filename = data['filename']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Некорректный запрос'}, status=400)
+
+    target = UPLOAD_TARGETS.get(target_name)
+    if target is None or not target.accepts(content_type):
+        return JsonResponse({'success': False, 'error': 'Недопустимый тип файла'}, status=400)
+    if not 0 < size <= settings.DIRECT_UPLOAD_MAX_SIZE:
+        return JsonResponse({'success': False, 'error': 'Недопустимый размер файла'}, status=400)
+    if not supports_direct_upload(default_storage):
+        return JsonResponse({'success': False, 'error': 'Хранилище не поддерживает прямую загрузку'}, status=400)
+    if not target.check_access(request.user, object_id):
+        return JsonResponse({'success': False, 'error': 'Нет доступа'}, status=403)
+
+    key = make_upload_key(target.upload_to, filename)
+    url, headers = default_storage.presigned_put(key, content_type, size, settings.DIRECT_UPLOAD_EXPIRES)
+    return JsonResponse({
+        'success': True,
+        'url': url,
+        'method': 'PUT',
+        'headers': headers,
+        'key': key,
+        'token': sign_upload(request.user, target_name, object_id, key, size),
+    })
+
+@csrf_exempt
+def direct_upload_local_put(request, token):
+    """Приём PUT-загрузки для локального хранилища (замена S3 в разработке и тестах)."""
+    if request.method != 'PUT':
+        return HttpResponse(status=405)
+    try:
+        data = load_local_put(token)
+    except signing.BadSignature:
+        return HttpResponseForbidden('Ссылка для загрузки недействительна')
+    if int(request.META.get('CONTENT_LENGTH') or 0) != data['size']:
+        return HttpResponseBadRequest('Размер файла не совпадает с заявленным')
+    if default_storage.exists(data['key']):
+        return HttpResponseBadRequest('Файл уже загружен')
+    default_storage.save(data['key'], File(request))
+    return HttpResponse(status=200)
+
+@login_required
+@require_POST
+def direct_upload_finalize(request):
+    """Регистрирует загруженный напрямую файл в модели (HomeworkPhoto, Lesson)."""
+    try:
+        data = json.loads(request.body)
+        upload = load_upload(data['token'])
+    except (ValueError, KeyError, TypeError, signing.BadSignature):
+        return JsonResponse({'success': False, 'error': 'Некорректный запрос'}, status=400)
+
+    target = UPLOAD_TARGETS[upload['target']]
+    if upload['user'] != request.user.pk or not target.check_access(request.user, upload['object_id']):
+        return JsonResponse({'success': False, 'error': 'Нет доступа'}, status=403)
+    key = upload['key']
+    if not default_storage.exists(key) or default_storage.size(key) != upload['size']:
+        return JsonResponse({'success': False, 'error': 'Файл не загружен'}, status=400)
+
+    result = target.register(request.user, upload['object_id'], key, data.get('extra') or {})
+    return JsonResponse({'success': True, **result})
+
 @login_required
 def delete_lesson(request, lesson_id):
     lesson = get_object_or_404(Lesson, id=lesson_id)
@@ -1510,7 +1621,7 @@ def start_quiz(request, quiz_id):
     if not course:
         messages.error(request, 'Модуль не привязан ни к одному курсу.')
         return redirect('student_page')
-    if course not in student.courses.all():
+    if not student_is_enrolled(student, course):
         messages.error(request, 'Вы не записаны на этот курс.')
         return redirect('student_page')
     student_progress = StudentProgress.objects.filter(user=request.user, course=course).first()
@@ -1894,59 +2005,12 @@ def delete_user(request, user_id):
             return redirect('admin_students_page')
         
         if request.method == 'POST':
-            # Получаем связанного студента, если он существует
-            student = None
-            try:
-                student = Student.objects.get(user=user)
-            except Student.DoesNotExist:
-                pass
-            
-            # Удаляем связанные данные перед удалением пользователя
-            if student:
-                # Удаляем аватар студента, если он есть
-                if student.avatar:
-                    try:
-                        student.avatar.delete(save=False)
-                    except Exception:
-                        pass
-                
-                # Удаляем прогресс студента
-                StudentProgress.objects.filter(user=user).delete()
-                
-                # Удаляем результаты квизов
-                QuizResult.objects.filter(user=user).delete()
-                QuizAttempt.objects.filter(student=student).delete()
-                
-                # Удаляем результаты курсов
-                CourseResult.objects.filter(user=user).delete()
-                
-                # Удаляем отзывы о курсах
-                CourseFeedback.objects.filter(student=student).delete()
-                
-                # Удаляем домашние задания и отправки
-                HomeworkSubmission.objects.filter(student=student).delete()
-                Homework.objects.filter(student=student).delete()
-                
-                # Удаляем запросы
-                CourseAddRequest.objects.filter(student=student).delete()
-                ProfileEditRequest.objects.filter(student=student).delete()
-                StudentMessageRequest.objects.filter(student=student).delete()
-                
-                # Удаляем уведомления
-                Notification.objects.filter(student=student).delete()
-                
-                # Удаляем вращения колеса фортуны
-                WheelSpin.objects.filter(student=student).delete()
-                
-                # Открепляем студента от всех курсов и групп
-                student.courses.clear()
-                student.groups.clear()
-                
-                # Удаляем студента
-                student.delete()
-            
-            # Удаляем пользователя (это также удалит все связи через CASCADE)
-            user.delete()
+            # Студент со всеми данными удаляется set-based DELETE-ами в одной транзакции,
+            # файлы (аватар, фото ДЗ) — фоновой задачей
+            deletion = bulk_delete_students([user.pk])
+            if deletion.skipped:
+                # Преподаватели и персонал — обычным каскадом Django
+                user.delete()
             
             messages.success(request, 'Студент успешно удален')
             return redirect('admin_students_page')
@@ -2060,7 +2124,7 @@ def student_public_profile(request, student_id):
     student = get_object_or_404(Student, id=student_id)
     user = student.user
     # Курсы и прогресс
-    courses = student.courses.all()
+    courses = student_active_courses(student)
     course_progress = {}
     for course in courses:
         # Используем правильную логику расчета прогресса (уроки + квизы)
@@ -2073,18 +2137,15 @@ def student_public_profile(request, student_id):
             sp.progress = progress_value
             sp.save()
     # Группы и рейтинг в группе
-    groups = student.groups.all()
-    group_ratings = []
-    for group in groups:
-        group_students = list(group.students.all())
-        # Сортировка по звёздам (убывание)
-        sorted_students = sorted(group_students, key=lambda s: s.stars, reverse=True)
-        place = sorted_students.index(student) + 1 if student in sorted_students else '-'
-        group_ratings.append({
-            'group': group,
-            'place': place,
-            'total': len(sorted_students)
-        })
+    # annotate до filter: число участников считается по отдельному JOIN, а не по связи со студентом
+    groups = Group.objects.annotate(students_count=Count('students')).filter(students=student)
+    places = dict(LeaderboardRank.objects.filter(
+        scope=LeaderboardRank.GROUP, student=student,
+    ).values_list('scope_id', 'rank'))
+    group_ratings = [
+        {'group': group, 'place': places.get(group.pk, '-'), 'total': group.students_count}
+        for group in groups
+    ]
     # Пройденные квизы
     quiz_results = QuizResult.objects.filter(user=user).select_related('quiz').order_by('-date_taken')
     quizzes = [
@@ -2128,7 +2189,7 @@ def mark_notifications_read(request):
 def student_dashboard(request):
     student = get_object_or_404(Student, user=request.user)
     enrollments = []
-    for course in student.courses.all():
+    for course in student_active_courses(student):
         progress = student.calculate_progress(course)
         # Обновим прогресс в StudentProgress
         sp = StudentProgress.objects.filter(user=student.user, course=course).first()
@@ -2145,17 +2206,6 @@ def student_dashboard(request):
     }
     return render(request, 'student_dashboard.html', context)
 
-def get_col(row, *names):
-    for name in names:
-        for col in row.index:
-            if col.strip().lower() == name.strip().lower():
-                return str(row[col]).strip()
-    return ''
-
-def generate_random_password(length=8):
-    characters = string.ascii_letters + string.digits
-    return ''.join(random.choice(characters) for i in range(length))
-
 @login_required
 def group_management_page(request, group_id):
     group = get_object_or_404(Group, id=group_id)
@@ -2176,23 +2226,19 @@ def group_management_page(request, group_id):
                 messages.error(request, 'Название группы не может быть пустым.')
         elif 'remove_students_from_group' in request.POST:
             student_ids = request.POST.getlist('students_to_remove')
-            students_to_remove = Student.objects.filter(id__in=student_ids)
-            for student in students_to_remove:
-                group.students.remove(student)
-            group.refresh_from_db() # Обновляем объект группы из базы данных
+            remove_students_from_group(group, student_ids)
             messages.success(request, 'Выбранные студенты успешно удалены из группы.')
         elif 'add_students_to_group' in request.POST:
             student_ids = request.POST.getlist('students_to_add')
-            students_to_add = Student.objects.filter(id__in=student_ids)
-            for student in students_to_add:
-                group.students.add(student)
+            # Как и раньше, добавление со страницы группы проходит без уведомлений
+            add_students_to_group(group, student_ids, notify=False)
             messages.success(request, 'Выбранные студенты успешно добавлены в группу.')
         elif 'attach_course_to_student' in request.POST:
             student_id = request.POST.get('student_id')
             course_id = request.POST.get('course_id')
             student = get_object_or_404(Student, id=student_id)
             course = get_object_or_404(Course, id=course_id)
-            if course not in student.courses.all():
+            if not student.courses.filter(pk=course.pk).exists():
                 student.courses.add(course)
                 messages.success(request, f'Курс "{course.title}" успешно прикреплен к студенту {student.user.username}.')
             else:
@@ -2558,22 +2604,15 @@ def course_feedbacks_list(request, course_id):
     course = get_object_or_404(Course, id=course_id)
     feedbacks = CourseFeedback.objects.filter(course=course).select_related('student__user')
     
-    # Статистика
-    total_feedbacks = feedbacks.count()
-    if total_feedbacks > 0:
-        avg_rating = feedbacks.aggregate(Avg('rating'))['rating__avg']
-        rating_distribution = {}
-        for i in range(1, 6):
-            rating_distribution[i] = feedbacks.filter(rating=i).count()
-    else:
-        avg_rating = 0
-        rating_distribution = {i: 0 for i in range(1, 6)}
+    # Статистика: среднее и число отзывов хранятся в курсе, распределение — одним GROUP BY
+    by_rating = dict(feedbacks.order_by().values_list('rating').annotate(count=Count('id')))
+    rating_distribution = {i: by_rating.get(i, 0) for i in range(1, 6)}
     
     return render(request, 'courses/course_feedbacks_list.html', {
         'course': course,
         'feedbacks': feedbacks,
-        'total_feedbacks': total_feedbacks,
-        'avg_rating': avg_rating,
+        'total_feedbacks': course.rating_count,
+        'avg_rating': course.rating_avg,
         'rating_distribution': rating_distribution
     })
 
@@ -2612,54 +2651,26 @@ def edit_module(request, module_id):
 
 @login_required
 def requests_history(request):
-    student_id = request.GET.get('student_id')
-    items = []
-    profile_qs = ProfileEditRequest.objects.all().select_related('student__user')
-    course_add_qs = CourseAddRequest.objects.all().select_related('student__user', 'assigned_course')
-    message_qs = StudentMessageRequest.objects.all().select_related('student__user')
-    if student_id:
-        profile_qs = profile_qs.filter(student_id=student_id)
-        course_add_qs = course_add_qs.filter(student_id=student_id)
-        message_qs = message_qs.filter(student_id=student_id)
-    for r in profile_qs:
-        items.append({
-            'type': 'profile_edit',
-            'id': r.id,
-            'student': r.student.user.get_full_name() or r.student.user.username,
-            'status': r.status,
-            'created_at': r.created_at.strftime('%d.%m.%Y %H:%M'),
-            'reviewed_at': r.reviewed_at.strftime('%d.%m.%Y %H:%M') if r.reviewed_at else '',
-            'course': '',
-            'message': '',
-            'admin_response': r.admin_response or ''
-        })
-    for r in course_add_qs:
-        items.append({
-            'type': 'course_add',
-            'id': r.id,
-            'student': r.student.user.get_full_name() or r.student.user.username,
-            'status': r.status,
-            'created_at': r.created_at.strftime('%d.%m.%Y %H:%M'),
-            'reviewed_at': r.reviewed_at.strftime('%d.%m.%Y %H:%M') if r.reviewed_at else '',
-            'course': r.assigned_course.title if r.assigned_course else (r.course_name or 'Не указан'),
-            'message': r.comment or '',
-            'admin_response': r.admin_response or ''
-        })
-    for r in message_qs:
-        items.append({
-            'type': 'message',
-            'id': r.id,
-            'student': r.student.user.get_full_name() or r.student.user.username,
-            'status': r.status,
-            'created_at': r.created_at.strftime('%d.%m.%Y %H:%M'),
-            'reviewed_at': r.reviewed_at.strftime('%d.%m.%Y %H:%M') if r.reviewed_at else '',
-            'course': '',
-            'message': r.message,
-            'admin_response': r.admin_response or ''
-        })
-    # Сортируем по дате создания (новые сверху)
-    items.sort(key=lambda x: x['created_at'], reverse=True)
-    return JsonResponse({'items': items})
+    """История запросов студентов: ?student_id=, ?status=, ?type= (можно несколько), ?cursor=, ?limit=."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden('Доступ запрещен')
+    try:
+        limit = max(1, min(int(request.GET.get('limit', DEFAULT_HISTORY_LIMIT)), MAX_HISTORY_LIMIT))
+        items, next_cursor = history_page(
+            student_id=request.GET.get('student_id') or None,
+            status=request.GET.get('status') or None,
+            types=[kind for kind in request.GET.getlist('type') if kind],
+            cursor=request.GET.get('cursor') or None,
+            limit=limit,
+        )
+    except ValueError:
+        return HttpResponseBadRequest('Некорректные параметры')
+    for item in items:
+        item['created_at'] = timezone.localtime(item['created_at']).strftime('%d.%m.%Y %H:%M')
+        item['reviewed_at'] = (
+            timezone.localtime(item['reviewed_at']).strftime('%d.%m.%Y %H:%M') if item['reviewed_at'] else ''
+        )
+    return JsonResponse({'items': items, 'next_cursor': next_cursor})
 
 # Новые отдельные страницы админ панели
 @login_required
@@ -2729,14 +2740,13 @@ def admin_students_page(request):
                 
         elif action == 'delete_student':
             student_id = request.POST.get('student_id')
-            try:
-                student = Student.objects.get(id=student_id)
-                user = student.user
-                student.delete()
-                user.delete()
-                messages.success(request, 'Студент успешно удален')
-            except Student.DoesNotExist:
+            user_id = Student.objects.filter(id=student_id).values_list('user_id', flat=True).first()
+            if not user_id:
                 messages.error(request, 'Студент не найден')
+            elif bulk_delete_students([user_id]).users:
+                messages.success(request, 'Студент успешно удален')
+            else:
+                messages.error(request, 'Пользователь является преподавателем или администратором и не был удален')
                 
         elif action == 'assign_teacher':
             student_id = request.POST.get('student_id')
@@ -2758,35 +2768,8 @@ def admin_students_page(request):
     groups = Group.objects.all()
     teachers = Teacher.objects.all()
     
-    # Объединяем запросы
-    message_requests = StudentMessageRequest.objects.all().order_by('-created_at')
-    profile_requests = ProfileEditRequest.objects.all().order_by('-created_at')
-    
-    # Создаем общий список запросов с типом
-    total_requests = []
-    for message_request in message_requests:
-        total_requests.append({
-            'id': message_request.id,
-            'student': message_request.student,
-            'request_type': 'message',
-            'message': message_request.message,
-            'status': message_request.status,
-            'created_at': message_request.created_at,
-            'get_status_display': message_request.get_status_display,
-        })
-    for profile_request in profile_requests:
-        total_requests.append({
-            'id': profile_request.id,
-            'student': profile_request.student,
-            'request_type': 'profile',
-            'message': 'Редактирование профиля',
-            'status': profile_request.status,
-            'created_at': profile_request.created_at,
-            'get_status_display': profile_request.get_status_display,
-        })
-    
-    # Сортируем по дате создания
-    total_requests.sort(key=lambda x: x['created_at'], reverse=True)
+    # Последние запросы (сообщения и профиль) — одним UNION ALL, отсортированным в БД
+    total_requests, _ = history_page(types=['message', 'profile_edit'], limit=MAX_HISTORY_LIMIT)
     
     # Получаем достижения студентов (более 50% выполнения)
     student_achievements = StudentAchievement.objects.select_related('student', 'achievement').all()
@@ -2925,9 +2908,9 @@ def admin_requests_page(request):
                 return JsonResponse({'success': False, 'error': str(e)})
     
     # Получаем данные для страницы
-    message_requests = StudentMessageRequest.objects.all().order_by('-created_at')
-    profile_requests = ProfileEditRequest.objects.all().order_by('-created_at')
-    course_requests = CourseAddRequest.objects.all().order_by('-created_at')
+    message_requests = StudentMessageRequest.objects.select_related('student').order_by('-created_at')
+    profile_requests = ProfileEditRequest.objects.select_related('student').order_by('-created_at')
+    course_requests = CourseAddRequest.objects.select_related('student').order_by('-created_at')
     courses = Course.objects.all().order_by('title')
     
     context = {
@@ -3337,21 +3320,13 @@ def teacher_dashboard(request):
         return redirect('teacher_login')
     
     teacher = request.user.teacher_profile
-    courses = teacher.courses.all()
-    
-    # Подсчет статистики
-    total_modules = sum(course.modules.count() for course in courses)
-    total_lessons = sum(module.lessons.count() for course in courses for module in course.modules.all())
-    total_quizzes = sum(module.quizzes.count() for course in courses for module in course.modules.all())
-    total_students = sum(course.students.count() for course in courses)
+    courses = teacher.courses.annotate(students_count=Count('enrollments'))
     
     context = {
         'teacher': teacher,
         'courses': courses,
-        'total_modules': total_modules,
-        'total_lessons': total_lessons,
-        'total_quizzes': total_quizzes,
-        'total_students': total_students,
+        # total_modules, total_lessons, total_quizzes, total_students — из кэша
+        **teacher_dashboard_stats(teacher),
         'active_tab': 'dashboard'
     }
     
@@ -3445,15 +3420,13 @@ def teacher_modules(request):
         else:
             messages.error(request, 'Пожалуйста, заполните все обязательные поля.')
     
-    # Получаем модули, которые привязаны к курсам учителя
-    modules = []
-    for course in courses:
-        modules.extend(course.modules.all())
-    modules = list(set(modules))  # убираем дубликаты
+    # Модули курсов учителя — одним запросом, постранично
+    page_obj = Paginator(teacher_modules_queryset(teacher), TEACHER_LISTING_PER_PAGE).get_page(request.GET.get('page'))
 
     context = {
         'teacher': teacher,
-        'modules': modules,
+        'modules': page_obj.object_list,
+        'page_obj': page_obj,
         'courses': courses,
         'active_tab': 'modules'
     }
@@ -3467,13 +3440,8 @@ def teacher_lessons(request):
         return redirect('teacher_login')
 
     teacher = request.user.teacher_profile
-    courses = teacher.courses.all()
-    
-    # Получаем модули курсов учителя
-    modules = []
-    for course in courses:
-        modules.extend(course.modules.all())
-    modules = list(set(modules))  # убираем дубликаты
+    # Модули курсов учителя — для выбора в форме
+    modules = Module.objects.filter(pk__in=teacher_module_ids(teacher)).order_by('title', 'pk')
     
     # Обработка создания урока
     if request.method == 'POST' and 'create_lesson' in request.POST:
@@ -3485,11 +3453,7 @@ def teacher_lessons(request):
         if title and module_id:
             try:
                 # Проверяем, что модуль принадлежит курсам преподавателя
-                module = None
-                for mod in modules:
-                    if mod.id == int(module_id):
-                        module = mod
-                        break
+                module = modules.filter(pk=int(module_id)).first()
                 
                 if module:
                     lesson = Lesson.objects.create(
@@ -3507,15 +3471,13 @@ def teacher_lessons(request):
         else:
             messages.error(request, 'Пожалуйста, заполните все обязательные поля.')
     
-    # Получаем уроки из модулей
-    lessons = []
-    for module in modules:
-        lessons.extend(module.lessons.all())
-    lessons = list(set(lessons))  # убираем дубликаты
+    # Уроки из модулей — одним запросом, постранично
+    page_obj = Paginator(teacher_lessons_queryset(teacher), TEACHER_LISTING_PER_PAGE).get_page(request.GET.get('page'))
 
     context = {
         'teacher': teacher,
-        'lessons': lessons,
+        'lessons': page_obj.object_list,
+        'page_obj': page_obj,
         'modules': modules,
         'active_tab': 'lessons'
     }
@@ -3545,13 +3507,8 @@ def teacher_quizzes(request):
         return redirect('teacher_login')
 
     teacher = request.user.teacher_profile
-    courses = teacher.courses.all()
-    
-    # Получаем модули курсов учителя
-    modules = []
-    for course in courses:
-        modules.extend(course.modules.all())
-    modules = list(set(modules))  # убираем дубликаты
+    # Модули курсов учителя — для выбора в форме
+    modules = Module.objects.filter(pk__in=teacher_module_ids(teacher)).order_by('title', 'pk')
     
     # Обработка создания квиза
     if request.method == 'POST' and 'create_quiz' in request.POST:
@@ -3582,11 +3539,7 @@ def teacher_quizzes(request):
             if assign_to_module and module_id:
                 try:
                     # Проверяем, что модуль принадлежит курсам преподавателя
-                    module = None
-                    for mod in modules:
-                        if mod.id == int(module_id):
-                            module = mod
-                            break
+                    module = modules.filter(pk=int(module_id)).first()
                     
                     if module:
                         module.quizzes.add(quiz)
@@ -3623,24 +3576,16 @@ def teacher_quizzes(request):
         else:
             messages.error(request, 'Пожалуйста, заполните название квиза.')
     
-    # Получаем квизы из модулей
-    quizzes = []
-    for module in modules:
-        quizzes.extend(module.quizzes.all())
-    
-    # Также получаем квизы, назначенные студентам преподавателя
-    teacher_students = Student.objects.filter(teacher=teacher)
-    for student in teacher_students:
-        quizzes.extend(student.assigned_quizzes.all())
-    
-    quizzes = list(set(quizzes))  # убираем дубликаты
+    # Квизы из модулей курсов и назначенные студентам преподавателя — одним запросом, постранично
+    page_obj = Paginator(teacher_quizzes_queryset(teacher), TEACHER_LISTING_PER_PAGE).get_page(request.GET.get('page'))
 
     # Получаем студентов преподавателя
-    students = Student.objects.filter(teacher=teacher)
+    students = Student.objects.filter(teacher=teacher).select_related('user')
     
     context = {
         'teacher': teacher,
-        'quizzes': quizzes,
+        'quizzes': page_obj.object_list,
+        'page_obj': page_obj,
         'modules': modules,
         'students': students,
         'active_tab': 'quizzes'
@@ -3675,22 +3620,8 @@ def teacher_quiz_questions(request, quiz_id):
     teacher = request.user.teacher_profile
     quiz = get_object_or_404(Quiz, id=quiz_id)
     
-    # Проверяем, что квиз принадлежит преподавателю
-    teacher_modules = []
-    for course in teacher.courses.all():
-        teacher_modules.extend(course.modules.all())
-    
-    quiz_belongs_to_teacher = False
-    for module in teacher_modules:
-        if quiz in module.quizzes.all():
-            quiz_belongs_to_teacher = True
-            break
-    
-    # Также проверяем, если квиз назначен студентам преподавателя
-    if not quiz_belongs_to_teacher:
-        teacher_students = Student.objects.filter(teacher=teacher)
-        if quiz.assigned_students.filter(id__in=teacher_students.values_list('id', flat=True)).exists():
-            quiz_belongs_to_teacher = True
+    # Проверяем, что квиз принадлежит преподавателю (курс или назначение его студентам)
+    quiz_belongs_to_teacher = teacher_owns_quiz(teacher, quiz)
     
     if not quiz_belongs_to_teacher:
         messages.error(request, 'У вас нет доступа к этому квизу.')
@@ -3810,22 +3741,8 @@ def student_start_quiz(request, quiz_id):
         return redirect('student_login')
     quiz = get_object_or_404(Quiz, id=quiz_id, is_active=True)
     
-    # Проверяем, доступен ли квиз студенту
-    quiz_available = False
-    
-    # Проверяем через модули курсов
-    for course in student.enrolled_courses.all():
-        for module in course.modules.all():
-            if quiz in module.quizzes.all():
-                quiz_available = True
-                break
-        if quiz_available:
-            break
-    
-    # Проверяем через прямые назначения
-    if not quiz_available:
-        if quiz in student.assigned_quizzes.all():
-            quiz_available = True
+    # Проверяем, доступен ли квиз студенту (через курсы или прямое назначение)
+    quiz_available = student_can_take_quiz(student, quiz)
     
     if not quiz_available:
         messages.error(request, 'У вас нет доступа к этому квизу.')
@@ -3884,6 +3801,10 @@ def student_submit_quiz(request, quiz_id):
         return redirect('student_login')
     quiz = get_object_or_404(Quiz, id=quiz_id, is_active=True)
     
+    if not student_can_take_quiz(student, quiz):
+        messages.error(request, 'У вас нет доступа к этому квизу.')
+        return redirect('student_page')
+    
     if request.method == 'POST':
         attempt_id = request.POST.get('quiz_attempt_id')
         quiz_attempt = get_object_or_404(QuizAttempt, id=attempt_id, student=student, quiz=quiz)
@@ -3986,7 +3907,7 @@ def teacher_student_progress(request):
     
     # Прогресс по курсам
     course_progress = []
-    for course in student.enrolled_courses.all():
+    for course in student_active_courses(student):
         progress = student.calculate_progress(course)
         course_progress.append({
             'course': course,
@@ -3994,11 +3915,10 @@ def teacher_student_progress(request):
         })
     
     # Результаты квизов
-    quiz_attempts = QuizAttempt.objects.filter(student=student).order_by('-attempt_date')
+    quiz_attempts = QuizAttempt.objects.filter(student=student).select_related('quiz').order_by('-created_at')
     
-    # Рейтинг студента
-    all_students = Student.objects.all().order_by('-stars')
-    student_rank = list(all_students.values_list('id', flat=True)).index(student.id) + 1
+    # Место в общем рейтинге — одна строка LeaderboardRank
+    student_rank = get_student_rank(student)
     
     # Рендерим HTML
     html = render_to_string('courses/teacher_student_progress.html', {
@@ -4010,6 +3930,34 @@ def teacher_student_progress(request):
     
     return JsonResponse({'success': True, 'html': html})
 
+@login_required
+def teacher_gradebook(request):
+    """Журнал оценок: студенты преподавателя × квизы и домашние задания; ?format=csv|xlsx — выгрузка."""
+    if not hasattr(request.user, 'teacher_profile'):
+        return redirect('teacher_login')
+    
+    teacher = request.user.teacher_profile
+    gradebook = get_teacher_gradebook(teacher)
+    
+    export_format = request.GET.get('format')
+    if export_format == 'xlsx':
+        if not xlsx_available():
+            return HttpResponseBadRequest('Выгрузка в Excel недоступна: не установлен openpyxl')
+        return xlsx_response('gradebook', export=gradebook.as_export())
+    if export_format == 'csv':
+        return csv_response('gradebook', export=gradebook.as_export())
+    
+    context = {
+        'teacher': teacher,
+        'gradebook': gradebook,
+        'rows': list(gradebook.rows()),
+        'averages': gradebook.average_cells(),
+        'xlsx_available': xlsx_available(),
+        'active_tab': 'gradebook'
+    }
+    
+    return render(request, 'courses/teacher_gradebook.html', context)
+
 # Homework Views
 @login_required
 def teacher_homework_page(request):
@@ -4375,7 +4323,7 @@ def student_homework_delete_photo(request, photo_id):
 def student_courses_page(request):
     """Отдельная страница курсов студента"""
     student = get_object_or_404(Student, user=request.user)
-    courses = student.courses.all()
+    courses = student_active_courses(student)
     
     # Convert progress_data to a dictionary with course IDs as keys
     progress_data = {}
@@ -4417,13 +4365,13 @@ def student_courses_page(request):
                 # Пересчитываем данные прогресса для обновленного списка курсов
                 updated_progress_data = {}
                 updated_course_completed_data = {}
-                for course in student.courses.all():
+                for course in student_active_courses(student):
                     progress_value = student.calculate_progress(course)
                     updated_progress_data[course.id] = progress_value
                     updated_course_completed_data[course.id] = course.is_completed_by(student)
                 
                 return render(request, 'courses/student_courses_page.html', {
-                    'courses': student.courses.all(),
+                    'courses': student_active_courses(student),
                     'progress_data': updated_progress_data,
                     'course_completed_data': updated_course_completed_data,
                     'student': student,
@@ -4454,15 +4402,32 @@ def student_rating_page(request):
     """Отдельная страница рейтинга студента"""
     student = get_object_or_404(Student, user=request.user)
     
-    # Получаем всех студентов с рейтингом, независимо от групп
-    all_students_with_rating = Student.objects.filter(
-        stars__gt=0
-    ).select_related('user').order_by('-stars', 'user__first_name')
+    # Общий рейтинг страницами по курсору; без курсора — страница вокруг самого студента
+    after, before = request.GET.get('after'), request.GET.get('before')
+    try:
+        if after or before:
+            rows, prev_cursor, next_cursor = leaderboard_page(after=after, before=before, min_stars=1)
+        else:
+            rows, prev_cursor, next_cursor = leaderboard_around(student, min_stars=1)
+    except ValueError:
+        rows, prev_cursor, next_cursor = leaderboard_page(min_stars=1)
     
-    # Создаем общий рейтинг без фильтрации по группам
+    # Уровни — маленькая таблица: читаем один раз вместо level_number на строку
+    levels = list(Level.objects.order_by('number'))
     context = {
         'student': student,
-        'all_students_with_rating': all_students_with_rating,
+        'all_students_with_rating': [
+            {
+                'student': row.student,
+                'position': row.rank,
+                'stars': row.stars,
+                'level': next((level.number for level in levels if level.min_stars <= row.stars < level.max_stars), 1),
+            }
+            for row in rows
+        ],
+        'my_rank': get_student_rank(student),
+        'prev_cursor': prev_cursor,
+        'next_cursor': next_cursor,
         'notifications': Notification.objects.filter(student=student).order_by('-created_at')[:10],
         'unread_notifications_count': Notification.objects.filter(student=student, is_read=False).count(),
     }
@@ -4629,40 +4594,8 @@ def student_quizzes_page(request):
     """Отдельная страница квизов студента"""
     student = get_object_or_404(Student, user=request.user)
     
-    # Получаем курсы студента
-    courses = student.courses.all().prefetch_related('modules__quizzes')
-    
-    # Получаем квизы студента (из модулей курсов и прямые назначения)
-    student_quizzes = []
-    
-    # Квизы из модулей курсов
-    for course in courses:
-        for module in course.modules.all():
-            for quiz in module.quizzes.filter(is_active=True):
-                if quiz not in student_quizzes:
-                    student_quizzes.append(quiz)
-    
-    # Прямые назначения квизов
-    for quiz in student.assigned_quizzes.filter(is_active=True):
-        if quiz not in student_quizzes:
-            student_quizzes.append(quiz)
-    
-    # Добавляем информацию о результатах квизов
-    for quiz in student_quizzes:
-        latest_attempt = QuizAttempt.objects.filter(
-            student=student, 
-            quiz=quiz
-        ).order_by('-created_at').first()
-        
-        if latest_attempt:
-            quiz.latest_attempt = latest_attempt
-            quiz.best_score = QuizAttempt.objects.filter(
-                student=student, 
-                quiz=quiz
-            ).aggregate(Max('score'))['score__max']
-        else:
-            quiz.latest_attempt = None
-            quiz.best_score = None
+    # Квизы студента (из модулей курсов и прямые назначения) с последней и лучшей попыткой
+    student_quizzes = student_quiz_list(student)
     
     # Данные для уведомлений
     notifications = Notification.objects.filter(student=student).order_by('-created_at')[:10]
@@ -5144,90 +5077,43 @@ def create_teacher(request):
 # AI Image Creator View
 def ai_image_creator(request, path=''):
     """
-    View для обслуживания React приложения генератора картинок
+    View для обслуживания React приложения генератора картинок.
+    Файлы отдаются из манифеста в памяти (см. asset_server.py) с ETag и сжатием.
     """
-    # Путь к папке с приложением
-    app_dir = Path(settings.BASE_DIR) / 'study-task---ai-image-creator'
-    
-    # Если путь пустой, отдаем index.html
-    if path == '' or path == 'index.html':
-        index_path = app_dir / 'index.html'
-        if index_path.exists():
-            with open(index_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            # Заменяем абсолютные пути на пути с префиксом
-            base_path = '/study-task---ai-image-creator'
-            content = content.replace('href="/index.css"', f'href="{base_path}/index.css"')
-            content = content.replace('src="/index.tsx"', f'src="{base_path}/index.tsx"')
-            return HttpResponse(content, content_type='text/html')
-        else:
-            return HttpResponse('Index file not found', status=404)
-    
-    # Для остальных файлов (index.tsx, App.tsx, index.css и т.д.)
-    file_path = app_dir / path
-    
-    # Проверяем безопасность пути
-    try:
-        file_path = file_path.resolve()
-        app_dir_resolved = app_dir.resolve()
-        if not str(file_path).startswith(str(app_dir_resolved)):
-            return HttpResponse('Forbidden', status=403)
-    except (ValueError, OSError) as e:
-        return HttpResponse(f'Invalid path: {str(e)}', status=400)
-    
-    if file_path.exists() and file_path.is_file():
-        # Определяем MIME тип
-        content_type, _ = guess_type(str(file_path))
-        if content_type is None:
-            if path.endswith('.tsx') or path.endswith('.ts'):
-                content_type = 'application/javascript; charset=utf-8'
-            elif path.endswith('.jsx'):
-                content_type = 'application/javascript; charset=utf-8'
-            elif path.endswith('.css'):
-                content_type = 'text/css; charset=utf-8'
-            elif path.endswith('.json'):
-                content_type = 'application/json; charset=utf-8'
-            else:
-                content_type = 'application/octet-stream'
-        
-        # Читаем файл
-        try:
-            if path.endswith('.tsx') or path.endswith('.ts') or path.endswith('.jsx') or path.endswith('.js') or path.endswith('.css') or path.endswith('.json'):
-                # Текстовые файлы
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                response = HttpResponse(content, content_type=content_type)
-            else:
-                # Бинарные файлы
-                with open(file_path, 'rb') as f:
-                    content = f.read()
-                response = HttpResponse(content, content_type=content_type)
-            return response
-        except Exception as e:
-            logger.error(f'Error reading file {path}: {str(e)}')
-            return HttpResponse(f'Error reading file: {str(e)}', status=500)
-    else:
-        # Если файл не найден, пробуем найти файл с расширениями .tsx, .ts, .jsx, .js
-        # Это нужно для импортов без расширений (например, './App' вместо './App.tsx')
-        if '.' not in path or not path.endswith(('.tsx', '.ts', '.jsx', '.js', '.css', '.json')):
-            for ext in ['.tsx', '.ts', '.jsx', '.js']:
-                try_path = file_path.with_suffix(ext)
-                if try_path.exists() and try_path.is_file():
-                    file_path = try_path
-                    path = str(Path(path).with_suffix(ext))
-                    # Определяем MIME тип
-                    content_type = 'application/javascript; charset=utf-8'
-                    # Читаем файл
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                        response = HttpResponse(content, content_type=content_type)
-                        return response
-                    except Exception as e:
-                        logger.error(f'Error reading file {path}: {str(e)}')
-                        return HttpResponse(f'Error reading file: {str(e)}', status=500)
-        
+    response = asset_response(request, path)
+    if response is None:
         return HttpResponse(f'File not found: {path}', status=404)
+    if path in ('', 'index.html'):
+        # CSRF-cookie для запросов приложения к ai_image_generate (только у страницы, не у кэшируемых файлов)
+        get_token(request)
+    return response
+
+
+@login_required
+@require_POST
+def ai_image_generate(request):
+    """Генерация или правка картинки через Gemini от имени сервера: ключ API не уходит в браузер."""
+    try:
+        data = json.loads(request.body)
+        prompt = str(data.get('prompt', '')).strip()
+        aspect_ratio = data.get('aspectRatio', '1:1')
+        image = data.get('image') or {}
+        image_data, mime_type = image.get('data') or None, image.get('mimeType') or None
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Некорректный запрос'}, status=400)
+    if not prompt or len(prompt) > GEMINI_MAX_PROMPT_LENGTH or aspect_ratio not in GEMINI_ASPECT_RATIOS:
+        return JsonResponse({'error': 'Некорректный промпт или формат'}, status=400)
+    if image_data and not str(mime_type or '').startswith('image/'):
+        return JsonResponse({'error': 'Можно загрузить только изображение'}, status=400)
+    if not acquire_gemini_quota(request.user.pk):
+        return JsonResponse({'error': 'Слишком много запросов, попробуйте позже'}, status=429)
+
+    try:
+        url = generate_ai_image(prompt, aspect_ratio, image_data, mime_type)
+    except GeminiError as error:
+        logger.warning('AI генератор картинок: %s', error)
+        return JsonResponse({'error': str(error)}, status=502)
+    return JsonResponse({'image': url})
 
 
 # Notification System Views
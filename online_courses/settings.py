@@ -173,13 +173,39 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # WhiteNoise static files settings
 STORAGES = {
     'default': {
-        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'BACKEND': 'courses.direct_uploads.LocalDirectUploadStorage',
     },
     'staticfiles': {
         'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
     },
 }
 
+# Медиа в S3-совместимом хранилище (AWS S3, MinIO, ...): браузер загружает
+# файлы напрямую по presigned PUT, см. courses/direct_uploads.py
+if os.getenv('MEDIA_STORAGE', 'local').lower() == 's3':
+    STORAGES['default'] = {
+        'BACKEND': 'courses.direct_uploads.S3DirectUploadStorage',
+        'OPTIONS': {
+            'bucket_name': os.getenv('S3_BUCKET_NAME', ''),
+            'endpoint_url': os.getenv('S3_ENDPOINT_URL') or None,
+            'region_name': os.getenv('S3_REGION_NAME') or None,
+            'access_key': os.getenv('S3_ACCESS_KEY_ID', ''),
+            'secret_key': os.getenv('S3_SECRET_ACCESS_KEY', ''),
+            'querystring_auth': True,
+            'file_overwrite': False,
+        },
+    }
+
+# Загружаемые файлы хэшируются на лету для дедупликации (см. MediaBlob)
+FILE_UPLOAD_HANDLERS = [
+    'courses.upload_handlers.HashingMemoryFileUploadHandler',
+    'courses.upload_handlers.HashingTemporaryFileUploadHandler',
+]
+
+# Время жизни подписанных ссылок на загрузку (сек.) и максимальный размер файла
+DIRECT_UPLOAD_EXPIRES = int(os.getenv('DIRECT_UPLOAD_EXPIRES', '3600'))
+DIRECT_UPLOAD_MAX_SIZE = int(os.getenv('DIRECT_UPLOAD_MAX_SIZE', str(2 * 1024 ** 3)))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -191,11 +217,52 @@ MEDIA_URL = '/media/'
 # но в продакшене можно переопределить через переменную окружения MEDIA_ROOT
 MEDIA_ROOT = Path(os.getenv('MEDIA_ROOT', BASE_DIR / 'media'))
 
+# Конвертация PDF в слайды: разрешение, формат (webp/jpeg/png), качество,
+# ширина миниатюр и число процессов рендеринга (по умолчанию — число CPU)
+SLIDES_DPI = int(os.getenv('SLIDES_DPI', '110'))
+SLIDES_IMAGE_FORMAT = os.getenv('SLIDES_IMAGE_FORMAT', 'webp')
+SLIDES_IMAGE_QUALITY = int(os.getenv('SLIDES_IMAGE_QUALITY', '80'))
+SLIDES_THUMBNAIL_WIDTH = int(os.getenv('SLIDES_THUMBNAIL_WIDTH', '320'))
+SLIDES_RENDER_WORKERS = int(os.getenv('SLIDES_RENDER_WORKERS', '0')) or None
+# Допустимые значения ?dpi= для постраничного рендеринга /lesson/<id>/slide/<n>/
+SLIDES_ALLOWED_DPI = (72, SLIDES_DPI, 150, 200)
+
+# Уменьшенные копии аватаров, обложек курсов, изображений уровней и фото ДЗ
+IMAGE_RENDITION_WIDTHS = (64, 160, 320, 640)
+IMAGE_RENDITION_FORMAT = os.getenv('IMAGE_RENDITION_FORMAT', 'webp')
+IMAGE_RENDITION_QUALITY = int(os.getenv('IMAGE_RENDITION_QUALITY', '80'))
+
+# Импорт студентов из Excel: число процессов для хэширования паролей
+# (по умолчанию — число CPU) и размер пачки bulk_create/bulk_update
+STUDENT_IMPORT_WORKERS = int(os.getenv('STUDENT_IMPORT_WORKERS', '0')) or None
+STUDENT_IMPORT_BATCH_SIZE = int(os.getenv('STUDENT_IMPORT_BATCH_SIZE', '500'))
+
+# Выгрузки CSV/XLSX в админ-панели: строк на одно чтение из БД и на один блок ответа
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+# Защищённые медиа (видео и PDF уроков, файлы ДЗ) отдаются через /protected/...
+# с проверкой доступа. PROTECTED_MEDIA_SERVER: '' — отдаёт Django (с Range),
+# 'nginx' — X-Accel-Redirect на internal-location PROTECTED_MEDIA_INTERNAL_URL,
+# 'apache' — X-Sendfile с путём к файлу (mod_xsendfile)
+PROTECTED_MEDIA_SERVER = os.getenv('PROTECTED_MEDIA_SERVER', '').lower()
+PROTECTED_MEDIA_INTERNAL_URL = os.getenv('PROTECTED_MEDIA_INTERNAL_URL', '/protected-media/')
+PROTECTED_MEDIA_CHUNK_SIZE = int(os.getenv('PROTECTED_MEDIA_CHUNK_SIZE', str(512 * 1024)))
+
 # Third-party service keys (read from env in App Platform)
 SUPABASE_URL = os.getenv('SUPABASE_URL', '')
 SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY', '')
 SUPABASE_SERVICE_ROLE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY', '')
 
+# Gemini для AI генератора картинок: ключ остаётся на сервере (см. courses/gemini.py)
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+GEMINI_IMAGE_MODEL = os.getenv('GEMINI_IMAGE_MODEL', 'gemini-2.5-flash-image')
+# Запрос выполняется в воркере gunicorn: таймаут должен быть меньше его timeout (30 с),
+# иначе воркер будет убит раньше и клиент не получит ответа об ошибке
+GEMINI_TIMEOUT = int(os.getenv('GEMINI_TIMEOUT', '25'))
+# Генераций на пользователя за окно GEMINI_RATE_WINDOW секунд
+GEMINI_RATE_LIMIT = int(os.getenv('GEMINI_RATE_LIMIT', '20'))
+GEMINI_RATE_WINDOW = int(os.getenv('GEMINI_RATE_WINDOW', str(60 * 60)))
+
 # Email settings (SMTP)
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
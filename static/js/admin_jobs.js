@@ -0,0 +1,71 @@
+// admin_jobs.js - прогресс фоновых задач на странице администратора
+// Импорт из Excel, прикрепление группы к курсу и массовое удаление выполняет
+// воркер (manage.py run_jobs); здесь опрашивается /admin_page/jobs/<id>/,
+// пока задача не завершится, после чего показывается её итог.
+
+const ADMIN_JOB_POLL_INTERVAL = 2000;
+const ADMIN_JOB_ERRORS_SHOWN = 20;
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+function adminJobResultHtml(job) {
+    if (job.status === 'failed') {
+        return '<span class="text-danger">' + escapeHtml(job.error || 'Задача завершилась с ошибкой') + '</span>';
+    }
+    const result = job.result || {};
+    if (job.kind !== 'import_students') {
+        return escapeHtml(result.message || 'Готово');
+    }
+    let html = `Добавлено: ${result.created}, обновлено: ${result.updated}. Создана группа: ${escapeHtml(result.group)}`;
+    const errors = result.errors || [];
+    if (errors.length) {
+        html += '<ul class="mb-0 mt-1 text-warning">';
+        errors.slice(0, ADMIN_JOB_ERRORS_SHOWN).forEach(([row, email, message]) => {
+            html += `<li>Строка ${row} (${escapeHtml(email || 'без email')}): ${escapeHtml(message)}</li>`;
+        });
+        html += '</ul>';
+        const rest = result.errors_total - Math.min(errors.length, ADMIN_JOB_ERRORS_SHOWN);
+        if (rest > 0) {
+            html += `<div class="text-warning">И ещё строк с ошибками: ${rest}</div>`;
+        }
+    }
+    return html;
+}
+
+function renderAdminJob(element, job) {
+    const bar = element.querySelector('.progress-bar');
+    bar.style.width = job.percent + '%';
+    element.querySelector('.admin-job-status').textContent = job.total
+        ? `${job.status_display}: ${job.done} из ${job.total}`
+        : job.status_display;
+    if (job.finished) {
+        bar.classList.remove('progress-bar-animated', 'progress-bar-striped');
+        bar.classList.add(job.status === 'completed' ? 'bg-success' : 'bg-danger');
+        element.querySelector('.admin-job-result').innerHTML = adminJobResultHtml(job);
+    }
+}
+
+function pollAdminJob(element) {
+    fetch(element.dataset.statusUrl, { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(job => {
+            renderAdminJob(element, job);
+            if (!job.finished) {
+                setTimeout(() => pollAdminJob(element), ADMIN_JOB_POLL_INTERVAL);
+            } else if (job.status === 'completed') {
+                // Данные изменились — перезагружаем уже открытые таблицы
+                document.querySelectorAll('.admin-tab-lazy[data-loaded]').forEach(container => {
+                    loadAdminTab(container, container.dataset.currentUrl || container.dataset.tabUrl);
+                });
+            }
+        })
+        .catch(() => setTimeout(() => pollAdminJob(element), ADMIN_JOB_POLL_INTERVAL * 2));
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.admin-job').forEach(pollAdminJob);
+});
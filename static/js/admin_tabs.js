@@ -0,0 +1,161 @@
+// admin_tabs.js - вкладки панели администратора, загружаемые по требованию
+// Таблицы (.admin-tab-lazy) запрашиваются у /admin_page/tab/<вкладка>/, когда
+// становятся видимыми; поиск, сортировка и страницы перезагружают только фрагмент.
+// Выпадающие списки с data-lookup заполняются из того же endpoint (?format=json).
+
+const ADMIN_LOOKUP_PAGE_SIZE = 50;
+
+function loadAdminTab(container, url) {
+    container.dataset.loaded = '1';
+    container.dataset.currentUrl = url;
+    container.style.opacity = '0.5';
+    return fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' }, credentials: 'same-origin' })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.text();
+        })
+        .then(html => {
+            container.innerHTML = html;
+            initAdminLookups(container);
+        })
+        .catch(() => {
+            container.innerHTML = '<div class="alert alert-danger">Не удалось загрузить данные. Обновите страницу.</div>';
+        })
+        .finally(() => {
+            container.style.opacity = '';
+        });
+}
+
+// Перезагрузка вкладки с текущими параметрами (после изменений через AJAX)
+function reloadAdminTab(element) {
+    const container = element.closest('.admin-tab-lazy');
+    if (container) {
+        loadAdminTab(container, container.dataset.currentUrl || container.dataset.tabUrl);
+    }
+}
+
+function showAdminTab(name) {
+    const pane = document.getElementById('tab-' + name);
+    if (!pane) {
+        return;
+    }
+    document.querySelectorAll('#main-tabs .nav-link').forEach(link => {
+        link.classList.toggle('active', link.dataset.tab === name);
+    });
+    document.querySelectorAll('.tab-pane[id^="tab-"]').forEach(item => {
+        item.classList.toggle('active', item === pane);
+    });
+    sessionStorage.setItem('adminActiveTab', name);
+}
+
+function fillLookup(select, url, query) {
+    const params = new URLSearchParams({ format: 'json', per_page: ADMIN_LOOKUP_PAGE_SIZE });
+    if (query) {
+        params.set('q', query);
+    }
+    return fetch(url + '?' + params.toString(), { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(data => {
+            // Плейсхолдер и уже выбранные значения сохраняются при новом поиске
+            const keep = Array.from(select.options).filter(option => option.value === '' || option.selected);
+            const keepValues = new Set(keep.map(option => option.value));
+            select.innerHTML = '';
+            keep.forEach(option => select.appendChild(option));
+            data.items.filter(item => !keepValues.has(String(item.id))).forEach(item => {
+                select.appendChild(new Option(item.label, item.id));
+            });
+            if (data.has_next) {
+                const more = new Option(`… ещё ${data.count - data.items.length}, уточните поиск`, '');
+                more.disabled = true;
+                select.appendChild(more);
+            }
+        });
+}
+
+function initAdminLookups(root) {
+    root.querySelectorAll('select[data-lookup]').forEach(select => {
+        if (select.dataset.lookupReady) {
+            return;
+        }
+        select.dataset.lookupReady = '1';
+        // Список загружается при первом открытии, а не при отрисовке страницы
+        const load = () => {
+            if (!select.dataset.lookupLoaded) {
+                select.dataset.lookupLoaded = '1';
+                fillLookup(select, select.dataset.lookup, '');
+            }
+        };
+        select.addEventListener('focus', load);
+        select.addEventListener('mousedown', load);
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const observer = new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting && !entry.target.dataset.loaded) {
+                observer.unobserve(entry.target);
+                loadAdminTab(entry.target, entry.target.dataset.tabUrl);
+            }
+        });
+    });
+    document.querySelectorAll('.admin-tab-lazy').forEach(container => observer.observe(container));
+    initAdminLookups(document);
+
+    document.querySelectorAll('#main-tabs .nav-link[data-tab]').forEach(link => {
+        link.addEventListener('click', function(e) {
+            e.preventDefault();
+            showAdminTab(this.dataset.tab);
+            document.getElementById('sidebar').classList.remove('show');
+        });
+    });
+    const savedTab = sessionStorage.getItem('adminActiveTab');
+    if (savedTab) {
+        showAdminTab(savedTab);
+    }
+
+    // Поиск и сортировка внутри фрагмента
+    document.addEventListener('submit', function(e) {
+        const form = e.target.closest('.admin-tab-filter');
+        if (!form) {
+            return;
+        }
+        e.preventDefault();
+        const container = form.closest('.admin-tab-lazy');
+        const params = new URLSearchParams(new FormData(form));
+        loadAdminTab(container, container.dataset.tabUrl + '?' + params.toString());
+    });
+    document.addEventListener('change', function(e) {
+        if (e.target.matches('.admin-tab-filter select')) {
+            e.target.form.requestSubmit();
+        }
+    });
+
+    // Переход по страницам
+    document.addEventListener('click', function(e) {
+        const link = e.target.closest('.admin-tab-pages a');
+        if (!link) {
+            return;
+        }
+        e.preventDefault();
+        const container = link.closest('.admin-tab-lazy');
+        loadAdminTab(container, container.dataset.tabUrl + link.getAttribute('href'));
+    });
+
+    // Поиск по выпадающим спискам
+    let lookupTimer = null;
+    document.addEventListener('input', function(e) {
+        const target = e.target.dataset.lookupSearch;
+        if (!target) {
+            return;
+        }
+        const select = document.getElementById(target);
+        clearTimeout(lookupTimer);
+        lookupTimer = setTimeout(() => {
+            select.dataset.lookupLoaded = '1';
+            fillLookup(select, select.dataset.lookup, e.target.value.trim());
+        }, 300);
+    });
+});
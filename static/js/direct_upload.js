@@ -0,0 +1,87 @@
+// direct_upload.js - загрузка файлов из браузера напрямую в хранилище (S3/MinIO или локальное)
+// Порядок: /uploads/presign/ -> PUT по подписанной ссылке -> /uploads/finalize/
+
+function directUploadCsrfToken() {
+    const input = document.querySelector('input[name="csrfmiddlewaretoken"]');
+    if (input) {
+        return input.value;
+    }
+    const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+    return match ? decodeURIComponent(match[1]) : '';
+}
+
+async function directUploadPost(url, data) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': directUploadCsrfToken()
+        },
+        body: JSON.stringify(data)
+    });
+    const result = await response.json();
+    if (!response.ok || !result.success) {
+        throw new Error(result.error || 'Ошибка загрузки');
+    }
+    return result;
+}
+
+function directUploadPut(presigned, file, onProgress) {
+    return new Promise((resolve, reject) => {
+        const xhr = new XMLHttpRequest();
+        xhr.open(presigned.method, presigned.url);
+        Object.entries(presigned.headers || {}).forEach(([name, value]) => xhr.setRequestHeader(name, value));
+        if (onProgress) {
+            xhr.upload.onprogress = (event) => {
+                if (event.lengthComputable) {
+                    onProgress(event.loaded / event.total);
+                }
+            };
+        }
+        xhr.onload = () => (xhr.status >= 200 && xhr.status < 300)
+            ? resolve()
+            : reject(new Error(`Хранилище ответило ${xhr.status}`));
+        xhr.onerror = () => reject(new Error('Сетевая ошибка при загрузке файла'));
+        xhr.send(file);
+    });
+}
+
+// Загружает файл и регистрирует его в модели; extra передаётся finalize-колбэку
+async function directUpload(file, target, objectId, extra = {}, onProgress = null) {
+    const presigned = await directUploadPost('/uploads/presign/', {
+        target: target,
+        object_id: objectId,
+        filename: file.name,
+        content_type: file.type || 'application/octet-stream',
+        size: file.size
+    });
+    await directUploadPut(presigned, file, onProgress);
+    return directUploadPost('/uploads/finalize/', {token: presigned.token, extra: extra});
+}
+
+// Формы с data-direct-upload="<цель>" и data-object-id загружают файл напрямую
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('form[data-direct-upload]').forEach(form => {
+        form.addEventListener('submit', async function(e) {
+            const input = form.querySelector('input[type="file"]');
+            if (!input || !input.files.length) {
+                return;
+            }
+            e.preventDefault();
+            const button = form.querySelector('[type="submit"]');
+            if (button) {
+                button.disabled = true;
+            }
+            try {
+                await directUpload(input.files[0], form.dataset.directUpload, form.dataset.objectId, {},
+                    progress => { if (button) button.textContent = `Загрузка ${Math.round(progress * 100)}%`; });
+                window.location.href = form.dataset.successUrl || window.location.href;
+            } catch (error) {
+                alert(error.message);
+                if (button) {
+                    button.disabled = false;
+                }
+            }
+        });
+    });
+});
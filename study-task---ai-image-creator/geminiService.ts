@@ -1,35 +1,36 @@
-
-import { GoogleGenAI } from "@google/genai";
 import { AspectRatio } from "./types";
 
-const MODEL_NAME = 'gemini-2.5-flash-image';
+// Gemini is called by the Django server (courses/gemini.py): the API key never reaches the browser
+const API_URL = '/study-task---ai-image-creator/api/generate/';
 
-export const generateImage = async (prompt: string, aspectRatio: AspectRatio): Promise<string> => {
-  const ai = new GoogleGenAI({ apiKey: process.env.API_KEY || '' });
-  
-  const response = await ai.models.generateContent({
-    model: MODEL_NAME,
-    contents: {
-      parts: [{ text: prompt }]
+const csrfToken = (): string => {
+  const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+  return match ? decodeURIComponent(match[1]) : '';
+};
+
+const requestImage = async (body: object): Promise<string> => {
+  const response = await fetch(API_URL, {
+    method: 'POST',
+    credentials: 'same-origin',
+    headers: {
+      'Content-Type': 'application/json',
+      'X-CSRFToken': csrfToken()
     },
-    config: {
-      imageConfig: {
-        aspectRatio: aspectRatio
-      }
-    }
+    body: JSON.stringify(body)
   });
 
-  if (!response.candidates?.[0]?.content?.parts) {
-    throw new Error("No response from AI");
+  if (response.redirected) {
+    throw new Error("Please sign in to generate images");
   }
-
-  for (const part of response.candidates[0].content.parts) {
-    if (part.inlineData) {
-      return `data:${part.inlineData.mimeType};base64,${part.inlineData.data}`;
-    }
+  const payload = await response.json().catch(() => ({}));
+  if (!response.ok || !payload.image) {
+    throw new Error(payload.error || `Request failed (${response.status})`);
   }
+  return payload.image;
+};
 
-  throw new Error("No image data found in response");
+export const generateImage = async (prompt: string, aspectRatio: AspectRatio): Promise<string> => {
+  return requestImage({ prompt, aspectRatio });
 };
 
 export const editImage = async (
@@ -38,40 +39,8 @@ export const editImage = async (
   prompt: string, 
   aspectRatio: AspectRatio
 ): Promise<string> => {
-  const ai = new GoogleGenAI({ apiKey: process.env.API_KEY || '' });
-
   // Remove data:image/png;base64, prefix if present
   const cleanBase64 = base64Data.split(',')[1] || base64Data;
 
-  const response = await ai.models.generateContent({
-    model: MODEL_NAME,
-    contents: {
-      parts: [
-        {
-          inlineData: {
-            data: cleanBase64,
-            mimeType: mimeType
-          }
-        },
-        { text: prompt }
-      ]
-    },
-    config: {
-      imageConfig: {
-        aspectRatio: aspectRatio
-      }
-    }
-  });
-
-  if (!response.candidates?.[0]?.content?.parts) {
-    throw new Error("No response from AI");
-  }
-
-  for (const part of response.candidates[0].content.parts) {
-    if (part.inlineData) {
-      return `data:${part.inlineData.mimeType};base64,${part.inlineData.data}`;
-    }
-  }
-
-  throw new Error("No edited image data found in response");
+  return requestImage({ prompt, aspectRatio, image: { data: cleanBase64, mimeType } });
 };